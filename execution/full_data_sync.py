@@ -14,16 +14,23 @@ from time import sleep
 sys.path.insert(0, str(os.path.dirname(os.path.dirname(__file__))))
 
 from src.decoder.course import decode_course, decode_students
+from src.storage.supabase_client import SupabaseClient
+from src.api.cache import invalidate_api_cache
 
 # Configuration
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://sisymqzxvuktdcbsbpbp.supabase.co")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY", "")
 MEUSISU_API = "https://meusisu.com/api"
 
+# Unique key of approved_students, used to upsert in place
+STUDENT_KEY = "course_id,year,modality_code,rank,call_number"
+
 if not SUPABASE_KEY:
     print("ERROR: SUPABASE_SERVICE_KEY not set")
     sys.exit(1)
 
+SUPABASE = SupabaseClient(url=SUPABASE_URL, service_key=SUPABASE_KEY)
+
 HEADERS = {
     "apikey": SUPABASE_KEY,
     "Authorization": f"Bearer {SUPABASE_KEY}",
@@ -89,53 +96,30 @@ def get_supabase_courses():
     print("\n=== PHASE 2: Fetching current Supabase data ===")
     
     all_courses = []
-    offset = 0
-    limit = 1000
-    
-    while True:
-        resp = requests.get(
-            f"{SUPABASE_URL}/rest/v1/courses?select=id,code,name,university,city,state&order=id&offset={offset}&limit={limit}",
-            headers=HEADERS
-        )
-        if resp.status_code != 200:
-            print(f"  Error fetching courses: {resp.text}")
-            break
-        
-        batch = resp.json()
-        if not batch:
-            break
-        
-        all_courses.extend(batch)
-        offset += limit
-        print(f"  Fetched {len(all_courses)} courses...")
+    try:
+        for course in SUPABASE.iter_table("courses", select="id,code,name,university,city,state"):
+            all_courses.append(course)
+            if len(all_courses) % 1000 == 0:
+                print(f"  Fetched {len(all_courses)} courses...")
+    except requests.RequestException as e:
+        print(f"  Error fetching courses: {e}")
     
     print(f"  Total courses in Supabase: {len(all_courses)}")
     return all_courses
 
 def get_supabase_weights():
     """Get all course weights in Supabase"""
-    all_weights = []
-    offset = 0
-    limit = 1000
-    
-    while True:
-        resp = requests.get(
-            f"{SUPABASE_URL}/rest/v1/course_weights?select=course_id,year&order=course_id&offset={offset}&limit={limit}",
-            headers=HEADERS
-        )
-        if resp.status_code != 200:
-            break
-        
-        batch = resp.json()
-        if not batch:
-            break
-        
-        all_weights.extend(batch)
-        offset += limit
+    weight_set = set()
+    count = 0
+    try:
+        for w in SUPABASE.iter_table("course_weights", select="id,course_id,year"):
+            weight_set.add((w['course_id'], w['year']))
+            count += 1
+    except requests.RequestException as e:
+        print(f"  Error fetching weights: {e}")
     
-    # Create a set of (course_id, year) tuples
-    weight_set = set((w['course_id'], w['year']) for w in all_weights)
-    print(f"  Total weight records in Supabase: {len(all_weights)}")
+    # Set of (course_id, year) tuples
+    print(f"  Total weight records in Supabase: {count}")
     return weight_set
 
 # ============================================================================
@@ -190,18 +174,34 @@ def sync_course_weights(course_id: int, code: int, existing_weights: set):
     
     return inserted
 
+def load_fingerprints(course_id: int, years: list):
+    """Seed the shared fingerprints of a course from latest_cut_scores (one request)"""
+    fingerprints = SUPABASE.fingerprints
+    missing = [y for y in years if not fingerprints.is_loaded(course_id, y)]
+    if not missing:
+        return
+    rows = SUPABASE.get_course_latest_cut_scores(course_id)
+    for year in missing:
+        fingerprints.load(course_id, year, [r for r in rows if r.get('year') == year])
+
 def sync_course_cut_scores(course_id: int, code: int):
-    """Sync cut scores for a single course"""
+    """Sync cut scores for a single course, inserting only changed modalities"""
     course_data = fetch_course_data(code)
     if not course_data or not course_data.years:
         return 0
     
+    load_fingerprints(course_id, [y.year for y in course_data.years])
+    fingerprints = SUPABASE.fingerprints
+    
     inserted = 0
     for year_data in course_data.years:
         if not year_data.modalities:
             continue
         
         for modality in year_data.modalities:
+            if not fingerprints.has_changed(course_id, year_data.year, modality.to_dict()):
+                continue
+            
             payload = {
                 "course_id": course_id,
                 "year": year_data.year,
@@ -219,6 +219,7 @@ def sync_course_cut_scores(course_id: int, code: int):
                 json=payload
             )
             if resp.status_code in [200, 201]:
+                fingerprints.remember(course_id, year_data.year, modality.to_dict())
                 inserted += 1
     
     return inserted
@@ -246,10 +247,7 @@ def sync_course_students(course_id: int, code: int):
         if not students_2024:
             return 0
             
-        # Delete existing students for this course to ensure clean slate for 2024
-        requests.delete(f"{SUPABASE_URL}/rest/v1/approved_students?course_id=eq.{course_id}", headers=HEADERS)
-
-        # Bulk insert
+        # Build payload
         payload = []
         for s in students_2024:
             payload.append({
@@ -263,7 +261,30 @@ def sync_course_students(course_id: int, code: int):
                 "call_number": s.call_number,
                 "status": "convocado"
             })
-            
+
+        # Drop only the rows missing from the new list (other years and
+        # ranks no longer listed); the rest is upserted on its unique key,
+        # so unchanged students keep their updated_at
+        requests.delete(
+            f"{SUPABASE_URL}/rest/v1/approved_students",
+            headers=HEADERS,
+            params={"course_id": f"eq.{course_id}", "year": "neq.2024"}
+        )
+        keep = {(p["modality_code"], p["rank"], p["call_number"]) for p in payload}
+        stored = SUPABASE.iter_table(
+            "approved_students",
+            select="id,modality_code,rank,call_number",
+            params={"course_id": f"eq.{course_id}", "year": "eq.2024"}
+        )
+        stale = [r["id"] for r in stored
+                 if (r["modality_code"], r["rank"], r["call_number"]) not in keep]
+        for i in range(0, len(stale), 200):
+            requests.delete(
+                f"{SUPABASE_URL}/rest/v1/approved_students",
+                headers=HEADERS,
+                params={"id": f"in.({','.join(map(str, stale[i:i+200]))})"}
+            )
+
         # Send in batches of 1000
         total_inserted = 0
         batch_size = 1000
@@ -272,6 +293,7 @@ def sync_course_students(course_id: int, code: int):
             resp = requests.post(
                 f"{SUPABASE_URL}/rest/v1/approved_students",
                 headers={**HEADERS, "Prefer": "resolution=merge-duplicates,return=minimal"},
+                params={"on_conflict": STUDENT_KEY},
                 json=batch
             )
             if resp.status_code in [200, 201]:
@@ -403,6 +425,9 @@ def main():
     print(f"  Total cut scores added: {total_scores_added}")
     print(f"  Total students added: {total_students_added}")
 
+    # Drop every cached API response (no-op unless API_URL/API_ADMIN_TOKEN are set)
+    invalidate_api_cache()
+
 
 if __name__ == "__main__":
     main()
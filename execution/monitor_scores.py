@@ -27,6 +27,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import requests
 from src.decoder import decode_course
+from src.storage.supabase_client import SupabaseClient
 
 # Configuration
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://sisymqzxvuktdcbsbpbp.supabase.co")
@@ -49,27 +50,13 @@ def log(message: str):
 def get_all_course_codes() -> list:
     """Get all course codes from the database"""
     codes = []
-    offset = 0
-    limit = 1000
-    
-    while True:
-        resp = requests.get(
-            f"{SUPABASE_URL}/rest/v1/courses?select=id,code&offset={offset}&limit={limit}",
-            headers=HEADERS
-        )
-        if resp.status_code != 200:
-            log(f"Error fetching courses: {resp.status_code}")
-            break
-            
-        data = resp.json()
-        if not data:
-            break
-            
-        codes.extend([(c['id'], c['code']) for c in data if c.get('code')])
-        
-        if len(data) < limit:
-            break
-        offset += limit
+    try:
+        client = SupabaseClient(url=SUPABASE_URL, service_key=SUPABASE_KEY)
+        for c in client.iter_table("courses", select="id,code"):
+            if c.get('code'):
+                codes.append((c['id'], c['code']))
+    except (ValueError, requests.RequestException) as e:
+        log(f"Error fetching courses: {e}")
     
     return codes
 
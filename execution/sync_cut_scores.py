@@ -14,6 +14,8 @@ from time import sleep
 sys.path.insert(0, str(os.path.dirname(os.path.dirname(__file__))))
 
 from src.decoder.course import decode_course, decode_students
+from src.storage.fingerprint import CutScoreFingerprints
+from src.api.cache import invalidate_api_cache
 
 # Configuration
 SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://sisymqzxvuktdcbsbpbp.supabase.co")
@@ -190,18 +192,45 @@ def sync_course_weights(course_id: int, code: int, existing_weights: set):
     
     return inserted
 
+def get_stored_fingerprints(course_id: int, years: list) -> CutScoreFingerprints:
+    """Load the latest stored value of each modality for a course.
+
+    Reads latest_cut_scores (one row per year/modality, kept by trigger),
+    so the cost doesn't grow with the cut_scores history.
+    """
+    fingerprints = CutScoreFingerprints()
+    resp = requests.get(
+        f"{SUPABASE_URL}/rest/v1/latest_cut_scores",
+        headers=HEADERS,
+        params={
+            "select": "year,modality_code,modality_name,cut_score,applicants,vacancies,partial_scores",
+            "course_id": f"eq.{course_id}",
+            "year": f"in.({','.join(str(y) for y in years)})",
+        }
+    )
+    resp.raise_for_status()
+    rows = resp.json()
+    for year in years:
+        fingerprints.load(course_id, year, [r for r in rows if r.get('year') == year])
+    return fingerprints
+
 def sync_course_cut_scores(course_id: int, code: int):
-    """Sync cut scores for a single course"""
+    """Sync cut scores for a single course, inserting only changed modalities"""
     course_data = fetch_course_data(code)
     if not course_data or not course_data.years:
         return 0
     
+    fingerprints = get_stored_fingerprints(course_id, [y.year for y in course_data.years])
+    
     inserted = 0
     for year_data in course_data.years:
         if not year_data.modalities:
             continue
         
         for modality in year_data.modalities:
+            if not fingerprints.has_changed(course_id, year_data.year, modality.to_dict()):
+                continue
+            
             payload = {
                 "course_id": course_id,
                 "year": year_data.year,
@@ -286,6 +315,7 @@ def main():
     
     print(f"\n=== SYNCING CUT SCORES ===")
     total_scores_added = 0
+    changed_codes = []
     
     # Use higher concurrency for speed
     with ThreadPoolExecutor(max_workers=20) as executor:
@@ -300,6 +330,7 @@ def main():
                 added = future.result()
                 total_scores_added += added
                 if added > 0:
+                    changed_codes.append(course['code'])
                     print(f"  [{i+1}/{len(supabase_courses)}] {course['name']}: +{added} scores")
                 if (i+1) % 100 == 0:
                     print(f"  Processed {i+1}/{len(supabase_courses)} courses...")
@@ -309,5 +340,9 @@ def main():
     print(f"\n=== SYNC COMPLETE ===")
     print(f"  Total cut scores added: {total_scores_added}")
 
+    # Drop cached API responses of updated courses
+    if changed_codes:
+        invalidate_api_cache(changed_codes)
+
 if __name__ == "__main__":
     main()
@@ -38,11 +38,12 @@ def main():
             print(f"  Curso: {latest.get('course_name', 'N/A')}")
             print(f"  Local: {latest.get('city', 'N/A')}, {latest.get('state', 'N/A')}")
 
-        # Get change history
-        changes = history.get_change_history(course_id)
+        # Get change history (last 5 entries, read through the index)
+        total = history.count_changes(course_id)
+        changes = history.get_change_history(course_id, limit=5)
         if changes:
-            print(f"\n  Historico de mudancas: {len(changes)} registros")
-            for entry in changes[-5:]:  # Show last 5
+            print(f"\n  Historico de mudancas: {total} registros")
+            for entry in changes:
                 ts = entry.get('timestamp', '')
                 try:
                     dt = datetime.fromisoformat(ts)
@@ -1,8 +1,21 @@
 #!/usr/bin/env python3
 """
 Backfill Data
-Reprocess raw binary files to regenerate JSON data
+Reprocess the raw archive to regenerate processed snapshots.
+
+Only payloads not yet decoded by the current decoder version are decoded
+(in parallel); bump DECODER_VERSION in src/decoder/course.py after a
+decoder fix to reprocess everything it affects.
+
+Legacy per-poll raw files (.bin) are imported first whenever present;
+files already in the archive are skipped, so reruns are safe.
+
+Usage:
+    python scripts/backfill_data.py
+    python scripts/backfill_data.py --workers 8
+    python scripts/backfill_data.py --force
 """
+import argparse
 import sys
 from pathlib import Path
 
@@ -10,12 +23,20 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.utils.config import load_config
-from src.decoder import decode_course
+from src.storage.backfill import BackfillEngine
 from src.storage.history import HistoryManager
-import json
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Reprocessamento dos dados raw")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processos de decodificacao (padrao: numero de CPUs)")
+    parser.add_argument("--force", action="store_true",
+                        help="Decodificar tudo, ignorando o registro de processados")
+    parser.add_argument("--migrate-legacy", action="store_true",
+                        help="Importar antes os arquivos raw legados (.bin por coleta)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("  SISU Monitor - Backfill de Dados")
     print("=" * 60)
@@ -23,40 +44,19 @@ def main():
     config = load_config()
     history = HistoryManager(config.data_dir)
 
-    raw_dir = config.data_dir / "raw"
-    processed_dir = config.data_dir / "processed"
-
-    # Find all raw files
-    raw_files = list(raw_dir.glob("*.bin"))
-    print(f"\nArquivos raw encontrados: {len(raw_files)}")
-
-    if not raw_files:
-        print("Nenhum arquivo para processar.")
-        return
-
-    processed = 0
-    errors = 0
-
-    for raw_file in sorted(raw_files):
-        print(f"  Processando: {raw_file.name}...", end=" ")
-
-        try:
-            data = raw_file.read_bytes()
-            course = decode_course(data)
-
-            # Save processed JSON
-            json_file = processed_dir / raw_file.name.replace('.bin', '.json')
-            json_file.write_text(json.dumps(course.to_dict(), indent=2, ensure_ascii=False))
+    legacy = list(history.raw_dir.glob("*.bin"))
+    if args.migrate_legacy or legacy:
+        imported = history.migrate_legacy()
+        print(f"\nArquivos legados importados: {imported} (de {len(legacy)} .bin encontrados)")
 
-            print("OK")
-            processed += 1
-        except Exception as e:
-            print(f"ERRO: {e}")
-            errors += 1
+    with BackfillEngine(history, workers=args.workers) as engine:
+        stats = engine.run(force=args.force)
 
     print("\n" + "=" * 60)
-    print(f"Processados: {processed}")
-    print(f"Erros: {errors}")
+    print(f"Decodificados: {stats['decoded']}")
+    print(f"Ja atualizados: {stats['skipped']}")
+    print(f"Erros: {stats['errors']}")
+    print(f"Cursos reconstruidos: {stats['courses']}")
     print("=" * 60)
 
 
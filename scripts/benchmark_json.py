@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON
+Micro-benchmark of API response serialisation: the previous
+clean_nan_values() copy + stdlib encoder versus the single-pass
+serializer (orjson when installed, stdlib fallback otherwise).
+
+Usage:
+    python scripts/benchmark_json.py
+    python scripts/benchmark_json.py --repeat 500
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.api import serialization
+
+
+def clean_nan_values(obj):
+    """Previous implementation: recursive copy replacing NaN/Infinity"""
+    if isinstance(obj, dict):
+        return {k: clean_nan_values(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [clean_nan_values(item) for item in obj]
+    elif isinstance(obj, float):
+        if math.isnan(obj) or math.isinf(obj):
+            return None
+        return obj
+    elif isinstance(obj, np.floating):
+        if np.isnan(obj) or np.isinf(obj):
+            return None
+        return float(obj)
+    return obj
+
+
+def legacy_dumps(content) -> bytes:
+    """Previous SafeJSONResponse.render (Starlette JSONResponse settings)"""
+    return json.dumps(
+        clean_nan_values(content), ensure_ascii=False, allow_nan=False,
+        indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def stdlib_dumps(content) -> bytes:
+    """Single-pass serializer forced onto the stdlib fallback"""
+    has_orjson = serialization.HAS_ORJSON
+    serialization.HAS_ORJSON = False
+    try:
+        return serialization.dumps(content)
+    finally:
+        serialization.HAS_ORJSON = has_orjson
+
+
+def sample_payloads() -> dict:
+    rng = random.Random(42)
+    cities = [f"Cidade {i}-{rng.choice(['MA', 'PI', 'SP', 'RJ'])}" for i in range(5000)]
+    filters = {
+        "states": sorted({c[-2:] for c in cities}),
+        "cities": sorted(cities),
+        "universities": [f"Universidade {i}" for i in range(1500)],
+        "courses": [],
+    }
+    students = {
+        "students": [
+            {"id": i, "rank": i + 1, "name": f"Estudante {i}", "score": rng.uniform(600, 850),
+             "bonus": float("nan") if i % 7 == 0 else 0.0, "call_number": 1,
+             "status": "convocado", "modality_code": 1}
+            for i in range(100)
+        ],
+        "course": {"id": 1, "code": 37, "name": "Medicina"},
+        "year": 2025, "page": 1, "limit": 100, "count": 100,
+    }
+    detail = {
+        "course": {"id": 1, "code": 37, "name": "Medicina", "latitude": float("nan")},
+        "cut_scores": [
+            {"year": y, "modalities": [
+                {"modality_name": f"Modalidade {m}", "cut_score": rng.uniform(600, 850),
+                 "applicants": rng.randint(10, 900), "vacancies": rng.randint(1, 40),
+                 "partial_scores": [{"day": d, "score": rng.uniform(600, 850)} for d in range(4)]}
+                for m in range(12)
+            ]}
+            for y in (2024, 2025, 2026)
+        ],
+        "weights": None,
+    }
+    return {"filters": filters, "students": students, "course_detail": detail}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serializacao JSON")
+    parser.add_argument("--repeat", type=int, default=200, help="Execucoes por medicao")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  Benchmark - Serializacao JSON das respostas")
+    print("=" * 60)
+    print(f"orjson disponivel: {'sim' if serialization.HAS_ORJSON else 'nao'}\n")
+
+    encoders = [("anterior", legacy_dumps), ("stdlib 1 passo", stdlib_dumps)]
+    if serialization.HAS_ORJSON:
+        encoders.append(("orjson", serialization.dumps))
+
+    for name, payload in sample_payloads().items():
+        assert json.loads(legacy_dumps(payload)) == json.loads(stdlib_dumps(payload))
+        print(f"{name} ({len(legacy_dumps(payload)) / 1024:.0f} KB):")
+        baseline = None
+        for label, encode in encoders:
+            seconds = min(timeit.repeat(lambda: encode(payload), number=args.repeat, repeat=3))
+            per_call = seconds / args.repeat * 1e6
+            baseline = baseline or per_call
+            print(f"  {label:<16} {per_call:10.1f} us/resposta  ({baseline / per_call:4.1f}x)")
+        print()
+
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
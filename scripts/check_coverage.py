@@ -1,70 +1,41 @@
-import os
-import requests
-import json
+#!/usr/bin/env python3
+"""
+Check Coverage
+Database coverage analysis using the local replica (scripts/replicate.py).
 
-# Configuration
-SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://sisymqzxvuktdcbsbpbp.supabase.co")
-SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY", "")
+Usage:
+    python scripts/check_coverage.py [--sync]
+"""
+import argparse
+import sys
+from pathlib import Path
 
-HEADERS = {
-    "apikey": SUPABASE_KEY,
-    "Authorization": f"Bearer {SUPABASE_KEY}",
-    "Content-Type": "application/json"
-}
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-def get_coverage_stats():
+from src.storage import LocalReplica
+
+
+def scalar(replica: LocalReplica, sql: str) -> int:
+    return list(replica.query(sql)[0].values())[0]
+
+
+def get_coverage_stats(replica: LocalReplica):
     print("=" * 70)
     print("SISU 2025 - Database Coverage Analysis")
     print("=" * 70)
     
-    # Get unique states
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/courses?select=state&state=not.is.null",
-        headers=HEADERS
-    )
-    states = set(c['state'] for c in resp.json() if c.get('state'))
-    
-    # Get unique cities
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/courses?select=city&city=not.is.null",
-        headers=HEADERS
-    )
-    cities = set(c['city'] for c in resp.json() if c.get('city'))
-    
-    # Get unique universities
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/courses?select=university&university=not.is.null",
-        headers=HEADERS
-    )
-    universities = set(c['university'] for c in resp.json() if c.get('university'))
-    
-    # Get total courses
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/courses?select=id",
-        headers={**HEADERS, "Prefer": "count=exact"}
-    )
-    total_courses = resp.headers.get('content-range', '0-0/0').split('/')[1]
+    states = {r['state'] for r in replica.query(
+        "SELECT DISTINCT state FROM courses WHERE state IS NOT NULL")}
+    cities = {r['city'] for r in replica.query(
+        "SELECT DISTINCT city FROM courses WHERE city IS NOT NULL")}
+    universities = {r['university'] for r in replica.query(
+        "SELECT DISTINCT university FROM courses WHERE university IS NOT NULL")}
     
-    # Get total cut scores
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/cut_scores?select=id&limit=1",
-        headers={**HEADERS, "Prefer": "count=exact"}
-    )
-    total_cut_scores = resp.headers.get('content-range', '0-0/0').split('/')[1]
-    
-    # Get courses with weights
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/course_weights?select=course_id",
-        headers=HEADERS
-    )
-    courses_with_weights = set(w['course_id'] for w in resp.json())
-    
-    # Get courses with cut scores
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/cut_scores?select=course_id",
-        headers=HEADERS
-    )
-    courses_with_cut_scores = set(cs['course_id'] for cs in resp.json())
+    total_courses = scalar(replica, "SELECT COUNT(*) FROM courses")
+    total_cut_scores = scalar(replica, "SELECT COUNT(*) FROM cut_scores")
+    courses_with_weights = scalar(replica, "SELECT COUNT(DISTINCT course_id) FROM course_weights")
+    courses_with_cut_scores = scalar(replica, "SELECT COUNT(DISTINCT course_id) FROM cut_scores")
     
     print("\n📊 COBERTURA DOS DADOS:")
     print(f"\n🗺️  Estados: {len(states)} de 27 estados brasileiros")
@@ -77,15 +48,15 @@ def get_coverage_stats():
     print(f"   Exemplos: {sorted(list(universities))[:3]}")
     
     print(f"\n📚 Cursos: {total_courses} cursos cadastrados")
-    print(f"   Com pesos (weights): {len(courses_with_weights)} cursos")
-    print(f"   Com notas de corte: {len(courses_with_cut_scores)} cursos")
+    print(f"   Com pesos (weights): {courses_with_weights} cursos")
+    print(f"   Com notas de corte: {courses_with_cut_scores} cursos")
     
     print(f"\n📈 Notas de Corte: {total_cut_scores} registros")
     
     # Calculate coverage percentage
-    if int(total_courses) > 0:
-        weight_coverage = (len(courses_with_weights) / int(total_courses)) * 100
-        cut_score_coverage = (len(courses_with_cut_scores) / int(total_courses)) * 100
+    if total_courses > 0:
+        weight_coverage = (courses_with_weights / total_courses) * 100
+        cut_score_coverage = (courses_with_cut_scores / total_courses) * 100
         
         print(f"\n✅ Completude:")
         print(f"   Pesos: {weight_coverage:.1f}% dos cursos")
@@ -104,5 +75,22 @@ def get_coverage_stats():
     
     print("\n" + "=" * 70)
 
+
+def main():
+    parser = argparse.ArgumentParser(description="Analise de cobertura do banco")
+    parser.add_argument("--sync", action="store_true", help="Atualizar a replica antes")
+    args = parser.parse_args()
+
+    client = None
+    if args.sync:
+        from src.storage import SupabaseClient
+        client = SupabaseClient()
+
+    with LocalReplica(client=client) as replica:
+        if args.sync:
+            replica.sync()
+        get_coverage_stats(replica)
+
+
 if __name__ == "__main__":
-    get_coverage_stats()
+    main()
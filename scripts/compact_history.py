@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Compact History
+Compacts raw timelines and snapshot segments, deletes unreferenced raw
+blobs, and optionally imports legacy per-poll {course_id}_{timestamp}.bin/.json
+files.
+
+Usage:
+    python scripts/compact_history.py
+    python scripts/compact_history.py --migrate-legacy --remove
+    python scripts/compact_history.py --keep-last 100
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add parent to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.config import load_config
+from src.storage.history import HistoryManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compactacao do historico local")
+    parser.add_argument("--migrate-legacy", action="store_true",
+                        help="Importar arquivos legados (.bin/.json por coleta, segmentos raw)")
+    parser.add_argument("--remove", action="store_true",
+                        help="Apagar os arquivos legados apos importar")
+    parser.add_argument("--keep-last", type=int, default=None,
+                        help="Manter apenas os N snapshots mais recentes por curso")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  SISU Monitor - Compactacao de Historico")
+    print("=" * 60)
+
+    config = load_config()
+    history = HistoryManager(config.data_dir)
+
+    if args.migrate_legacy:
+        imported = history.migrate_legacy(remove=args.remove)
+        print(f"\nArquivos legados importados: {imported}")
+
+    removed = history.compact(keep_last=args.keep_last)
+    print(f"Registros raw removidos: {removed['raw']}")
+    print(f"Snapshots removidos: {removed['processed']}")
+    print(f"Blobs raw sem referencia removidos: {removed['blobs']}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
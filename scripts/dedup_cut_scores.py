@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Dedup Cut Scores
+One-shot compaction of the cut_scores history: removes rows whose score,
+applicants and vacancies repeat the previous row of the same modality.
+
+Requires the compact_cut_scores() function from
+supabase/migrations/20250118000000_compact_cut_scores.sql.
+
+Usage:
+    SUPABASE_SERVICE_KEY=... python scripts/dedup_cut_scores.py
+    DATABASE_URL=postgresql://... python scripts/dedup_cut_scores.py --direct
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.storage import SupabaseClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta o historico de cut_scores")
+    parser.add_argument("--direct", action="store_true",
+                        help="Usar conexao PostgreSQL direta (DATABASE_URL)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  SISU - Compactacao de cut_scores")
+    print("=" * 60)
+
+    if args.direct:
+        from src.storage.database import DatabaseStorage
+        storage = DatabaseStorage()
+    else:
+        storage = SupabaseClient()
+
+    if not storage.test_connection():
+        print("❌ Falha na conexão")
+        return 1
+
+    removed = storage.compact_cut_scores()
+    print(f"\nLinhas redundantes removidas: {removed}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Export Data
+Streams the cut score history (joined with course info) to CSV, or cut
+scores, weights and approved students to Parquet partitioned by year, in
+data/exports with bounded memory. The delta format exports only rows added
+or changed since the previous delta (see data/exports/deltas/manifest.json).
+
+Usage:
+    python scripts/export_data.py
+    python scripts/export_data.py --year 2025 --gzip
+    python scripts/export_data.py --format parquet
+    python scripts/export_data.py --format delta
+    DATABASE_URL=postgresql://... python scripts/export_data.py --direct
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.utils.config import load_config
+from src.storage import ExportManager, SupabaseClient
+from src.storage.export import PARQUET_TABLES
+
+
+def iter_rows(storage, table: str, year=None):
+    """Stream a table's rows from either storage backend"""
+    if table == "cut_scores":
+        return storage.iter_cut_score_rows(year=year)
+    if isinstance(storage, SupabaseClient):
+        params = {"year": f"eq.{year}"} if year is not None else None
+        return storage.iter_table(table, params=params)
+    where = "WHERE year = %s" if year is not None else ""
+    return storage.iter_query(
+        f"SELECT * FROM {table} {where} ORDER BY id",
+        (year,) if year is not None else None,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exportacao das notas de corte")
+    parser.add_argument("--format", choices=["csv", "parquet", "delta"], default="csv",
+                        help="Formato de saida")
+    parser.add_argument("--tables", nargs="+", choices=list(PARQUET_TABLES),
+                        default=list(PARQUET_TABLES),
+                        help="Tabelas exportadas em Parquet")
+    parser.add_argument("--year", type=int, default=None,
+                        help="Exportar apenas uma edicao")
+    parser.add_argument("--gzip", action="store_true",
+                        help="Comprimir a saida CSV (.csv.gz)")
+    parser.add_argument("--direct", action="store_true",
+                        help="Usar conexao PostgreSQL direta (DATABASE_URL)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  SISU - Exportacao de Dados")
+    print("=" * 60)
+
+    if args.direct:
+        from src.storage.database import DatabaseStorage
+        storage = DatabaseStorage()
+    else:
+        storage = SupabaseClient()
+
+    if not storage.test_connection():
+        print("❌ Falha na conexão")
+        return 1
+
+    exporter = ExportManager(load_config().data_dir)
+
+    if args.format == "csv":
+        path = exporter.export_scores_stream(
+            iter_rows(storage, "cut_scores", args.year), compress=args.gzip
+        )
+        print(f"\nArquivo gerado: {path}")
+    elif args.format == "delta":
+        entry = exporter.export_delta(storage)
+        if entry is None:
+            print("\nNenhuma mudanca desde a ultima exportacao")
+        else:
+            print(f"\nDelta {entry['sequence']}:")
+            for table, info in entry["tables"].items():
+                print(f"  {table}: {info['rows']} linhas ({info['file']})")
+    else:
+        directory = None
+        for table in args.tables:
+            path = exporter.export_parquet(table, iter_rows(storage, table, args.year),
+                                           directory=directory)
+            directory = path.parent
+            print(f"  {table}: {path}")
+
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,6 +13,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.decoder import decode_course
 from src.decoder.protobuf import parse_message
+from src.storage.supabase_client import SupabaseClient
 import threading
 
 print_lock = threading.Lock()
@@ -33,24 +34,14 @@ STATE_INDICES = {
 TARGET_STATES = ['RN', 'RS', 'RO', 'RR', 'SC', 'SP', 'SE', 'TO']
 
 def get_existing_codes():
-    headers = {"apikey": SUPABASE_KEY, "Authorization": f"Bearer {SUPABASE_KEY}"}
+    client = SupabaseClient(url=SUPABASE_URL, service_key=SUPABASE_KEY)
     existing = set()
-    offset = 0
-    limit = 1000
-    while True:
-        response = requests.get(
-            f"{SUPABASE_URL}/rest/v1/courses?select=code&offset={offset}&limit={limit}", 
-            headers=headers
-        )
-        if response.status_code != 200:
-            break
-        data = response.json()
-        if not data:
-            break
-        existing.update(c['code'] for c in data if c.get('code'))
-        if len(data) < limit:
-            break
-        offset += limit
+    try:
+        for c in client.iter_table("courses", select="code", key="code"):
+            if c.get('code'):
+                existing.add(c['code'])
+    except requests.RequestException:
+        pass
     return existing
 
 
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Maintain Cut Scores
+Periodic maintenance of the partitioned cut_scores history:
+  - creates the partitions for the current and next SISU editions
+  - downsamples closed editions to one snapshot per course/modality/day
+
+Requires supabase/migrations/20250120000000_partition_cut_scores.sql.
+
+Usage:
+    python scripts/maintain_cut_scores.py
+    python scripts/maintain_cut_scores.py --current-year 2026 --since 2024
+    DATABASE_URL=postgresql://... python scripts/maintain_cut_scores.py --direct
+"""
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.storage import SupabaseClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manutencao do historico de cut_scores")
+    parser.add_argument("--current-year", type=int, default=datetime.now().year,
+                        help="Edicao corrente (mantida em resolucao total)")
+    parser.add_argument("--since", type=int, default=2020,
+                        help="Primeira edicao encerrada a reduzir")
+    parser.add_argument("--direct", action="store_true",
+                        help="Usar conexao PostgreSQL direta (DATABASE_URL)")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  SISU - Manutencao de cut_scores")
+    print("=" * 60)
+
+    if args.direct:
+        from src.storage.database import DatabaseStorage
+        storage = DatabaseStorage()
+    else:
+        storage = SupabaseClient()
+
+    if not storage.test_connection():
+        print("❌ Falha na conexão")
+        return 1
+
+    for year in (args.current_year, args.current_year + 1):
+        partition = storage.ensure_cut_scores_partition(year)
+        print(f"  Particao pronta: {partition}")
+
+    total = 0
+    for year in range(args.since, args.current_year):
+        removed = storage.downsample_cut_scores(year)
+        total += removed
+        print(f"  {year}: {removed} snapshots removidos")
+
+    print(f"\nTotal removido: {total}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Replicate
+Incrementally mirrors courses, course_weights, cut_scores and
+approved_students from Supabase into a local SQLite file, so audits can
+run locally instead of paging PostgREST.
+
+Incremental runs pick up new rows (and approved_students updated in
+place, via updated_at) but not rows deleted upstream, e.g. by
+compact_cut_scores; a row-count check reports them and --full drops them.
+
+Usage:
+    python scripts/replicate.py                 # incremental
+    python scripts/replicate.py --full          # rebuild from scratch
+    python scripts/replicate.py --tables cut_scores approved_students
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.storage import LocalReplica, SupabaseClient
+from src.storage.replica import DEFAULT_REPLICA_PATH, REPLICA_TABLES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replica local (SQLite) do banco Supabase")
+    parser.add_argument("--path", type=Path, default=DEFAULT_REPLICA_PATH,
+                        help=f"Arquivo da replica (padrao: {DEFAULT_REPLICA_PATH})")
+    parser.add_argument("--tables", nargs="+", choices=[t.name for t in REPLICA_TABLES],
+                        help="Tabelas a sincronizar (padrao: todas)")
+    parser.add_argument("--full", action="store_true",
+                        help="Reconstruir as tabelas do zero")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("  SISU - Replica local")
+    print("=" * 60)
+
+    start = time.time()
+    with LocalReplica(args.path, client=SupabaseClient()) as replica:
+        written = replica.sync(args.tables, full=args.full)
+        for table, count in written.items():
+            print(f"  {table}: +{count} linhas (hwm={replica.high_water_mark(table)})")
+        stale = replica.stale_tables()
+        for table, (local, upstream) in stale.items():
+            print(f"  AVISO: {table} tem {local} linhas na replica e {upstream} no Supabase "
+                  f"(linhas removidas na origem); rode com --full")
+
+    print(f"\nReplica atualizada em {time.time() - start:.1f}s: {args.path}")
+    print("=" * 60)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
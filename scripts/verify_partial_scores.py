@@ -1,57 +1,66 @@
+#!/usr/bin/env python3
+"""
+Verify Partial Scores
+Checks that recent cut scores carry partial scores, using the local
+replica (scripts/replicate.py).
 
-import os
-import requests
+Usage:
+    python scripts/verify_partial_scores.py [--sync]
+"""
+import argparse
 import json
 import sys
+from pathlib import Path
 
-# Configuration
-SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://sisymqzxvuktdcbsbpbp.supabase.co")
-SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_KEY", "")
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
 
-if not SUPABASE_KEY:
-    print("ERROR: SUPABASE_SERVICE_KEY not set")
-    # Try to grab it from args or file if needed, but usually env is set in run_command
-    sys.exit(1)
+from src.storage import LocalReplica
 
-HEADERS = {
-    "apikey": SUPABASE_KEY,
-    "Authorization": f"Bearer {SUPABASE_KEY}",
-    "Content-Type": "application/json"
-}
 
-def verify_data():
+def verify_data(replica: LocalReplica):
     print("Verifying Partial Scores in Database...")
-    
-    # Query for any cut_score that has non-empty partial_scores
-    # We can't filter by length easily in REST, so we'll fetch a few and check in python
-    # asking for partial_scores is not null might NOT work if it's JSONB, but let's try strict filtering if possible.
-    # Actually, let's just fetch recent ones.
-    
-    resp = requests.get(
-        f"{SUPABASE_URL}/rest/v1/cut_scores?select=course_id,modality_name,partial_scores,year&limit=50&order=captured_at.desc",
-        headers=HEADERS
-    )
-    
-    if resp.status_code != 200:
-        print(f"Error: {resp.status_code} - {resp.text}")
-        return
-
-    data = resp.json()
-    found = 0
-    for row in data:
-        ps = row.get('partial_scores')
-        if ps and isinstance(ps, list) and len(ps) > 0:
-            print(f"\n[FOUND] Course ID {row['course_id']} ({row['year']}) - {row['modality_name']}")
-            print(f"  Partial Scores: {len(ps)} entires")
-            print(f"  Sample: {ps[0]}")
-            found += 1
-            if found >= 3:
-                break
-    
-    if found == 0:
-        print("\n[WARNING] No partial scores found in the last 50 cut_score records.")
+
+    # partial_scores is stored as JSON text in the replica
+    rows = replica.query("""
+        SELECT course_id, modality_name, partial_scores, year
+        FROM cut_scores
+        WHERE json_array_length(partial_scores) > 0
+        ORDER BY captured_at DESC
+        LIMIT 3
+    """)
+    with_partial = list(replica.query("""
+        SELECT COUNT(*) AS n FROM cut_scores
+        WHERE json_array_length(partial_scores) > 0
+    """)[0].values())[0]
+
+    for row in rows:
+        ps = json.loads(row['partial_scores'])
+        print(f"\n[FOUND] Course ID {row['course_id']} ({row['year']}) - {row['modality_name']}")
+        print(f"  Partial Scores: {len(ps)} entries")
+        print(f"  Sample: {ps[0]}")
+
+    if not rows:
+        print("\n[WARNING] No partial scores found in cut_scores.")
     else:
-        print(f"\n[SUCCESS] Found {found} records with partial scores populated.")
+        print(f"\n[SUCCESS] {with_partial} cut_score records with partial scores populated.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica notas parciais no banco")
+    parser.add_argument("--sync", action="store_true", help="Atualizar a replica antes")
+    args = parser.parse_args()
+
+    client = None
+    if args.sync:
+        from src.storage import SupabaseClient
+        client = SupabaseClient()
+
+    with LocalReplica(client=client) as replica:
+        if args.sync:
+            replica.sync()
+        verify_data(replica)
+
 
 if __name__ == "__main__":
-    verify_data()
+    main()
@@ -0,0 +1,142 @@
+"""
+Response Cache
+Bounded TTL+LRU cache of rendered API responses with strong ETags
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    """A rendered response body and its validators"""
+    body: bytes
+    etag: str
+    expires_at: float
+    tags: frozenset
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a response body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCache:
+    """Thread-safe LRU of rendered responses with per-entry TTL and tags.
+
+    Entries are tagged (e.g. ``course:37``) so the sync pipeline can drop
+    everything derived from a course without knowing the cache keys.
+    """
+
+    def __init__(self, maxsize: int = 2048):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, body: bytes, ttl: float, tags: Iterable[str] = ()) -> CachedResponse:
+        entry = CachedResponse(body, make_etag(body), time.monotonic() + ttl, frozenset(tags))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, tags: Optional[Iterable[str]] = None) -> int:
+        """Drop entries carrying any of ``tags`` (all entries if None).
+
+        Returns:
+            Number of entries dropped
+        """
+        with self._lock:
+            if tags is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                tags = set(tags)
+                keys = [k for k, e in self._entries.items() if e.tags & tags]
+                for k in keys:
+                    del self._entries[k]
+                dropped = len(keys)
+            self.invalidations += dropped
+        return dropped
+
+    def stats(self) -> dict:
+        """Hit-rate metrics"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def invalidate_api_cache(codes: Optional[Iterable[int]] = None, timeout: float = 5) -> bool:
+    """Ask a running API to drop cached responses of courses (by SISU code).
+
+    Used by the sync pipeline after writing new data. Does nothing unless
+    API_URL and API_ADMIN_TOKEN are set; failures are logged, never raised.
+
+    Args:
+        codes: SISU course codes to invalidate (None: everything)
+
+    Returns:
+        True if the API acknowledged the invalidation
+    """
+    api_url = os.environ.get("API_URL")
+    token = os.environ.get("API_ADMIN_TOKEN")
+    if not api_url or not token:
+        return False
+
+    payload = {"codes": sorted(set(codes))} if codes is not None else {}
+    try:
+        resp = requests.post(
+            f"{api_url.rstrip('/')}/api/cache/invalidate",
+            json=payload,
+            headers={"X-Admin-Token": token},
+            timeout=timeout,
+        )
+        resp.raise_for_status()
+        return True
+    except requests.RequestException as e:
+        logger.warning(f"API cache invalidation failed: {e}")
+        return False
@@ -0,0 +1,211 @@
+"""
+Facet Index
+In-memory state -> city -> university -> courses index behind /api/filters
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+COURSE_FIELDS = ("id", "code", "name", "degree", "schedule")
+
+
+@dataclass
+class FacetSnapshot:
+    """Facet tree plus the precomputed sorted lists served as-is.
+
+    Keys are upper-cased so lookups are case-insensitive; the first spelling
+    seen for a key is the one displayed.
+    """
+    states: list[str] = field(default_factory=list)
+    cities: list[str] = field(default_factory=list)
+    universities: list[str] = field(default_factory=list)
+    # STATE -> sorted city names
+    state_cities: dict[str, list[str]] = field(default_factory=dict)
+    # (STATE, CITY) -> sorted university names
+    city_universities: dict[tuple[str, str], list[str]] = field(default_factory=dict)
+    # (STATE, CITY, UNIVERSITY) -> courses
+    university_courses: dict[tuple[str, str, str], list[dict]] = field(default_factory=dict)
+    course_count: int = 0
+
+    @classmethod
+    def build(cls, courses: Iterable[dict]) -> "FacetSnapshot":
+        states: dict[str, str] = {}
+        cities: dict[str, dict[str, str]] = {}
+        universities: dict[tuple[str, str], dict[str, str]] = {}
+        all_universities: dict[str, str] = {}
+        city_labels: set[str] = set()
+        snapshot = cls()
+
+        for c in courses:
+            snapshot.course_count += 1
+            state, city, university = c.get("state"), c.get("city"), c.get("university")
+            # Every university is listed, even without a state
+            if university:
+                all_universities.setdefault(university.upper(), university)
+            if not state:
+                continue
+            s = state.upper()
+            states.setdefault(s, state)
+            if not city:
+                continue
+            ci = city.upper()
+            cities.setdefault(s, {}).setdefault(ci, city)
+            city_labels.add(f"{city}-{state}")
+            if not university:
+                continue
+            u = university.upper()
+            universities.setdefault((s, ci), {}).setdefault(u, university)
+            snapshot.university_courses.setdefault((s, ci, u), []).append(
+                {k: c.get(k) for k in COURSE_FIELDS}
+            )
+
+        snapshot.states = sorted(states.values())
+        snapshot.cities = sorted(city_labels)
+        snapshot.universities = sorted(all_universities.values())
+        snapshot.state_cities = {s: sorted(names.values()) for s, names in cities.items()}
+        snapshot.city_universities = {k: sorted(names.values()) for k, names in universities.items()}
+        return snapshot
+
+
+class BackgroundIndex:
+    """In-memory snapshot rebuilt in the background.
+
+    The snapshot is rebuilt when ``ttl`` seconds have passed or, checked
+    every ``check_interval`` seconds, when ``version()`` returns a new change
+    token (e.g. the newest ``courses.updated_at``). Requests always read the
+    current snapshot; a rebuild swaps in a new one atomically. Subclasses
+    set ``snapshot_class``, whose ``build(rows)`` turns the loader output
+    into a snapshot with a ``course_count``.
+    """
+
+    name = "index"
+    snapshot_class: Any = None
+
+    def __init__(
+        self,
+        loader: Callable[[], Iterable[dict]],
+        ttl: float = 3600,
+        version: Optional[Callable[[], Any]] = None,
+        check_interval: float = 60,
+    ):
+        """
+        Args:
+            loader: Returns the rows the snapshot is built from
+            ttl: Maximum age of the snapshot in seconds
+            version: Cheap change token; a new value triggers a rebuild
+            check_interval: Seconds between version checks
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.version = version
+        self.check_interval = check_interval
+
+        self._snapshot = None
+        self._built_at = 0.0
+        self._token: Any = None
+        self._build_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def refresh(self):
+        """Rebuild the snapshot now"""
+        with self._build_lock:
+            token = self.version() if self.version else None
+            started = time.monotonic()
+            snapshot = self.snapshot_class.build(self.loader())
+            self._snapshot = snapshot
+            self._built_at = time.monotonic()
+            self._token = token
+        logger.info(f"{self.name.capitalize()} index built: {snapshot.course_count} courses "
+                    f"in {self._built_at - started:.2f}s")
+        return snapshot
+
+    def invalidate(self):
+        """Signal that the data changed; the background thread rebuilds soon"""
+        self._built_at = 0.0
+        self._wake.set()
+
+    def snapshot(self):
+        """Current snapshot, built synchronously on first use"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+        return snapshot
+
+    def _stale(self) -> bool:
+        if time.monotonic() - self._built_at >= self.ttl:
+            return True
+        return self.version is not None and self.version() != self._token
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self._snapshot is None or self._stale():
+                    self.refresh()
+            except Exception as e:
+                logger.warning(f"{self.name.capitalize()} index refresh failed: {e}")
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Build in a background thread and keep the snapshot fresh"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+class FacetIndex(BackgroundIndex):
+    """Facet tree behind /api/filters, rebuilt in the background"""
+
+    name = "facet"
+    snapshot_class = FacetSnapshot
+
+    def filters(self, state: Optional[str] = None, city: Optional[str] = None,
+                university: Optional[str] = None) -> dict:
+        """Filter options for the given selection (same shape as /api/filters)"""
+        snap = self.snapshot()
+
+        if university and city and state:
+            return {
+                "states": snap.states,
+                "cities": [city],
+                "universities": [university],
+                "courses": snap.university_courses.get(
+                    (state.upper(), city.upper(), university.upper()), []
+                ),
+            }
+        if city and state:
+            return {
+                "states": snap.states,
+                "cities": [city],
+                "universities": snap.city_universities.get((state.upper(), city.upper()), []),
+                "courses": [],
+            }
+        if state:
+            return {
+                "states": snap.states,
+                "cities": snap.state_cities.get(state.upper(), []),
+                "universities": [],
+                "courses": [],
+            }
+        return {
+            "states": snap.states,
+            "cities": snap.cities,
+            "universities": snap.universities,
+            "courses": [],
+        }
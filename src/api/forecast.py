@@ -0,0 +1,211 @@
+"""
+Cut Score Forecast
+Predicted final cut scores from the day-by-day partial score trajectories
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+import numpy as np
+
+from .facets import BackgroundIndex
+
+logger = logging.getLogger(__name__)
+
+# Residual quantiles of the uncertainty band (80% interval)
+BAND_QUANTILES = (0.1, 0.9)
+
+# Days with fewer past-year samples than this use the fit pooled over all days
+MIN_SAMPLES = 30
+
+
+def _day_number(day, position: int) -> int:
+    """0-based day index of a partial score ("1", "2", ... or ordinal position)"""
+    try:
+        return int(day) - 1
+    except (TypeError, ValueError):
+        return position
+
+
+@dataclass
+class Trajectories:
+    """Partial scores of many course-modality series as a (series x days) matrix"""
+    keys: list[tuple]  # (code, modality_key, year)
+    names: list[str]
+    partial: np.ndarray  # NaN where a day is missing
+    final: np.ndarray  # Cut score of the series (final once the year closed)
+
+    @classmethod
+    def build(cls, rows: Iterable[dict]) -> "Trajectories":
+        keys, names, series, final = [], [], [], []
+        for r in rows:
+            code = (r.get("courses") or {}).get("code", r.get("code"))
+            scores = {}
+            for pos, p in enumerate(r.get("partial_scores") or []):
+                if p.get("score") is not None:
+                    scores[_day_number(p.get("day"), pos)] = float(p["score"])
+            if code is None or not scores:
+                continue
+            keys.append((code, r.get("modality_key") or r.get("modality_name"), r.get("year")))
+            names.append(r.get("modality_name") or "")
+            series.append(scores)
+            final.append(np.nan if r.get("cut_score") is None else float(r["cut_score"]))
+
+        days = max((max(s) for s in series), default=-1) + 1
+        partial = np.full((len(series), days), np.nan)
+        for i, scores in enumerate(series):
+            for d, score in scores.items():
+                if d >= 0:
+                    partial[i, d] = score
+        return cls(keys, names, partial, np.array(final, dtype=np.float64))
+
+
+def trend(partial: np.ndarray) -> np.ndarray:
+    """Least-squares slope of each series over days 0..d, for every d.
+
+    Computed with cumulative sums over the observed days, so every prefix
+    of every series is fitted at once. Prefixes with fewer than two
+    observed days have slope 0.
+    """
+    observed = ~np.isnan(partial)
+    x = np.where(observed, np.arange(partial.shape[1], dtype=np.float64), 0.0)
+    y = np.where(observed, partial, 0.0)
+    n = np.cumsum(observed, axis=1)
+    sx, sy = np.cumsum(x, axis=1), np.cumsum(y, axis=1)
+    sxx, sxy = np.cumsum(x * x, axis=1), np.cumsum(x * y, axis=1)
+    denom = n * sxx - sx * sx
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(denom > 0, (n * sxy - sx * sy) / denom, 0.0)
+    return slope
+
+
+def carry_forward(partial: np.ndarray) -> np.ndarray:
+    """Last observed score up to each day (NaN before the first one)"""
+    idx = np.where(~np.isnan(partial), np.arange(partial.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return np.take_along_axis(partial, idx, axis=1)
+
+
+def _features(slope: np.ndarray, own: np.ndarray) -> np.ndarray:
+    """Design matrix: intercept, trend, previous-year drift (0 if unknown) and its indicator"""
+    has_own = ~np.isnan(own)
+    return np.stack([np.ones_like(slope), slope, np.where(has_own, own, 0.0),
+                     has_own.astype(np.float64)], axis=-1)
+
+
+@dataclass
+class DriftModel:
+    """Per-day least squares of (final - last partial) on the trajectory features"""
+    coef: np.ndarray  # (days, features)
+    band: np.ndarray  # (days, 2) residual quantiles
+    samples: np.ndarray  # (days,) training series per day
+
+    @classmethod
+    def fit(cls, last: np.ndarray, slope: np.ndarray, own: np.ndarray,
+            final: np.ndarray) -> "DriftModel":
+        """Fit from past-year series; all arrays are (series x days) except final"""
+        days = last.shape[1]
+        target = final[:, None] - last
+        X = _features(slope, own)
+        valid = ~np.isnan(target)
+
+        def solve(mask):
+            coef, *_ = np.linalg.lstsq(X[mask], target[mask], rcond=None)
+            residual = target[mask] - X[mask] @ coef
+            return coef, np.quantile(residual, BAND_QUANTILES)
+
+        n_features = X.shape[-1]
+        coef = np.zeros((days, n_features))
+        band = np.zeros((days, 2))
+        samples = valid.sum(axis=0)
+        if valid.sum() >= MIN_SAMPLES:
+            pooled = solve(valid)
+        else:
+            pooled = (np.zeros(n_features), np.zeros(2))
+
+        for d in range(days):
+            mask = np.zeros_like(valid)
+            mask[:, d] = valid[:, d]
+            coef[d], band[d] = solve(mask) if samples[d] >= MIN_SAMPLES else pooled
+        return cls(coef, band, samples)
+
+    def predict(self, last: np.ndarray, slope: np.ndarray, own: np.ndarray,
+                day: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Predicted final score and band of series observed up to ``day``"""
+        day = np.minimum(day, len(self.coef) - 1)
+        drift = (_features(slope, own) * self.coef[day]).sum(axis=1)
+        predicted = last + drift
+        return predicted, predicted + self.band[day, 0], predicted + self.band[day, 1]
+
+
+@dataclass
+class ForecastSnapshot:
+    """Forecasts of the newest year, keyed by SISU course code"""
+    year: Optional[int] = None
+    forecasts: dict[int, list[dict]] = field(default_factory=dict)
+
+    @property
+    def course_count(self) -> int:
+        return len(self.forecasts)
+
+    @classmethod
+    def build(cls, rows: Iterable[dict]) -> "ForecastSnapshot":
+        """Fit on past years and forecast the newest one.
+
+        Args:
+            rows: latest_cut_scores rows (code or embedded ``courses.code``,
+                year, modality_key, modality_name, cut_score, partial_scores)
+        """
+        t = Trajectories.build(rows)
+        if not t.keys:
+            return cls()
+
+        years = np.array([k[2] for k in t.keys])
+        year = int(years.max())
+        last = carry_forward(t.partial)
+        slope = trend(t.partial)
+
+        # Drift of the same course-modality at each day of the previous year
+        row_of = {k: i for i, k in enumerate(t.keys)}
+        prev = np.array([row_of.get((k[0], k[1], k[2] - 1), -1) for k in t.keys])
+        own = np.full_like(last, np.nan)
+        has_prev = prev >= 0
+        own[has_prev] = t.final[prev[has_prev], None] - last[prev[has_prev]]
+
+        train = years < year
+        model = DriftModel.fit(last[train], slope[train], own[train], t.final[train])
+
+        current = np.flatnonzero(~train)
+        day = np.array([np.flatnonzero(~np.isnan(t.partial[i])).max() for i in current], dtype=np.intp)
+        predicted, low, high = model.predict(
+            last[current, day], slope[current, day], own[current, day], day
+        )
+
+        snapshot = cls(year=year)
+        for n, i in enumerate(current):
+            code, _, _ = t.keys[i]
+            snapshot.forecasts.setdefault(code, []).append({
+                "modality_name": t.names[i],
+                "day": int(day[n]) + 1,
+                "last_partial": round(float(last[i, day[n]]), 2),
+                "predicted": round(float(predicted[n]), 2),
+                "low": round(float(low[n]), 2),
+                "high": round(float(high[n]), 2),
+                "samples": int(model.samples[min(day[n], len(model.samples) - 1)]),
+            })
+        return snapshot
+
+
+class ForecastIndex(BackgroundIndex):
+    """Precomputed cut score forecasts, refit in the background after syncs"""
+
+    name = "forecast"
+    snapshot_class = ForecastSnapshot
+
+    def course(self, code: int) -> Optional[dict]:
+        """Forecasts of a course's modalities (None if it has none)"""
+        snap = self.snapshot()
+        forecasts = snap.forecasts.get(code)
+        if forecasts is None:
+            return None
+        return {"code": code, "year": snap.year, "forecasts": forecasts}
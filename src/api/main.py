@@ -2,11 +2,11 @@
 XTRI SISU 2026 - FastAPI Backend
 API para servir dados do SISU
 """
-import math
-import numpy as np
-from typing import Optional, List, Dict, Any
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+import os
+from contextlib import asynccontextmanager
+from typing import Callable, Optional, List, Dict, Any, Iterable
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 
 import sys
@@ -14,30 +14,34 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from src.storage.supabase_client import SupabaseClient
+from src.api.facets import FacetIndex
+from src.api.forecast import ForecastIndex
+from src.api.ranks import RankIndex
+from src.api.cache import ResponseCache, etag_matches
+from src.api.serialization import dumps
+from src.api.simulation import (
+    BatchSimulationRequest, SimulationIndex, SimulationRequest, batch_csv, batch_ndjson
+)
 
 
 # Custom JSON Response to handle NaN values
 class SafeJSONResponse(JSONResponse):
     def render(self, content) -> bytes:
-        cleaned_content = clean_nan_values(content)
-        return super().render(cleaned_content)
-
-
-def clean_nan_values(obj):
-    """Recursively clean NaN and Infinity values"""
-    if isinstance(obj, dict):
-        return {k: clean_nan_values(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [clean_nan_values(item) for item in obj]
-    elif isinstance(obj, float):
-        if math.isnan(obj) or math.isinf(obj):
-            return None
-        return obj
-    elif isinstance(obj, np.floating):
-        if np.isnan(obj) or np.isinf(obj):
-            return None
-        return float(obj)
-    return obj
+        # NaN/Infinity become null during encoding (no cleaned copy of the tree)
+        return dumps(content)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build in-memory indexes at startup and keep them fresh in the background"""
+    if supabase:
+        facet_index.start()
+        simulation_index.start()
+        forecast_index.start()
+    yield
+    facet_index.stop()
+    simulation_index.stop()
+    forecast_index.stop()
 
 
 # Create FastAPI app
@@ -45,7 +49,8 @@ app = FastAPI(
     title="XTRI SISU 2026 API",
     description="API para consulta de dados do SISU 2026",
     version="1.0.0",
-    default_response_class=SafeJSONResponse
+    default_response_class=SafeJSONResponse,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -65,6 +70,111 @@ except ValueError as e:
     supabase = None
 
 
+def _load_facet_courses():
+    return supabase.iter_table(
+        "courses",
+        select="id,code,name,state,city,university,degree,schedule"
+    )
+
+
+def _courses_version():
+    """Newest courses.updated_at and the course count, the facet index change signal.
+
+    updated_at only moves when a course's metadata actually changes (the
+    monitor re-saves every course each cycle); the count catches deletes.
+    """
+    try:
+        latest, total = supabase._get_with_count(
+            "courses",
+            params={"select": "updated_at", "order": "updated_at.desc", "limit": 1}
+        )
+    except Exception:
+        return None  # Column missing (older schema): rely on the TTL
+    return (latest[0]["updated_at"] if latest else None, total)
+
+
+def _load_simulation_courses():
+    return supabase.iter_table(
+        "courses",
+        select=(
+            "id,code,name,university,city,state,"
+            "course_weights(year,peso_red,peso_ling,peso_mat,peso_ch,peso_cn,"
+            "min_red,min_ling,min_mat,min_ch,min_cn,min_enem),"
+            "latest_cut_scores(year,modality_code,modality_name,cut_score)"
+        ),
+        page=500
+    )
+
+
+def _load_forecast_rows():
+    return supabase.iter_table(
+        "latest_cut_scores",
+        select="id,year,modality_key,modality_name,cut_score,partial_scores,courses(code)",
+        page=2000
+    )
+
+
+def _cut_scores_version():
+    """Courses version plus the newest latest_cut_scores.captured_at"""
+    try:
+        latest = supabase._get(
+            "latest_cut_scores",
+            params={"select": "captured_at", "order": "captured_at.desc", "limit": 1}
+        )
+    except Exception:
+        return None
+    return (_courses_version(), latest[0]["captured_at"] if latest else None)
+
+
+# Facet tree behind /api/filters: rebuilt hourly, or within a minute of a
+# course being added or updated
+facet_index = FacetIndex(_load_facet_courses, ttl=3600, version=_courses_version)
+
+# Weights, minimums and latest cut scores of every course behind /api/simulate
+simulation_index = SimulationIndex(_load_simulation_courses, ttl=3600, version=_cut_scores_version)
+
+# Final cut score forecasts of the current year, refit when cut scores change
+forecast_index = ForecastIndex(_load_forecast_rows, ttl=3600, version=_cut_scores_version)
+
+# Sorted approved-student scores per course, loaded on first rank lookup
+rank_index = RankIndex(lambda code: supabase.get_course_approved(code), maxsize=512, ttl=3600)
+
+# Rendered course responses, dropped by the sync pipeline via /api/cache/invalidate
+response_cache = ResponseCache(maxsize=2048)
+
+# SISU editions shown on the course detail page
+DETAIL_YEARS = [2024, 2025, 2026]
+
+# Seconds a cached response stays fresh, per route
+CACHE_TTLS = {
+    "course_lookup": 60,
+    "course_detail": 60,
+}
+
+
+def cached_response(
+    request: Request,
+    key: str,
+    route: str,
+    build: Callable[[], dict],
+    tags: Callable[[dict], Iterable[str]],
+) -> Response:
+    """Serve a JSON payload from the response cache, building it on a miss.
+
+    Answers 304 when If-None-Match carries the current ETag.
+    """
+    ttl = CACHE_TTLS[route]
+    entry = response_cache.get(key)
+    if entry is None:
+        payload = build()
+        entry = response_cache.set(key, SafeJSONResponse(payload).body, ttl, tags(payload))
+
+    headers = {"ETag": entry.etag, "Cache-Control": f"public, max-age={ttl}"}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(entry.body, media_type="application/json", headers=headers)
+
+
 @app.get("/")
 async def root():
     """Root endpoint - redirects to API documentation"""
@@ -91,6 +201,7 @@ async def health_check():
 
 @app.get("/api/courses")
 async def get_courses(
+    request: Request,
     q: Optional[str] = Query(None, description="Search query (name, university, city)"),
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
@@ -102,62 +213,28 @@ async def get_courses(
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
-        if id:
-            # Get full course details by ID
-            course = supabase._get("courses", params={"id": f"eq.{id}"})
-            if not course:
-                raise HTTPException(status_code=404, detail="Course not found")
-            
-            course_id = course[0]["id"]
-            
-            # Get weights and cut scores
-            weights = supabase._get("course_weights", params={"course_id": f"eq.{course_id}"})
-            cut_scores = supabase._get(
-                "cut_scores", 
-                params={"course_id": f"eq.{course_id}", "order": "captured_at.desc"}
-            )
-            
-            # Get latest cut scores per modality
-            latest_scores = {}
-            for score in cut_scores:
-                key = f"{score.get('year')}-{score.get('modality_code')}"
-                if key not in latest_scores:
-                    latest_scores[key] = score
-            
-            return {
-                **course[0],
-                "weights": weights,
-                "cut_scores": list(latest_scores.values())
-            }
-        
-        if code:
-            # Get full course details by code
-            course = supabase.get_course_by_code(code)
-            if not course:
-                raise HTTPException(status_code=404, detail="Course not found")
-            
-            course_id = course["id"]
-            
-            # Get weights and cut scores
-            weights = supabase._get("course_weights", params={"course_id": f"eq.{course_id}"})
-            cut_scores = supabase._get(
-                "cut_scores", 
-                params={"course_id": f"eq.{course_id}", "order": "captured_at.desc"}
-            )
-            
-            # Get latest cut scores per modality
-            latest_scores = {}
-            for score in cut_scores:
-                key = f"{score.get('year')}-{score.get('modality_code')}"
-                if key not in latest_scores:
-                    latest_scores[key] = score
-            
-            return {
-                **course,
-                "weights": weights,
-                "cut_scores": list(latest_scores.values())
-            }
-        
+        if id or code:
+            def build_lookup():
+                # Course, all weights and the latest cut score of each year/modality
+                if id:
+                    course = supabase.get_course_detail(course_id=id)
+                else:
+                    course = supabase.get_course_detail(code=code)
+                if not course:
+                    raise HTTPException(status_code=404, detail="Course not found")
+
+                weights = course.pop("course_weights", None) or []
+                cut_scores = course.pop("latest_cut_scores", None) or []
+                return {
+                    **course,
+                    "weights": weights,
+                    "cut_scores": cut_scores
+                }
+
+            key = f"courses?id={id}" if id else f"courses?code={code}"
+            return cached_response(request, key, "course_lookup", build_lookup,
+                                   tags=lambda p: [f"course:{p.get('code')}"])
+
         if q and len(q) >= 2:
             # Search mode
             results = supabase.search_courses(q, limit)
@@ -183,65 +260,68 @@ async def get_courses(
                 "offset": offset
             }
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/courses/{code}")
-async def get_course_by_code(code: int):
+async def get_course_by_code(code: int, request: Request):
     """Get course by SISU code with cut scores"""
     if not supabase:
         raise HTTPException(status_code=503, detail="Database not configured")
     
-    try:
-        course = supabase.get_course_by_code(code)
+    def build():
+        # Course, latest cut scores and weights of every year in one request
+        course = supabase.get_course_detail(code, DETAIL_YEARS)
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
-        
-        # Get cut scores and weights for this course
-        course_id = course.get("id")
-        cut_scores = []
+
+        scores_by_year: Dict[int, list] = {}
+        for row in course.pop("latest_cut_scores", None) or []:
+            scores_by_year.setdefault(row["year"], []).append(row)
+        weights_by_year = {w["year"]: w for w in course.pop("course_weights", None) or []}
+
+        cut_scores = [
+            {"year": year, "modalities": scores_by_year[year]}
+            for year in DETAIL_YEARS if scores_by_year.get(year)
+        ]
+
+        # Weights of the newest year available, in the frontend format
         weights = None
-        
-        if course_id:
-            # Get cut scores for years 2024, 2025, 2026
-            for year in [2024, 2025, 2026]:
-                year_scores = supabase.get_latest_cut_scores(course_id, year)
-                if year_scores:
-                    cut_scores.append({
-                        "year": year,
-                        "modalities": year_scores
-                    })
-            
-            # Get weights for 2026 (or latest available)
-            for year in [2026, 2025, 2024]:
-                weights_data = supabase.get_weights(course_id, year)
-                if weights_data:
-                    # Transform to frontend expected format
-                    weights = {
-                        "pesos": {
-                            "redacao": weights_data.get("peso_red", 1),
-                            "linguagens": weights_data.get("peso_ling", 1),
-                            "matematica": weights_data.get("peso_mat", 1),
-                            "humanas": weights_data.get("peso_ch", 1),
-                            "natureza": weights_data.get("peso_cn", 1)
-                        },
-                        "notas_minimas": {
-                            "redacao": weights_data.get("min_red", 0),
-                            "linguagens": weights_data.get("min_ling", 0),
-                            "matematica": weights_data.get("min_mat", 0),
-                            "humanas": weights_data.get("min_ch", 0),
-                            "natureza": weights_data.get("min_cn", 0)
-                        },
-                        "year": year
-                    }
-                    break
-        
+        if weights_by_year:
+            year = max(weights_by_year)
+            weights_data = weights_by_year[year]
+            weights = {
+                "pesos": {
+                    "redacao": weights_data.get("peso_red", 1),
+                    "linguagens": weights_data.get("peso_ling", 1),
+                    "matematica": weights_data.get("peso_mat", 1),
+                    "humanas": weights_data.get("peso_ch", 1),
+                    "natureza": weights_data.get("peso_cn", 1)
+                },
+                "notas_minimas": {
+                    "redacao": weights_data.get("min_red", 0),
+                    "linguagens": weights_data.get("min_ling", 0),
+                    "matematica": weights_data.get("min_mat", 0),
+                    "humanas": weights_data.get("min_ch", 0),
+                    "natureza": weights_data.get("min_cn", 0)
+                },
+                "year": year
+            }
+
         return {
             "course": course,
             "cut_scores": cut_scores,
             "weights": weights
         }
+
+    try:
+        return cached_response(request, f"course/{code}", "course_detail", build,
+                               tags=lambda p: [f"course:{code}"])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -249,60 +329,134 @@ async def get_course_by_code(code: int):
 @app.get("/api/courses/{code}/students")
 async def get_course_students(
     code: int,
-    page: int = Query(1, ge=1),
+    page: int = Query(1, ge=1, description="Offset paging (prefer the after_* cursor)"),
     limit: int = Query(50, ge=1, le=100),
-    year: Optional[int] = None
+    year: Optional[int] = None,
+    modality_code: Optional[int] = None,
+    call_number: Optional[int] = None,
+    after_rank: Optional[int] = Query(None, description="Cursor: rank of the last row seen"),
+    after_modality: Optional[int] = Query(None, description="Cursor: modality_code of the last row seen"),
+    after_call: Optional[int] = Query(None, description="Cursor: call_number of the last row seen"),
+    count: str = Query("exact", pattern="^(exact|planned|estimated)$")
 ):
-    """Get approved students for a course"""
+    """Get approved students for a course, ordered by rank.
+
+    Page with the ``next`` cursor of the previous response (keyset
+    pagination: deep pages are as fast as the first). ``total`` (first
+    page) is the size of the filtered list and ``remaining`` the rows
+    after this page; the course and its latest year are resolved in
+    one request.
+    """
     if not supabase:
         raise HTTPException(status_code=503, detail="Database not configured")
-    
+
+    # rank alone is unique only within a modality and call
+    fixed_list = modality_code is not None and call_number is not None
+    if after_rank is not None and not fixed_list and (after_modality is None or after_call is None):
+        raise HTTPException(
+            status_code=400,
+            detail="after_modality and after_call are required unless modality_code and call_number are set"
+        )
+
     try:
-        # Get course first
-        course = supabase.get_course_by_code(code)
+        course = supabase.get_course_for_students(code)
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
-        
-        course_id = course["id"]
-        offset = (page - 1) * limit
-        
-        # If no year specified, find the latest year with data
-        if not year:
-            latest_year_result = supabase._get(
-                "approved_students",
-                params={
-                    "course_id": f"eq.{course_id}",
-                    "select": "year",
-                    "order": "year.desc",
-                    "limit": 1
-                }
-            )
-            if latest_year_result:
-                year = latest_year_result[0].get("year")
-        
-        params = {
-            "course_id": f"eq.{course_id}",
-            "order": "rank.asc",
-            "limit": limit,
-            "offset": offset
-        }
-        
-        if year:
-            params["year"] = f"eq.{year}"
-        
-        students = supabase._get("approved_students", params=params)
-        
+
+        latest_year = course.pop("latest_year")
+        year = year or latest_year
+
+        if after_rank is None:
+            after = None
+        elif after_modality is None or after_call is None:
+            after = (after_rank,)
+        else:
+            after = (after_rank, after_modality, after_call)
+
+        students, total = supabase.get_approved_students_page(
+            course["id"],
+            year=year,
+            modality_code=modality_code,
+            call_number=call_number,
+            after=after,
+            limit=limit,
+            offset=(page - 1) * limit,
+            count=count,
+        )
+
+        # With a cursor the count covers the rows after it, not the whole list
+        skipped = 0 if after else (page - 1) * limit
+        remaining = None if total is None else max(total - skipped - len(students), 0)
+        has_more = len(students) == limit if remaining is None else remaining > 0
+        last = students[-1] if students else None
+
         return {
             "students": students,
             "course": course,
             "year": year,
             "page": page,
             "limit": limit,
-            "count": len(students)
+            "count": len(students),
+            "total": None if after else total,
+            "remaining": remaining,
+            "has_more": has_more,
+            "next": {
+                "after_rank": last["rank"],
+                "after_modality": last["modality_code"],
+                "after_call": last["call_number"],
+            } if has_more and last else None
         }
-    
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/api/courses/{code}/rank")
+async def get_course_rank(
+    code: int,
+    score: float = Query(..., ge=0, le=1000),
+    modality_code: int = Query(..., description="SISU modality code"),
+    year: Optional[int] = None,
+    call_number: int = Query(1, ge=1),
+    neighbors: int = Query(3, ge=0, le=20)
+):
+    """Where a score would place in a course's approved list.
+
+    Binary search over the course's sorted scores, cached in memory
+    per (year, modality, call); returns the implied rank and the
+    students just above and below it.
+    """
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not configured")
+
+    try:
+        result = rank_index.lookup(code, score, modality_code, year, call_number, neighbors)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return result
+
+
+@app.get("/api/courses/{code}/forecast")
+async def get_course_forecast(code: int):
+    """Predicted final cut score of each modality, with an 80% band.
+
+    Forecasts are fitted from the partial score trajectories of the
+    current and past years and precomputed for the whole catalog.
+    """
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not configured")
+
+    try:
+        forecast = forecast_index.course(code)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if forecast is None:
+        raise HTTPException(status_code=404, detail="No forecast for this course")
+    return forecast
 
 
 @app.get("/api/filters")
@@ -316,104 +470,83 @@ async def get_filters(
         raise HTTPException(status_code=503, detail="Database not configured")
     
     try:
-        # Get all courses to extract unique values (with pagination, max 100 per request)
-        all_courses = []
-        offset = 0
-        batch_size = 100
-        max_courses = 20000  # Safety limit
-        
-        while len(all_courses) < max_courses:
-            batch = supabase._get(
-                "courses",
-                params={
-                    "select": "id,code,name,state,city,university,degree,schedule",
-                    "limit": batch_size,
-                    "offset": offset,
-                    "order": "id"
-                }
-            )
-            if not batch:
-                break
-            all_courses.extend(batch)
-            if len(batch) < batch_size:
-                break
-            offset += batch_size
-        
-        # Extract unique states (always return all)
-        unique_states = sorted(list(set([c.get("state") for c in all_courses if c.get("state")])))
-        
-        # If university is provided, return courses for that university
-        if university and city and state:
-            # Get courses for the selected university, city and state
-            university_courses = [
-                {
-                    "id": c.get("id"),
-                    "code": c.get("code"),
-                    "name": c.get("name"),
-                    "degree": c.get("degree"),
-                    "schedule": c.get("schedule")
-                }
-                for c in all_courses 
-                if c.get("university", "").upper() == university.upper() and c.get("city", "").upper() == city.upper() and c.get("state", "").upper() == state.upper()
-            ]
-            return {
-                "states": unique_states,
-                "cities": [city],
-                "universities": [university],
-                "courses": university_courses
-            }
-        
-        # If city is provided, filter universities by state and city
-        if city and state:
-            # Get universities for the selected state and city
-            city_universities = sorted(list(set([
-                c.get("university") for c in all_courses 
-                if c.get("university") and c.get("city", "").upper() == city.upper() and c.get("state", "").upper() == state.upper()
-            ])))
-            return {
-                "states": unique_states,
-                "cities": [city],
-                "universities": city_universities,
-                "courses": []
-            }
-        
-        # If state is provided, filter cities by that state
-        if state:
-            # Get cities only for the selected state
-            state_cities = sorted(list(set([
-                c.get("city") for c in all_courses 
-                if c.get("city") and c.get("state", "").upper() == state.upper()
-            ])))
-            return {
-                "states": unique_states,
-                "cities": state_cities,
-                "universities": [],
-                "courses": []
-            }
-        
-        # Return all cities with state suffix for initial load
-        unique_cities = sorted(list(set([
-            f"{c.get('city')}-{c.get('state')}" for c in all_courses 
-            if c.get("city") and c.get("state")
-        ])))
-        unique_universities = sorted(list(set([c.get("university") for c in all_courses if c.get("university")])))
-        
-        return {
-            "states": unique_states,
-            "cities": unique_cities,
-            "universities": unique_universities,
-            "courses": []
-        }
-    
+        return facet_index.filters(state=state, city=city, university=university)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Response cache hit-rate metrics"""
+    return {"responses": response_cache.stats()}
+
+
+@app.post("/api/cache/invalidate")
+async def invalidate_cache(
+    data: Optional[Dict[str, Any]] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Drop cached responses of the given course codes (all if none given).
+
+    Called by the sync pipeline; requires the API_ADMIN_TOKEN header.
+    """
+    token = os.environ.get("API_ADMIN_TOKEN")
+    if not token or x_admin_token != token:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    codes = (data or {}).get("codes")
+    if codes is None:
+        dropped = response_cache.invalidate()
+        facet_index.invalidate()
+        rank_index.invalidate()
+    else:
+        dropped = response_cache.invalidate(f"course:{c}" for c in codes)
+        rank_index.invalidate(codes)
+    simulation_index.invalidate()
+    forecast_index.invalidate()
+    return {"invalidated": dropped}
+
+
 @app.post("/api/simulate")
-async def simulate_score(data: Dict[str, Any]):
-    """Simulate SISU score based on course weights"""
-    # This is a placeholder - implement based on your simulation logic
-    return {"message": "Simulation endpoint", "received": data}
+async def simulate_score(data: SimulationRequest):
+    """Courses a candidate would pass with their ENEM scores, ranked by margin.
+
+    The weighted average is computed for every course at once against the
+    latest cut score of the chosen modality, skipping courses whose
+    minimums the candidate doesn't meet.
+    """
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not configured")
+
+    try:
+        return simulation_index.simulate(data)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/simulate/batch")
+async def simulate_batch(data: BatchSimulationRequest):
+    """Simulate a cohort of candidates against many courses (or all).
+
+    Streams one row per candidate and course as NDJSON or CSV, computed
+    in memory-bounded blocks of the candidates x courses matrix.
+    """
+    if not supabase:
+        raise HTTPException(status_code=503, detail="Database not configured")
+
+    try:
+        simulation_index.snapshot()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    blocks = simulation_index.simulate_batch(data)
+    if data.format == "csv":
+        return StreamingResponse(
+            batch_csv(blocks),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="simulacao.csv"'}
+        )
+    return StreamingResponse(batch_ndjson(blocks), media_type="application/x-ndjson")
 
 
 @app.get("/api/simulate/radar")
@@ -0,0 +1,148 @@
+"""
+Rank Lookup
+Where a score would place in a course's approved list, by binary search
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+
+STUDENT_FIELDS = ("rank", "name", "score", "bonus")
+
+
+@dataclass
+class ScoreList:
+    """Approved students of one (year, modality, call), best score first"""
+    scores: np.ndarray
+    students: list[dict]
+
+    @classmethod
+    def build(cls, rows: list[dict]) -> "ScoreList":
+        rows = sorted(rows, key=lambda r: (-(r.get("score") or 0), r.get("rank") or 0))
+        return cls(
+            scores=np.array([r.get("score") or 0 for r in rows], dtype=np.float64),
+            students=[{k: r.get(k) for k in STUDENT_FIELDS} for r in rows],
+        )
+
+    def place(self, score: float, neighbors: int = 3) -> dict:
+        """Implied rank of ``score`` (ties place after equal scores) and the students around it"""
+        # scores are descending: search the negated (ascending) array
+        position = int(np.searchsorted(-self.scores, -score, side="right"))
+        return {
+            "rank": position + 1,
+            "total": len(self.students),
+            "within_list": position < len(self.students),
+            "above": self.students[max(0, position - neighbors):position],
+            "below": self.students[position:position + neighbors],
+        }
+
+
+@dataclass
+class CourseScores:
+    """Score lists of a course keyed by (year, modality_code, call_number)"""
+    course: dict
+    lists: dict[tuple[int, int, int], ScoreList] = field(default_factory=dict)
+    loaded_at: float = 0.0
+
+    @classmethod
+    def build(cls, course: dict) -> "CourseScores":
+        groups: dict[tuple[int, int, int], list[dict]] = {}
+        for r in course.get("approved_students") or []:
+            key = (r.get("year"), r.get("modality_code"), r.get("call_number") or 1)
+            groups.setdefault(key, []).append(r)
+        return cls(
+            course={k: v for k, v in course.items() if k != "approved_students"},
+            lists={key: ScoreList.build(rows) for key, rows in groups.items()},
+            loaded_at=time.monotonic(),
+        )
+
+    @property
+    def years(self) -> list[int]:
+        return sorted({year for year, _, _ in self.lists}, reverse=True)
+
+    def modalities(self, year: int) -> list[int]:
+        return sorted({m for y, m, _ in self.lists if y == year})
+
+
+class RankIndex:
+    """LRU of per-course score lists, loaded on first lookup.
+
+    Each course costs one request (the course with its approved students
+    embedded); later lookups are a binary search in memory.
+    """
+
+    def __init__(self, loader: Callable[[int], Optional[dict]], maxsize: int = 512, ttl: float = 3600):
+        """
+        Args:
+            loader: Returns a course with ``approved_students`` by SISU code
+            maxsize: Courses kept in memory
+            ttl: Seconds before a course is reloaded
+        """
+        self.loader = loader
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._courses: "OrderedDict[int, CourseScores]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, code: int) -> Optional[CourseScores]:
+        """Score lists of a course, loading it if missing or expired"""
+        with self._lock:
+            entry = self._courses.get(code)
+            if entry is not None and time.monotonic() - entry.loaded_at < self.ttl:
+                self._courses.move_to_end(code)
+                return entry
+
+        course = self.loader(code)
+        if course is None:
+            return None
+        entry = CourseScores.build(course)
+        with self._lock:
+            self._courses[code] = entry
+            self._courses.move_to_end(code)
+            while len(self._courses) > self.maxsize:
+                self._courses.popitem(last=False)
+        return entry
+
+    def invalidate(self, codes: Optional[Iterable[int]] = None):
+        """Drop the given courses (all if None)"""
+        with self._lock:
+            if codes is None:
+                self._courses.clear()
+            else:
+                for code in codes:
+                    self._courses.pop(code, None)
+
+    def lookup(self, code: int, score: float, modality_code: int, year: Optional[int] = None,
+               call_number: int = 1, neighbors: int = 3) -> Optional[dict]:
+        """Where ``score`` would place in a course's approved list.
+
+        Args:
+            year: SISU edition (default: latest with approved students)
+
+        Returns:
+            Placement dict, or None if the course doesn't exist. Without
+            a list for the year/modality/call, ``rank`` is None and the
+            available years and modalities are listed.
+        """
+        entry = self.get(code)
+        if entry is None:
+            return None
+
+        if year is None:
+            year = entry.years[0] if entry.years else None
+        result = {
+            "course": entry.course,
+            "year": year,
+            "modality_code": modality_code,
+            "call_number": call_number,
+            "score": score,
+        }
+
+        scores = entry.lists.get((year, modality_code, call_number))
+        if scores is None:
+            return {**result, "rank": None, "years": entry.years,
+                    "modalities": entry.modalities(year) if year is not None else []}
+        return {**result, **scores.place(score, neighbors)}
@@ -0,0 +1,66 @@
+"""
+JSON Serialization
+Single-pass JSON encoding that writes NaN/Infinity as null
+"""
+import json
+import re
+from decimal import Decimal
+from typing import Any
+
+import numpy as np
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# JSON string literals; splitting on them leaves the non-string segments at
+# even indices, where NaN/Infinity can only be bare float tokens
+_STRING = re.compile(r'("[^"\\]*(?:\\.[^"\\]*)*")')
+
+
+def _default(obj: Any):
+    """Encode types the JSON encoders don't know natively"""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _null_non_finite(text: str) -> str:
+    parts = _STRING.split(text)
+    for i in range(0, len(parts), 2):
+        if "NaN" in parts[i] or "Infinity" in parts[i]:
+            parts[i] = (parts[i].replace("-Infinity", "null")
+                                .replace("Infinity", "null")
+                                .replace("NaN", "null"))
+    return "".join(parts)
+
+
+def dumps(content: Any) -> bytes:
+    """Encode content as compact UTF-8 JSON, with NaN/Infinity as null.
+
+    Uses orjson when installed (non-finite floats, numpy scalars and arrays
+    are handled natively). Otherwise the stdlib encoder runs strictly; only
+    a payload that actually holds a non-finite float is re-encoded with the
+    literal tokens, which one pass over the output swaps for null without
+    touching string contents. Either way the response tree is never copied.
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
+
+    try:
+        text = json.dumps(content, ensure_ascii=False, separators=(",", ":"),
+                          default=_default, allow_nan=False)
+    except ValueError:
+        text = _null_non_finite(json.dumps(content, ensure_ascii=False, separators=(",", ":"),
+                                           default=_default))
+    return text.encode("utf-8")
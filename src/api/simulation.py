@@ -0,0 +1,373 @@
+"""
+Simulation Engine
+Vectorised SISU simulation of a candidate against every course at once
+"""
+import csv
+import io
+import logging
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Literal, Optional, Union
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from .facets import BackgroundIndex
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# ENEM components, in the column order of the weight/minimum matrices
+SCORE_FIELDS = ("red", "ling", "mat", "ch", "cn")
+
+COURSE_FIELDS = ("id", "code", "name", "university", "city", "state")
+
+# Columns of a batch simulation row (NDJSON keys / CSV header)
+BATCH_COLUMNS = ("candidate", "code", "name", "university", "state", "modality_name",
+                 "cut_score", "average", "margin", "meets_minimums", "passes")
+
+
+def modality_group(name: str) -> str:
+    """Coarse modality group of a SISU modality name (AMPLA, PPI, ...)"""
+    lower = name.lower()
+    if "ampla" in lower:
+        return "AMPLA"
+    if "pretos, pardos" in lower:
+        return "PPI_RENDA" if "renda" in lower else "PPI"
+    if "deficiência" in lower:
+        return "PCD"
+    if "renda" in lower:
+        return "RENDA"
+    return "OUTRAS"
+
+
+def _number(value, default: float) -> float:
+    return default if value is None else float(value)
+
+
+@dataclass
+class ModalityCuts:
+    """Cut scores of one modality: parallel arrays over the courses offering it"""
+    course_idx: np.ndarray
+    cut_score: np.ndarray
+    year: np.ndarray
+    modality_name: list[str]
+
+
+@dataclass
+class SimulationSnapshot:
+    """Weights, minimums and latest cut scores of every course as arrays.
+
+    Row ``i`` of each matrix belongs to ``courses[i]``. Missing or zero
+    weights count as 1 and missing minimums as 0, as on the course page.
+    """
+    courses: list[dict] = field(default_factory=list)
+    weights: np.ndarray = field(default_factory=lambda: np.ones((0, 5)))
+    weight_sum: np.ndarray = field(default_factory=lambda: np.ones(0))
+    minimums: np.ndarray = field(default_factory=lambda: np.zeros((0, 5)))
+    min_enem: np.ndarray = field(default_factory=lambda: np.zeros(0))
+    states: np.ndarray = field(default_factory=lambda: np.array([], dtype=object))
+    # SISU course code -> row
+    code_index: dict[int, int] = field(default_factory=dict)
+    # modality_code -> cuts
+    by_code: dict[int, ModalityCuts] = field(default_factory=dict)
+    # modality group -> lowest cut of the group per course
+    by_group: dict[str, ModalityCuts] = field(default_factory=dict)
+
+    @property
+    def course_count(self) -> int:
+        return len(self.courses)
+
+    @classmethod
+    def build(cls, courses: Iterable[dict]) -> "SimulationSnapshot":
+        """Build from course rows embedding ``course_weights`` and ``latest_cut_scores``"""
+        meta, weights, minimums, min_enem = [], [], [], []
+        code_cuts: dict[int, list] = {}
+        group_cuts: dict[str, dict[int, tuple]] = {}
+
+        for c in courses:
+            weight_rows = c.get("course_weights") or []
+            if not weight_rows:
+                continue
+            w = max(weight_rows, key=lambda r: r.get("year") or 0)
+            i = len(meta)
+            meta.append({k: c.get(k) for k in COURSE_FIELDS})
+            weights.append([_number(w.get(f"peso_{f}"), 1) or 1 for f in SCORE_FIELDS])
+            minimums.append([_number(w.get(f"min_{f}"), 0) for f in SCORE_FIELDS])
+            min_enem.append(_number(w.get("min_enem"), 0))
+
+            cut_rows = [r for r in c.get("latest_cut_scores") or [] if r.get("cut_score") is not None]
+            if not cut_rows:
+                continue
+            year = max(r.get("year") or 0 for r in cut_rows)
+            for r in cut_rows:
+                if r.get("year") != year:
+                    continue
+                entry = (i, float(r["cut_score"]), year, r.get("modality_name") or "")
+                if r.get("modality_code") is not None:
+                    code_cuts.setdefault(int(r["modality_code"]), []).append(entry)
+                per_course = group_cuts.setdefault(modality_group(entry[3]), {})
+                if i not in per_course or entry[1] < per_course[i][1]:
+                    per_course[i] = entry
+
+        def cuts(entries: list[tuple]) -> ModalityCuts:
+            return ModalityCuts(
+                course_idx=np.array([e[0] for e in entries], dtype=np.intp),
+                cut_score=np.array([e[1] for e in entries], dtype=np.float64),
+                year=np.array([e[2] for e in entries], dtype=np.int32),
+                modality_name=[e[3] for e in entries],
+            )
+
+        weights_arr = np.array(weights, dtype=np.float64).reshape(-1, len(SCORE_FIELDS))
+        return cls(
+            courses=meta,
+            weights=weights_arr,
+            weight_sum=weights_arr.sum(axis=1),
+            minimums=np.array(minimums, dtype=np.float64).reshape(-1, len(SCORE_FIELDS)),
+            min_enem=np.array(min_enem, dtype=np.float64),
+            states=np.array([(m["state"] or "").upper() for m in meta], dtype=object),
+            code_index={m["code"]: i for i, m in enumerate(meta)},
+            by_code={code: cuts(entries) for code, entries in code_cuts.items()},
+            by_group={g: cuts(list(per.values())) for g, per in group_cuts.items()},
+        )
+
+    def averages(self, scores: np.ndarray) -> np.ndarray:
+        """Weighted average of one candidate in every course"""
+        return self.weights @ scores / self.weight_sum
+
+    def meets_minimums(self, scores: np.ndarray, averages: np.ndarray) -> np.ndarray:
+        """Whether the candidate clears every minimum of each course"""
+        return (scores >= self.minimums).all(axis=1) & (averages >= self.min_enem)
+
+
+class CandidateScores(BaseModel):
+    """The five ENEM scores of a candidate"""
+    red: float = Field(..., ge=0, le=1000)
+    ling: float = Field(..., ge=0, le=1000)
+    mat: float = Field(..., ge=0, le=1000)
+    ch: float = Field(..., ge=0, le=1000)
+    cn: float = Field(..., ge=0, le=1000)
+
+    def scores(self) -> np.ndarray:
+        return np.array([getattr(self, f) for f in SCORE_FIELDS], dtype=np.float64)
+
+
+class SimulationRequest(CandidateScores):
+    """Body of POST /api/simulate"""
+    modality: str = Field("AMPLA", description="Modality group (AMPLA, PPI, PPI_RENDA, PCD, RENDA)")
+    modality_code: Optional[int] = Field(None, description="SISU modality code; overrides modality")
+    state: Optional[str] = None
+    limit: int = Field(50, ge=1, le=1000)
+
+
+class BatchCandidate(CandidateScores):
+    id: Optional[str] = Field(None, description="Caller's identifier, echoed in each row")
+
+
+class BatchSimulationRequest(BaseModel):
+    """Body of POST /api/simulate/batch"""
+    candidates: list[BatchCandidate] = Field(..., min_length=1, max_length=5000)
+    courses: Union[Literal["all"], list[int]] = Field("all", description="SISU course codes or \"all\"")
+    modality: str = "AMPLA"
+    modality_code: Optional[int] = None
+    only_passing: bool = False
+    format: Literal["ndjson", "csv"] = "ndjson"
+
+
+class SimulationIndex(BackgroundIndex):
+    """Simulation arrays of the whole catalog, rebuilt in the background"""
+
+    name = "simulation"
+    snapshot_class = SimulationSnapshot
+
+    def _cuts(self, snap: SimulationSnapshot, modality: str,
+              modality_code: Optional[int]) -> Optional[ModalityCuts]:
+        if modality_code is not None:
+            return snap.by_code.get(modality_code)
+        return snap.by_group.get(modality.upper())
+
+    def simulate(self, req: SimulationRequest) -> dict:
+        """Courses the candidate would pass in a modality, best margin first.
+
+        Returns:
+            Dict with ``courses`` (up to ``limit``), ``count`` of passing
+            courses and ``evaluated`` courses offering the modality
+        """
+        snap = self.snapshot()
+        cuts = self._cuts(snap, req.modality, req.modality_code)
+
+        result = {
+            "modality": req.modality.upper() if req.modality_code is None else None,
+            "modality_code": req.modality_code,
+            "count": 0,
+            "evaluated": 0,
+            "courses": [],
+        }
+        if cuts is None or not len(cuts.course_idx):
+            return result
+
+        scores = req.scores()
+        averages = snap.averages(scores)
+        eligible = snap.meets_minimums(scores, averages)
+
+        candidate = averages[cuts.course_idx]
+        margin = candidate - cuts.cut_score
+        mask = eligible[cuts.course_idx]
+        if req.state:
+            mask &= snap.states[cuts.course_idx] == req.state.upper()
+        result["evaluated"] = int(mask.sum())
+        mask &= margin >= 0
+
+        passing = np.flatnonzero(mask)
+        result["count"] = int(len(passing))
+        if len(passing) > req.limit:
+            passing = passing[np.argpartition(-margin[passing], req.limit - 1)[:req.limit]]
+        passing = passing[np.argsort(-margin[passing], kind="stable")]
+
+        result["courses"] = [
+            {
+                **snap.courses[cuts.course_idx[j]],
+                "year": int(cuts.year[j]),
+                "modality_name": cuts.modality_name[j],
+                "cut_score": round(float(cuts.cut_score[j]), 2),
+                "average": round(float(candidate[j]), 2),
+                "margin": round(float(margin[j]), 2),
+            }
+            for j in passing
+        ]
+        return result
+
+    def simulate_batch(self, req: BatchSimulationRequest,
+                       chunk_cells: int = 250_000) -> Iterator["BatchBlock"]:
+        """Simulate every candidate against every selected course.
+
+        The candidates x courses score matrix is computed a block of
+        candidates at a time, sized so a block holds about ``chunk_cells``
+        cells, which bounds memory for any cohort size.
+
+        Yields:
+            One BatchBlock per block of candidates
+        """
+        snap = self.snapshot()
+        cuts = self._cuts(snap, req.modality, req.modality_code)
+        if cuts is None:
+            return
+
+        cols = np.arange(len(cuts.course_idx))
+        if req.courses != "all":
+            rows = [snap.code_index[c] for c in req.courses if c in snap.code_index]
+            cols = np.flatnonzero(np.isin(cuts.course_idx, rows))
+        if not len(cols):
+            return
+
+        course_idx = cuts.course_idx[cols]
+        weights = snap.weights[course_idx]
+        weight_sum = snap.weight_sum[course_idx]
+        minimums = snap.minimums[course_idx]
+        min_enem = snap.min_enem[course_idx]
+        cut_score = cuts.cut_score[cols]
+        courses = BatchCourses(
+            rows=[
+                (snap.courses[i]["code"], snap.courses[i]["name"], snap.courses[i]["university"],
+                 snap.courses[i]["state"], cuts.modality_name[j], round(float(cut), 2))
+                for i, j, cut in zip(course_idx.tolist(), cols.tolist(), cut_score.tolist())
+            ]
+        )
+
+        ids = [c.id if c.id is not None else str(n + 1) for n, c in enumerate(req.candidates)]
+        scores = np.array([c.scores() for c in req.candidates])
+        step = max(1, chunk_cells // len(cols))
+
+        for start in range(0, len(scores), step):
+            block = scores[start:start + step]
+            averages = block @ weights.T / weight_sum
+            meets = (block[:, None, :] >= minimums[None]).all(axis=2) & (averages >= min_enem)
+            margin = averages - cut_score
+            passes = meets & (margin >= 0)
+            yield BatchBlock(
+                candidates=ids[start:start + step],
+                courses=courses,
+                averages=np.round(averages, 2),
+                margin=np.round(margin, 2),
+                # 0: fails minimums, 1: below the cut, 3: passes
+                status=meets.astype(np.int8) + 2 * passes.astype(np.int8),
+                only_passing=req.only_passing,
+            )
+
+
+@dataclass
+class BatchCourses:
+    """Courses of a batch simulation, in matrix column order"""
+    # (code, name, university, state, modality_name, cut_score)
+    rows: list[tuple]
+    _fragments: dict = field(default_factory=dict)
+
+    def fragments(self, fmt: str, encode) -> list[str]:
+        """Per-course row fragment, encoded once per format"""
+        if fmt not in self._fragments:
+            self._fragments[fmt] = [encode(row) for row in self.rows]
+        return self._fragments[fmt]
+
+
+@dataclass
+class BatchBlock:
+    """Results of a block of candidates against every selected course"""
+    candidates: list[str]
+    courses: BatchCourses
+    averages: np.ndarray
+    margin: np.ndarray
+    status: np.ndarray
+    only_passing: bool
+
+    def lines(self, fmt: str, encode, template: str, status_text: tuple) -> Iterator[str]:
+        """One encoded line per (candidate, course) of the block.
+
+        Course fragments and candidate cells are encoded once; each line
+        only formats the candidate's average and margin.
+        """
+        fragments = self.courses.fragments(fmt, encode)
+        for i, candidate in enumerate(self.candidates):
+            cell = encode((candidate,))
+            status = self.status[i]
+            if self.only_passing:
+                cols = np.flatnonzero(status == 3)
+                selected = [fragments[j] for j in cols.tolist()]
+                averages, margin, status = self.averages[i, cols], self.margin[i, cols], status[cols]
+            else:
+                selected = fragments
+                averages, margin = self.averages[i], self.margin[i]
+            yield "".join([
+                template.format(cell, frag, avg, m, status_text[st])
+                for frag, avg, m, st in zip(selected, averages.tolist(), margin.tolist(), status.tolist())
+            ])
+
+
+def _csv_cells(row: tuple) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(row)
+    return buffer.getvalue()
+
+
+def _json_members(row: tuple) -> str:
+    if len(row) == 1:
+        return dumps(row[0]).decode("utf-8")
+    return dumps(dict(zip(BATCH_COLUMNS[1:7], row))).decode("utf-8")[1:-1]
+
+
+def batch_ndjson(blocks: Iterable[BatchBlock]) -> Iterator[bytes]:
+    """Encode batch simulation blocks as NDJSON (keys: BATCH_COLUMNS)"""
+    template = '{{"candidate":{0},{1},"average":{2},"margin":{3},{4}}}\n'
+    status_text = ('"meets_minimums":false,"passes":false', '"meets_minimums":true,"passes":false',
+                   None, '"meets_minimums":true,"passes":true')
+    for block in blocks:
+        for line in block.lines("json", _json_members, template, status_text):
+            yield line.encode("utf-8")
+
+
+def batch_csv(blocks: Iterable[BatchBlock]) -> Iterator[bytes]:
+    """Encode batch simulation blocks as CSV (header: BATCH_COLUMNS)"""
+    yield (",".join(BATCH_COLUMNS) + "\n").encode("utf-8")
+    template = "{0},{1},{2},{3},{4}\n"
+    status_text = ("false,false", "true,false", None, "true,true")
+    for block in blocks:
+        for line in block.lines("csv", _csv_cells, template, status_text):
+            yield line.encode("utf-8")
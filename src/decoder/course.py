@@ -6,6 +6,9 @@ from dataclasses import dataclass, field
 from typing import Optional
 from .protobuf import parse_message
 
+# Bump whenever decoding output changes, so stored raw payloads get reprocessed
+DECODER_VERSION = 1
+
 
 @dataclass
 class Modality:
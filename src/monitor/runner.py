@@ -3,6 +3,7 @@ SISU Monitor Runner
 Main monitoring loop that orchestrates fetching, tracking, and notifications
 """
 import logging
+import threading
 import time
 from datetime import datetime
 from pathlib import Path
@@ -13,6 +14,7 @@ from .tracker import ScoreTracker
 from ..decoder import Course
 from ..notifications import NotificationManager
 from ..storage import HistoryManager, SupabaseClient
+from ..api.cache import invalidate_api_cache
 from ..utils.config import Config
 
 logger = logging.getLogger(__name__)
@@ -31,6 +33,8 @@ class SISUMonitor:
         self.notifications = NotificationManager(config.notifications)
         self.history = HistoryManager(config.data_dir)
         self.iteration = 0
+        # Codes saved to Supabase this cycle, invalidated in the API once at the end
+        self._saved_codes: set[int] = set()
 
         # Initialize Supabase client if enabled
         self.supabase: Optional[SupabaseClient] = None
@@ -148,11 +152,11 @@ class SISUMonitor:
                     if weights or minimums:
                         self.supabase.upsert_weights(db_course_id, year, weights, minimums)
 
-            # Save current cut scores
+            # Save cut scores that changed since the last write
             for modality, data in scores.items():
                 cut_score = data.get('cut_score')
                 if cut_score is not None and cut_score != 'null':
-                    self.supabase.insert_cut_score(
+                    self.supabase.insert_cut_score_if_changed(
                         course_id=db_course_id,
                         year=year,
                         modality={
@@ -165,6 +169,7 @@ class SISUMonitor:
                     )
 
             logger.debug(f"Saved course {course_id} to Supabase (db_id={db_course_id})")
+            self._saved_codes.add(course_id)
 
         except Exception as e:
             logger.error(f"Failed to save to Supabase: {e}")
@@ -232,14 +237,30 @@ class SISUMonitor:
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"\n[{timestamp}] Iteracao #{self.iteration}")
 
-        for course_cfg in self.config.courses:
-            course_id = course_cfg['id']
-            course_name = course_cfg['name']
-            print(f"  Verificando {course_name}...", end=" ", flush=True)
+        # One manifest write per cycle instead of one per saved course
+        with self.history.manifest.batch():
+            for course_cfg in self.config.courses:
+                course_id = course_cfg['id']
+                course_name = course_cfg['name']
+                print(f"  Verificando {course_name}...", end=" ", flush=True)
 
-            course = self.process_course(course_id, course_name)
-            if course is None and not self.tracker.is_new_course(course_id):
-                print("Sem alteracoes")
+                course = self.process_course(course_id, course_name)
+                if course is None and not self.tracker.is_new_course(course_id):
+                    print("Sem alteracoes")
+
+        self._invalidate_saved()
+
+    def _invalidate_saved(self):
+        """Drop the API's cached responses of the courses saved this cycle.
+
+        One request per cycle, sent from a background thread so a slow or
+        unreachable API never delays polling (best effort).
+        """
+        if not self._saved_codes:
+            return
+        codes, self._saved_codes = sorted(self._saved_codes), set()
+        threading.Thread(target=invalidate_api_cache, args=(codes,),
+                         name="api-cache-invalidate", daemon=True).start()
 
     def run(self):
         """Main monitoring loop"""
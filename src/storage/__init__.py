@@ -2,8 +2,9 @@
 from .history import HistoryManager
 from .export import ExportManager
 from .supabase_client import SupabaseClient
+from .replica import LocalReplica
 
-__all__ = ['HistoryManager', 'ExportManager', 'SupabaseClient']
+__all__ = ['HistoryManager', 'ExportManager', 'SupabaseClient', 'LocalReplica']
 
 # Legacy PostgreSQL client (requires psycopg2)
 try:
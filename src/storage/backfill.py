@@ -0,0 +1,206 @@
+"""
+Backfill Engine
+Incremental, parallel reprocessing of the raw archive into processed snapshots
+"""
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+from ..decoder import DECODER_VERSION, decode_course
+from .history import HistoryManager
+
+logger = logging.getLogger(__name__)
+
+
+def decode_payload(data: bytes) -> dict:
+    """Default decoder: raw MeuSISU payload -> course dict"""
+    return decode_course(data).to_dict()
+
+
+def _decode_blob(task: tuple[Callable[[bytes], dict], str, str]) -> tuple[str, Optional[str], Optional[str]]:
+    """Decode one blob in a worker process.
+
+    Returns:
+        (digest, compact JSON or None, error message or None)
+    """
+    decode, digest, path = task
+    try:
+        result = decode(Path(path).read_bytes())
+        return digest, json.dumps(result, ensure_ascii=False, separators=(',', ':')), None
+    except Exception as e:
+        return digest, None, f"{type(e).__name__}: {e}"
+
+
+class BackfillEngine:
+    """Decodes raw payloads once per (content hash, decoder version).
+
+    Decoded results are kept in a SQLite ledger next to the data directory.
+    Each run decodes only digests that are missing from the ledger or were
+    decoded by an older decoder version, spreading the work over a process
+    pool, and rebuilds the processed snapshots of the courses whose
+    timelines reference a payload whose decoded output changed. After a
+    decoder bump, payloads the fix doesn't affect decode to the same JSON
+    and leave their courses untouched.
+    """
+
+    def __init__(
+        self,
+        history: HistoryManager,
+        state_path: Optional[Path] = None,
+        decode: Callable[[bytes], dict] = decode_payload,
+        decoder_version: int = DECODER_VERSION,
+        workers: Optional[int] = None,
+        batch_size: int = 500,
+    ):
+        """
+        Args:
+            history: HistoryManager owning the raw archive and snapshots
+            state_path: Ledger database (default: {data_dir}/backfill.sqlite)
+            decode: Picklable function turning a raw payload into a dict
+            decoder_version: Version recorded with each decoded payload
+            workers: Decode processes (default: CPU count; 1 decodes inline)
+            batch_size: Decoded payloads per ledger transaction
+        """
+        self.history = history
+        self.decode = decode
+        self.decoder_version = decoder_version
+        self.workers = workers
+        self.batch_size = batch_size
+
+        self.state_path = Path(state_path or history.data_dir / "backfill.sqlite")
+        self.conn = sqlite3.connect(self.state_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS decoded (
+                    digest TEXT PRIMARY KEY,
+                    decoder_version INTEGER NOT NULL,
+                    payload TEXT,
+                    error TEXT,
+                    decoded_at TEXT
+                )
+            """)
+
+    def pending(self, digests: Iterable[str], force: bool = False) -> set[str]:
+        """Digests that still need decoding with the current decoder version"""
+        digests = set(digests)
+        if force:
+            return digests
+        current = {
+            row[0] for row in self.conn.execute(
+                "SELECT digest FROM decoded WHERE decoder_version = ?", (self.decoder_version,)
+            )
+        }
+        return digests - current
+
+    def run(self, force: bool = False) -> dict[str, int]:
+        """Decode new or stale payloads and rebuild affected courses.
+
+        Args:
+            force: Decode every payload regardless of the ledger
+
+        Returns:
+            Dict with decoded, errors, skipped and courses counts
+        """
+        archive = self.history.raw_archive
+        timelines = {cid: archive.timeline(cid) for cid in archive.courses()}
+        # Snapshots saved past these counts during the run are kept on rebuild
+        counts = {cid: self.history.processed_segments.count(cid) for cid in timelines}
+        all_digests = {e.digest for entries in timelines.values() for e in entries}
+        todo = self.pending(all_digests, force)
+
+        stats = {"decoded": 0, "errors": 0, "skipped": len(all_digests) - len(todo), "courses": 0}
+        logger.info(f"Backfill: {len(todo)} payloads to decode, {stats['skipped']} up to date")
+
+        tasks = [(self.decode, d, str(archive.blob_path(d))) for d in sorted(todo)]
+        changed: set[str] = set()
+        batch = []
+        for digest, payload, error in self._map(tasks):
+            batch.append((digest, self.decoder_version, payload, error, datetime.now().isoformat()))
+            if error:
+                stats["errors"] += 1
+                logger.warning(f"Failed to decode {digest[:12]}: {error}")
+            else:
+                stats["decoded"] += 1
+            if len(batch) >= self.batch_size:
+                changed |= self._write_batch(batch)
+                batch = []
+        if batch:
+            changed |= self._write_batch(batch)
+
+        affected = [
+            cid for cid, entries in timelines.items()
+            if entries and (any(e.digest in changed for e in entries) or counts[cid] == 0)
+        ]
+        with self.history.manifest.batch():
+            for course_id in affected:
+                self._rebuild_course(course_id, timelines[course_id], counts[course_id])
+        stats["courses"] = len(affected)
+        return stats
+
+    def _map(self, tasks: list):
+        if not tasks:
+            return iter(())
+        if self.workers == 1:
+            return map(_decode_blob, tasks)
+        workers = self.workers or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, len(tasks) // (4 * workers))
+
+        def results():
+            with executor:
+                yield from executor.map(_decode_blob, tasks, chunksize=chunksize)
+        return results()
+
+    def _write_batch(self, batch: list[tuple]) -> set[str]:
+        """Record decoded payloads.
+
+        Returns:
+            Digests whose decoded JSON differs from the one in the ledger
+        """
+        previous = self._decoded({row[0] for row in batch})
+        changed = {digest for digest, _, payload, _, _ in batch if payload != previous.get(digest)}
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO decoded (digest, decoder_version, payload, error, decoded_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+        return changed
+
+    def _decoded(self, digests: set[str]) -> dict[str, str]:
+        """Decoded JSON payloads for digests (failed decodes are omitted)"""
+        found = {}
+        digests = sorted(digests)
+        for i in range(0, len(digests), 500):
+            chunk = digests[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT digest, payload FROM decoded "
+                f"WHERE payload IS NOT NULL AND digest IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            found.update(rows)
+        return found
+
+    def _rebuild_course(self, course_id: int, timeline: list, count: int):
+        decoded = self._decoded({e.digest for e in timeline})
+        snapshots = [
+            (e.timestamp, json.loads(decoded[e.digest]))
+            for e in timeline if e.digest in decoded
+        ]
+        if snapshots:
+            self.history.replace_snapshots(course_id, snapshots, keep_after=count)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
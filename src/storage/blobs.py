@@ -0,0 +1,144 @@
+"""
+Raw Archive
+Content-addressed storage for raw API payloads with per-course timelines
+"""
+import hashlib
+import logging
+import os
+import struct
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Timeline entry: timestamp (epoch seconds), SHA-256 digest of the payload
+TIMELINE_ENTRY = struct.Struct(">d32s")
+
+
+@dataclass(frozen=True)
+class TimelineEntry:
+    """A payload observed for a course at a point in time"""
+    timestamp: float
+    digest: str
+
+
+class RawArchive:
+    """Raw payloads stored once per distinct content.
+
+    Payloads live in ``blobs/{digest[:2]}/{digest}.bin`` keyed by their
+    SHA-256, so identical payloads (flapping values, re-runs) share one
+    file. Each course has a ``{course_id}.timeline`` of fixed-width
+    (timestamp, digest) entries recording when each payload was seen.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.blobs_dir = self.directory / "blobs"
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def blob_path(self, digest: str) -> Path:
+        return self.blobs_dir / digest[:2] / f"{digest}.bin"
+
+    def timeline_path(self, course_id: int) -> Path:
+        return self.directory / f"{course_id}.timeline"
+
+    def put(self, course_id: int, data: bytes, timestamp: float) -> str:
+        """Store a payload (if new) and record it on the course timeline.
+
+        Returns:
+            SHA-256 hex digest of the payload
+        """
+        digest = self.digest(data)
+        path = self.blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f".tmp{os.getpid()}")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+        with self._lock:
+            with open(self.timeline_path(course_id), "ab") as f:
+                f.write(TIMELINE_ENTRY.pack(timestamp, bytes.fromhex(digest)))
+        return digest
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """Payload for a digest, or None if not stored"""
+        path = self.blob_path(digest)
+        return path.read_bytes() if path.exists() else None
+
+    def timeline(self, course_id: int) -> list[TimelineEntry]:
+        """Timeline of a course, oldest first"""
+        path = self.timeline_path(course_id)
+        if not path.exists():
+            return []
+        data = path.read_bytes()
+        usable = len(data) - len(data) % TIMELINE_ENTRY.size
+        return [
+            TimelineEntry(ts, raw.hex())
+            for ts, raw in TIMELINE_ENTRY.iter_unpack(data[:usable])
+        ]
+
+    def iter_payloads(self, course_id: int) -> Iterator[tuple[TimelineEntry, bytes]]:
+        """Iterate (timeline entry, payload) pairs, oldest first"""
+        for entry in self.timeline(course_id):
+            data = self.get(entry.digest)
+            if data is not None:
+                yield entry, data
+
+    def courses(self) -> list[int]:
+        """Course ids with a timeline"""
+        ids = []
+        for path in self.directory.glob("*.timeline"):
+            try:
+                ids.append(int(path.stem))
+            except ValueError:
+                pass
+        return sorted(ids)
+
+    def compact(self, course_id: int, keep_last: Optional[int] = None) -> int:
+        """Drop consecutive repeats from a timeline (and trim it to keep_last).
+
+        Blobs are not deleted here; see gc().
+
+        Returns:
+            Number of timeline entries removed
+        """
+        with self._lock:
+            entries = self.timeline(course_id)
+            kept = [e for i, e in enumerate(entries) if i == 0 or e.digest != entries[i - 1].digest]
+            if keep_last is not None:
+                kept = kept[-keep_last:] if keep_last > 0 else []
+
+            removed = len(entries) - len(kept)
+            if removed:
+                path = self.timeline_path(course_id)
+                tmp = path.with_suffix(".timeline.tmp")
+                tmp.write_bytes(b"".join(
+                    TIMELINE_ENTRY.pack(e.timestamp, bytes.fromhex(e.digest)) for e in kept
+                ))
+                os.replace(tmp, path)
+        return removed
+
+    def gc(self) -> int:
+        """Delete blobs no timeline references.
+
+        Returns:
+            Number of blobs deleted
+        """
+        with self._lock:
+            referenced = {e.digest for cid in self.courses() for e in self.timeline(cid)}
+            deleted = 0
+            for path in self.blobs_dir.glob("*/*.bin"):
+                if path.stem not in referenced:
+                    path.unlink()
+                    deleted += 1
+        if deleted:
+            logger.info(f"Deleted {deleted} unreferenced raw blobs")
+        return deleted
@@ -3,14 +3,156 @@ Export Manager
 Export data to CSV and other formats
 """
 import csv
+import gzip
 import json
 import logging
-from datetime import datetime
+import os
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
 
 logger = logging.getLogger(__name__)
 
+# (CSV header, row key) of streamed cut score exports
+SCORE_EXPORT_COLUMNS = (
+    ('curso_id', 'course_id'),
+    ('curso_codigo', 'course_code'),
+    ('curso_nome', 'course_name'),
+    ('universidade', 'university'),
+    ('cidade', 'city'),
+    ('estado', 'state'),
+    ('ano', 'year'),
+    ('codigo_modalidade', 'modality_code'),
+    ('modalidade', 'modality_name'),
+    ('nota_corte', 'cut_score'),
+    ('inscritos', 'applicants'),
+    ('vagas', 'vacancies'),
+    ('capturado_em', 'captured_at'),
+)
+
+# Column layouts of Parquet exports. "dict" columns are dictionary-encoded
+# strings; "year" is the partition key and is stored in the directory name.
+PARQUET_TABLES = {
+    'cut_scores': (
+        ('id', 'int64'), ('course_id', 'int64'), ('course_code', 'int64'),
+        ('course_name', 'dict'), ('university', 'dict'), ('city', 'dict'), ('state', 'dict'),
+        ('modality_code', 'int32'), ('modality_name', 'dict'), ('cut_score', 'float64'),
+        ('applicants', 'int32'), ('vacancies', 'int32'), ('captured_at', 'timestamp'),
+    ),
+    'course_weights': (
+        ('id', 'int64'), ('course_id', 'int64'),
+        ('peso_red', 'float64'), ('peso_ling', 'float64'), ('peso_mat', 'float64'),
+        ('peso_ch', 'float64'), ('peso_cn', 'float64'),
+        ('min_red', 'float64'), ('min_ling', 'float64'), ('min_mat', 'float64'),
+        ('min_ch', 'float64'), ('min_cn', 'float64'), ('min_enem', 'float64'),
+    ),
+    'approved_students': (
+        ('id', 'int64'), ('course_id', 'int64'), ('modality_code', 'int32'),
+        ('rank', 'int32'), ('name', 'string'), ('score', 'float64'), ('bonus', 'float64'),
+        ('call_number', 'int32'), ('status', 'dict'), ('created_at', 'timestamp'),
+    ),
+}
+
+# Watermark column of each table in delta exports: append-only tables use
+# their id, tables updated in place use updated_at
+DELTA_TABLES = {
+    'courses': 'updated_at',
+    'course_weights': 'updated_at',
+    'cut_scores': 'id',
+    'approved_students': 'updated_at',
+}
+
+# Column set to the writing transaction's NOW(), when it isn't the watermark
+DELTA_TIME_COLUMNS = {'cut_scores': 'captured_at'}
+
+# Rows newer than this may come from transactions that haven't committed
+# yet; they wait for the next export instead of advancing the watermark past
+# rows that commit later. Must exceed the longest write transaction plus any
+# clock skew between this host and the database.
+DELTA_SAFETY_LAG = timedelta(minutes=5)
+
+DELTA_DELETES_NOTE = (
+    "not propagated: rows deleted upstream (compact_cut_scores, stale approved "
+    "students removed by full_data_sync) stay in consumers until resynced from "
+    "a full export"
+)
+
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _settled(value, cutoff: datetime) -> bool:
+    """Whether a row's transaction time is older than the safety cutoff"""
+    if value is None:
+        return True
+    if isinstance(value, str):
+        value = _parse_timestamp(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value < cutoff
+
+
+def _later(current, value):
+    """Greater of two watermarks (ids or ISO timestamps)"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    if value is None:
+        return current
+    if current is None:
+        return value
+    if isinstance(value, str):
+        return value if _parse_timestamp(value) > _parse_timestamp(current) else current
+    return max(current, value)
+
+
+def _arrow_type(kind: str):
+    if kind == 'dict':
+        return pa.dictionary(pa.int32(), pa.string())
+    if kind == 'timestamp':
+        return pa.timestamp('us', tz='UTC')
+    return getattr(pa, kind)()
+
+
+def _arrow_value(value, kind: str):
+    """Normalise a row value (Decimal, ISO string...) for its Arrow type"""
+    if value is None:
+        return None
+    if kind == 'float64':
+        return float(value)
+    if kind in ('int32', 'int64'):
+        return int(value)
+    if kind == 'timestamp' and isinstance(value, str):
+        return _parse_timestamp(value)
+    return value
+
+
+def _arrow_table(rows: list[dict], columns: tuple, schema):
+    arrays = []
+    for name, kind in columns:
+        values = [_arrow_value(row.get(name), kind) for row in rows]
+        if kind == 'dict':
+            arrays.append(pa.array(values, pa.string()).dictionary_encode())
+        else:
+            arrays.append(pa.array(values, _arrow_type(kind)))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
 
 class ExportManager:
     """Exports data to various formats"""
@@ -70,6 +212,193 @@ class ExportManager:
         logger.info(f"Exported scores to {filepath}")
         return filepath
 
+    def export_scores_stream(self, rows: Iterable[dict], filename: Optional[str] = None,
+                             compress: bool = False) -> Path:
+        """Export cut score rows to CSV as they arrive.
+
+        Rows are written one at a time, so memory stays constant when
+        ``rows`` is a streaming source such as
+        ``SupabaseClient.iter_cut_score_rows()`` or
+        ``DatabaseStorage.iter_cut_score_rows()``.
+
+        Args:
+            rows: Flat cut score dicts (see SCORE_EXPORT_COLUMNS)
+            filename: Optional custom filename
+            compress: Gzip the output on the fly
+
+        Returns:
+            Path to exported file
+        """
+        if not filename:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            filename = f"cut_scores_{timestamp}.csv" + (".gz" if compress else "")
+
+        filepath = self.exports_dir / filename
+        opener = gzip.open if compress else open
+
+        count = 0
+        with opener(filepath, 'wt', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow([header for header, _ in SCORE_EXPORT_COLUMNS])
+            for row in rows:
+                writer.writerow([
+                    '' if row.get(key) is None else row[key]
+                    for _, key in SCORE_EXPORT_COLUMNS
+                ])
+                count += 1
+
+        logger.info(f"Exported {count} cut scores to {filepath}")
+        return filepath
+
+    def export_parquet(self, table: str, rows: Iterable[dict],
+                       directory: Optional[Path] = None, batch_size: int = 50_000) -> Path:
+        """Export a table to Parquet files partitioned by year.
+
+        Writes ``{directory}/{table}/year={year}/part-0.parquet`` (Hive
+        layout, zstd-compressed) with text columns such as modality_name,
+        university and city dictionary-encoded. Rows are buffered per year
+        and flushed every ``batch_size`` rows, so memory stays bounded.
+
+        Args:
+            table: One of PARQUET_TABLES
+            rows: Row dicts with a ``year`` key, e.g. from iter_cut_score_rows()
+            directory: Output root (default: exports/parquet_{timestamp})
+            batch_size: Rows per year buffered before writing a row group
+
+        Returns:
+            Path to the table directory
+        """
+        if not HAS_PYARROW:
+            raise ImportError("pyarrow not installed. Run: pip install pyarrow")
+
+        columns = PARQUET_TABLES[table]
+        schema = pa.schema([(name, _arrow_type(kind)) for name, kind in columns])
+        dict_columns = [name for name, kind in columns if kind == 'dict']
+
+        if directory is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            directory = self.exports_dir / f"parquet_{timestamp}"
+        table_dir = Path(directory) / table
+
+        writers: dict = {}
+        buffers: dict = {}
+
+        def flush(year):
+            if year not in writers:
+                part = table_dir / f"year={year if year is not None else '__HIVE_DEFAULT_PARTITION__'}"
+                part.mkdir(parents=True, exist_ok=True)
+                writers[year] = pq.ParquetWriter(
+                    part / "part-0.parquet", schema,
+                    compression='zstd', use_dictionary=dict_columns,
+                )
+            writers[year].write_table(_arrow_table(buffers.pop(year), columns, schema))
+
+        count = 0
+        try:
+            for row in rows:
+                year = row.get('year')
+                buffers.setdefault(year, []).append(row)
+                if len(buffers[year]) >= batch_size:
+                    flush(year)
+                count += 1
+            for year in list(buffers):
+                flush(year)
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        logger.info(f"Exported {count} {table} rows to {table_dir} ({len(writers)} years)")
+        return table_dir
+
+    @property
+    def deltas_dir(self) -> Path:
+        return self.exports_dir / "deltas"
+
+    def load_delta_manifest(self) -> dict:
+        """Manifest of delta exports: per-table watermarks and the delta chain"""
+        path = self.deltas_dir / "manifest.json"
+        if path.exists():
+            return json.loads(path.read_text(encoding='utf-8'))
+        return {"watermarks": {}, "deltas": [], "deletes": DELTA_DELETES_NOTE}
+
+    def export_delta(self, storage, tables: Optional[list[str]] = None) -> Optional[dict]:
+        """Export rows added or changed since the previous delta export.
+
+        Each table is streamed from ``storage.iter_changed_rows()`` past its
+        persisted watermark (max id, or max updated_at for tables updated in
+        place) into ``deltas/{sequence:06d}_{table}.jsonl.gz``. Rows written
+        less than DELTA_SAFETY_LAG ago are left for the next export, so a
+        transaction committing late with a lower id or an earlier NOW() is
+        not skipped; id-ordered tables stop at the first such row. The
+        manifest chains deltas by sequence number; consumers apply them in
+        order, upserting by id. Deleted rows (e.g. compacted cut score
+        history) are not propagated, as the manifest's ``deletes`` note
+        says; resync those from a full export.
+
+        Args:
+            storage: SupabaseClient or DatabaseStorage
+            tables: Tables to export (default: all of DELTA_TABLES)
+
+        Returns:
+            The new manifest entry, or None if nothing changed
+        """
+        self.deltas_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self.load_delta_manifest()
+        watermarks = dict(manifest["watermarks"])
+        previous = manifest["deltas"][-1]["sequence"] if manifest["deltas"] else None
+        sequence = (previous or 0) + 1
+
+        cutoff = datetime.now(timezone.utc) - DELTA_SAFETY_LAG
+        entry = {
+            "sequence": sequence,
+            "previous": previous,
+            "created_at": datetime.now().isoformat(),
+            "until": cutoff.isoformat(),
+            "tables": {},
+        }
+        for table in tables or list(DELTA_TABLES):
+            column = DELTA_TABLES[table]
+            time_column = DELTA_TIME_COLUMNS.get(table, column)
+            since = watermarks.get(table)
+            path = self.deltas_dir / f"{sequence:06d}_{table}.jsonl.gz"
+
+            count = 0
+            high = since
+            with gzip.open(path, 'wt', encoding='utf-8') as f:
+                for row in storage.iter_changed_rows(table, column, since):
+                    if not _settled(row.get(time_column), cutoff):
+                        if column == "id":
+                            break
+                        continue
+                    f.write(json.dumps(row, ensure_ascii=False, default=_json_default) + "\n")
+                    high = _later(high, row.get(column))
+                    count += 1
+
+            if count == 0:
+                path.unlink()
+                continue
+            entry["tables"][table] = {
+                "file": path.name, "rows": count, "column": column, "from": since, "to": high,
+            }
+            watermarks[table] = high
+
+        if not entry["tables"]:
+            logger.info("Delta export: no changes")
+            return None
+
+        # Watermarks only advance once every delta file is complete
+        manifest["deltas"].append(entry)
+        manifest["watermarks"] = watermarks
+        manifest["deletes"] = DELTA_DELETES_NOTE
+        manifest_path = self.deltas_dir / "manifest.json"
+        tmp = manifest_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, manifest_path)
+
+        total = sum(t["rows"] for t in entry["tables"].values())
+        logger.info(f"Exported delta {sequence}: {total} rows")
+        return entry
+
     def export_history_csv(self, course_id: int, history: list[dict],
                           filename: Optional[str] = None) -> Path:
         """Export change history to CSV.
@@ -0,0 +1,126 @@
+"""
+Cut Score Fingerprints
+Tracks the last value written per (course, year, modality), partial
+scores included, so unchanged modalities are not re-inserted into the
+cut_scores history
+"""
+import hashlib
+import json
+import threading
+from typing import Optional, Union
+
+ModalityKey = Union[int, str]
+Fingerprint = tuple[Optional[float], Optional[int], Optional[int], Optional[str]]
+
+
+def _to_float(value) -> Optional[float]:
+    if value is None or value == 'null':
+        return None
+    try:
+        return round(float(value), 2)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def modality_key(code: Optional[int], name: Optional[str]) -> ModalityKey:
+    """Identify a modality by its SISU code, falling back to its name"""
+    return code if code is not None else (name or "")
+
+
+def partial_hash(partial_scores) -> Optional[str]:
+    """Stable hash of a partial score series (None when empty)"""
+    if not partial_scores:
+        return None
+    encoded = json.dumps(partial_scores, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(encoded.encode('utf-8')).hexdigest()
+
+
+def fingerprint(cut_score, applicants, vacancies, partial_scores=None) -> Fingerprint:
+    """Normalised (cut_score, applicants, vacancies, partial scores hash) tuple.
+
+    Scores are rounded to two decimals to match the NUMERIC(8,2) column,
+    so values read back from the database compare equal to fresh ones.
+    """
+    return (_to_float(cut_score), _to_int(applicants), _to_int(vacancies),
+            partial_hash(partial_scores))
+
+
+def _modality_fingerprint(modality: dict) -> Fingerprint:
+    return fingerprint(
+        modality.get('cut_score'), modality.get('applicants'), modality.get('vacancies'),
+        modality.get('partial_scores')
+    )
+
+
+class CutScoreFingerprints:
+    """Last-written fingerprint per (course_id, year, modality)"""
+
+    def __init__(self):
+        self._seen: dict[tuple[int, int], dict[ModalityKey, Fingerprint]] = {}
+        self._lock = threading.Lock()
+
+    def is_loaded(self, course_id: int, year: int) -> bool:
+        """Check if the fingerprints for a course/year are already known"""
+        with self._lock:
+            return (course_id, year) in self._seen
+
+    def load(self, course_id: int, year: int, rows: list[dict]):
+        """Seed fingerprints from stored cut_scores rows.
+
+        Args:
+            course_id: Database course id
+            year: SISU year
+            rows: cut_scores rows ordered newest first; only the first
+                row of each modality is kept
+        """
+        latest: dict[ModalityKey, Fingerprint] = {}
+        for row in rows:
+            key = modality_key(row.get('modality_code'), row.get('modality_name'))
+            if key not in latest:
+                latest[key] = _modality_fingerprint(row)
+        with self._lock:
+            self._seen[(course_id, year)] = latest
+
+    def has_changed(self, course_id: int, year: int, modality: dict) -> bool:
+        """Check if a modality differs from the last written value.
+
+        Args:
+            course_id: Database course id
+            year: SISU year
+            modality: Dict with code, name, cut_score, applicants, vacancies
+                and optionally partial_scores (compared only when present)
+        """
+        key = modality_key(modality.get('code'), modality.get('name'))
+        new = _modality_fingerprint(modality)
+        with self._lock:
+            old = self._seen.get((course_id, year), {}).get(key)
+        if old is None:
+            return True
+        if 'partial_scores' not in modality:
+            return old[:3] != new[:3]
+        return old != new
+
+    def remember(self, course_id: int, year: int, modality: dict):
+        """Record a modality as written"""
+        key = modality_key(modality.get('code'), modality.get('name'))
+        new = _modality_fingerprint(modality)
+        with self._lock:
+            self._seen.setdefault((course_id, year), {})[key] = new
+
+    def forget(self, course_id: Optional[int] = None):
+        """Drop cached fingerprints (all, or for one course)"""
+        with self._lock:
+            if course_id is None:
+                self._seen.clear()
+            else:
+                for key in [k for k in self._seen if k[0] == course_id]:
+                    del self._seen[key]
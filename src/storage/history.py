@@ -4,9 +4,16 @@ Manages storage of raw data, processed data, and change history
 """
 import json
 import logging
+import mmap
+import os
+import zlib
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Iterable, Iterator, Optional
+
+from .blobs import RawArchive
+from .manifest import CatalogManifest
+from .segments import INDEX_ENTRY, SegmentCorruptError, SegmentEntry, SegmentStore
 
 logger = logging.getLogger(__name__)
 
@@ -24,51 +31,194 @@ class HistoryManager:
         for d in [self.raw_dir, self.processed_dir, self.history_dir]:
             d.mkdir(parents=True, exist_ok=True)
 
-    def _timestamp(self) -> str:
-        """Get current timestamp string"""
-        return datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Raw payloads stored once per distinct content, plus per-course timelines
+        self.raw_archive = RawArchive(self.raw_dir)
+        # Per-course append-only snapshot segments ({course_id}.seg + .idx)
+        self.processed_segments = SegmentStore(self.processed_dir)
+        # Course id -> latest snapshot pointer, snapshot count, last change
+        self.manifest = CatalogManifest(self.data_dir / "manifest.json")
+        if not self.manifest.exists():
+            self.rebuild_manifest()
 
     def save_raw(self, course_id: int, data: bytes) -> Path:
-        """Save raw binary data.
+        """Save raw binary data under its content hash.
+
+        Identical payloads are stored once; the course timeline records
+        when each one was seen.
 
         Args:
             course_id: Course identifier
             data: Raw binary data
 
         Returns:
-            Path to saved file
+            Path to the blob file
         """
-        filename = f"{course_id}_{self._timestamp()}.bin"
-        filepath = self.raw_dir / filename
-        filepath.write_bytes(data)
+        digest = self.raw_archive.put(course_id, data, datetime.now().timestamp())
+        filepath = self.raw_archive.blob_path(digest)
         logger.debug(f"Saved raw data: {filepath}")
         return filepath
 
     def save_processed(self, course_id: int, data: dict) -> Path:
-        """Save processed JSON data.
+        """Append processed data to the course's snapshot segment.
+
+        The newest snapshot is also kept as ``{course_id}_latest.json`` and
+        recorded in the catalog manifest.
 
         Args:
             course_id: Course identifier
             data: Decoded course data
 
         Returns:
-            Path to saved file
+            Path to the segment file
         """
-        # Save timestamped version
-        filename = f"{course_id}_{self._timestamp()}.json"
-        filepath = self.processed_dir / filename
-        filepath.write_text(json.dumps(data, indent=2, ensure_ascii=False))
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        entry = self.processed_segments.append(
+            course_id, payload.encode('utf-8'), datetime.now().timestamp()
+        )
 
-        # Also save as latest
-        latest = self.processed_dir / f"{course_id}_latest.json"
-        latest.write_text(json.dumps(data, indent=2, ensure_ascii=False))
+        self._write_latest(course_id, payload)
+        self._record_snapshot(course_id, entry)
 
+        filepath = self.processed_segments.segment_path(course_id)
         logger.debug(f"Saved processed data: {filepath}")
         return filepath
 
+    def replace_snapshots(self, course_id: int, snapshots: Iterable[tuple[float, dict]],
+                          keep_after: Optional[int] = None) -> int:
+        """Replace the stored snapshots of a course (used by backfills).
+
+        Args:
+            course_id: Course identifier
+            snapshots: (epoch seconds, decoded course data) pairs, oldest first
+            keep_after: Snapshot count when the caller read the course;
+                snapshots saved since then (by the monitor) are kept after
+                ``snapshots``. None replaces everything.
+
+        Returns:
+            Number of snapshots written
+        """
+        records = (
+            (timestamp, json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            for timestamp, data in snapshots
+        )
+        written = self.processed_segments.rewrite(course_id, records, keep_after=keep_after)
+        entry = self.processed_segments.last_entry(course_id)
+        if entry is not None:
+            self._write_latest(course_id, self.processed_segments.read(course_id, entry).decode('utf-8'))
+            self._record_snapshot(course_id, entry)
+        return written
+
+    def _write_latest(self, course_id: int, payload: str):
+        """Atomically write ``{course_id}_latest.json``"""
+        latest = self.processed_dir / f"{course_id}_latest.json"
+        tmp = latest.with_suffix(".json.tmp")
+        tmp.write_text(payload, encoding='utf-8')
+        os.replace(tmp, latest)
+
+    def iter_snapshots(self, course_id: int) -> Iterator[tuple[datetime, dict]]:
+        """Iterate stored snapshots of a course, oldest first.
+
+        Args:
+            course_id: Course identifier
+
+        Yields:
+            (capture time, decoded course data) tuples
+        """
+        for entry, payload in self.processed_segments.iter_records(course_id):
+            yield datetime.fromtimestamp(entry.timestamp), json.loads(payload)
+
+    def iter_raw(self, course_id: int) -> Iterator[tuple[datetime, bytes]]:
+        """Iterate stored raw payloads of a course, oldest first"""
+        for entry, payload in self.raw_archive.iter_payloads(course_id):
+            yield datetime.fromtimestamp(entry.timestamp), payload
+
+    def compact(self, keep_last: Optional[int] = None) -> dict[str, int]:
+        """Compact raw timelines and snapshot segments of every course.
+
+        Removes consecutive duplicate records and, if ``keep_last`` is set,
+        keeps only the newest ``keep_last`` entries per course. Raw blobs no
+        longer referenced by any timeline are deleted.
+
+        Returns:
+            Dict with number of records removed per store
+        """
+        removed = {"raw": 0, "processed": 0, "blobs": 0}
+        for course_id in self.raw_archive.courses():
+            removed["raw"] += self.raw_archive.compact(course_id, keep_last)
+        with self.manifest.batch():
+            for course_id in self.processed_segments.keys():
+                removed["processed"] += self.processed_segments.compact(course_id, keep_last)
+                # Compaction rewrites the segment, so the pointer moves
+                entry = self.processed_segments.last_entry(course_id)
+                if entry:
+                    self._record_snapshot(course_id, entry)
+        removed["blobs"] = self.raw_archive.gc()
+        return removed
+
+    def migrate_legacy(self, remove: bool = False) -> int:
+        """Import legacy per-poll ``{course_id}_{timestamp}.bin/.json`` files.
+
+        Safe to run repeatedly: a raw file whose (timestamp, content) is
+        already on the course timeline, or a snapshot whose capture time is
+        already in the course's segment (backfills rebuild snapshots from
+        the raw payloads, so their content may differ), is not imported
+        again.
+
+        Args:
+            remove: Delete each legacy file once imported (or found already imported)
+
+        Returns:
+            Number of files imported
+        """
+        imported = 0
+        for directory, pattern in [(self.raw_dir, "*.bin"), (self.processed_dir, "*.json")]:
+            files = []
+            for f in directory.glob(pattern):
+                parts = f.stem.split('_', 1)
+                try:
+                    course_id = int(parts[0])
+                    captured = datetime.strptime(parts[1], "%Y%m%d_%H%M%S")
+                except (IndexError, ValueError):
+                    continue  # _latest.json and unrelated files
+                files.append((captured, course_id, f))
+
+            seen: dict[int, set] = {}
+            for captured, course_id, f in sorted(files):
+                data = f.read_bytes()
+                timestamp = captured.timestamp()
+                if directory == self.raw_dir:
+                    if course_id not in seen:
+                        seen[course_id] = {(e.timestamp, e.digest)
+                                           for e in self.raw_archive.timeline(course_id)}
+                    key = (timestamp, RawArchive.digest(data))
+                else:
+                    if course_id not in seen:
+                        seen[course_id] = {e.timestamp for e in self.processed_segments.entries(course_id)}
+                    key = timestamp
+
+                if key not in seen[course_id]:
+                    if directory == self.raw_dir:
+                        self.raw_archive.put(course_id, data, timestamp)
+                    else:
+                        data = json.dumps(json.loads(data), ensure_ascii=False,
+                                          separators=(',', ':')).encode('utf-8')
+                        self.processed_segments.append(course_id, data, timestamp)
+                    seen[course_id].add(key)
+                    imported += 1
+                if remove:
+                    f.unlink()
+
+        if imported:
+            self.rebuild_manifest()
+        logger.info(f"Imported {imported} legacy history files")
+        return imported
+
     def save_change(self, course_id: int, changes: list) -> Path:
         """Save change history entry.
 
+        Appends a line to ``{course_id}_changes.jsonl`` and its
+        (timestamp, offset, length) entry to ``{course_id}_changes.idx``.
+
         Args:
             course_id: Course identifier
             changes: List of ScoreChange objects
@@ -77,9 +227,11 @@ class HistoryManager:
             Path to history file
         """
         history_file = self.history_dir / f"{course_id}_changes.jsonl"
+        self._sync_change_index(course_id)
 
+        now = datetime.now()
         entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": now.isoformat(),
             "changes": [
                 {
                     "modality": c.modality,
@@ -91,46 +243,215 @@ class HistoryManager:
                 for c in changes
             ]
         }
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode('utf-8')
 
-        with open(history_file, 'a') as f:
-            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        with open(history_file, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+        with open(self._change_index_path(course_id), 'ab') as idx:
+            idx.write(INDEX_ENTRY.pack(now.timestamp(), offset, len(line)))
+        self.manifest.update(course_id, last_change=now.isoformat())
 
         logger.debug(f"Saved change history: {history_file}")
         return history_file
 
+    def _change_index_path(self, course_id: int) -> Path:
+        return self.history_dir / f"{course_id}_changes.idx"
+
+    def _sync_change_index(self, course_id: int):
+        """Index any change lines not yet covered by the sidecar index.
+
+        Handles history files written before the index existed (or by other
+        tools) by scanning only the unindexed tail.
+        """
+        history_file = self.history_dir / f"{course_id}_changes.jsonl"
+        if not history_file.exists():
+            return
+
+        index_path = self._change_index_path(course_id)
+        indexed_end = 0
+        if index_path.exists():
+            size = index_path.stat().st_size
+            usable = size - size % INDEX_ENTRY.size
+            if usable != size:
+                with open(index_path, 'r+b') as idx:
+                    idx.truncate(usable)
+            if usable:
+                with open(index_path, 'rb') as idx:
+                    idx.seek(usable - INDEX_ENTRY.size)
+                    _, offset, length = INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size))
+                    indexed_end = offset + length
+
+        if indexed_end >= history_file.stat().st_size:
+            return
+
+        with open(history_file, 'rb') as f, open(index_path, 'ab') as idx:
+            f.seek(indexed_end)
+            offset = indexed_end
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial write; index it once complete
+                if line.strip():
+                    ts = json.loads(line).get("timestamp", "")
+                    try:
+                        epoch = datetime.fromisoformat(ts).timestamp()
+                    except (TypeError, ValueError):
+                        epoch = 0.0
+                    idx.write(INDEX_ENTRY.pack(epoch, offset, len(line)))
+                offset += len(line)
+
+    def _record_snapshot(self, course_id: int, entry: SegmentEntry):
+        """Point the manifest at a course's newest snapshot record"""
+        self.manifest.update(
+            course_id,
+            snapshot_offset=entry.offset,
+            snapshot_length=entry.length,
+            captured_at=datetime.fromtimestamp(entry.timestamp).isoformat(),
+            snapshot_count=self.processed_segments.count(course_id),
+        )
+
+    def rebuild_manifest(self) -> int:
+        """Rebuild the catalog manifest by scanning the data directories.
+
+        Only needed once for data written before the manifest existed, or
+        after files were changed by hand.
+
+        Returns:
+            Number of courses in the manifest
+        """
+        entries: dict[int, dict] = {}
+        for course_id in self.processed_segments.keys():
+            entry = self.processed_segments.last_entry(course_id)
+            if entry is None:
+                continue
+            entries[course_id] = {
+                "snapshot_offset": entry.offset,
+                "snapshot_length": entry.length,
+                "captured_at": datetime.fromtimestamp(entry.timestamp).isoformat(),
+                "snapshot_count": self.processed_segments.count(course_id),
+            }
+
+        # Courses with only a _latest.json (written before segments existed)
+        for f in self.processed_dir.glob("*_latest.json"):
+            try:
+                entries.setdefault(int(f.stem.split('_')[0]), {})
+            except ValueError:
+                pass
+
+        for f in self.history_dir.glob("*_changes.jsonl"):
+            try:
+                course_id = int(f.stem.split('_')[0])
+            except ValueError:
+                continue
+            last = self.get_change_history(course_id, limit=1)
+            if last:
+                entries.setdefault(course_id, {})["last_change"] = last[-1].get("timestamp")
+
+        self.manifest.replace(entries)
+        logger.info(f"Rebuilt catalog manifest: {len(entries)} courses")
+        return len(entries)
+
+    def get_catalog_entry(self, course_id: int) -> Optional[dict]:
+        """Manifest metadata for a course (snapshot count, capture and change times)"""
+        return self.manifest.get(course_id)
+
     def get_latest(self, course_id: int) -> Optional[dict]:
         """Get latest processed data for a course.
 
+        Reads the snapshot record the manifest points at, falling back to
+        ``{course_id}_latest.json``.
+
         Args:
             course_id: Course identifier
 
         Returns:
             Decoded course data or None
         """
+        meta = self.manifest.get(course_id)
+        if meta and "snapshot_offset" in meta:
+            entry = SegmentEntry(0.0, meta["snapshot_offset"], meta["snapshot_length"])
+            try:
+                return json.loads(self.processed_segments.read(course_id, entry))
+            except (OSError, SegmentCorruptError, zlib.error):
+                logger.warning(f"Stale manifest entry for course {course_id}")
+
         latest = self.processed_dir / f"{course_id}_latest.json"
         if latest.exists():
             return json.loads(latest.read_text())
         return None
 
-    def get_change_history(self, course_id: int) -> list[dict]:
+    def get_change_history(
+        self,
+        course_id: int,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None,
+    ) -> list[dict]:
         """Get change history for a course.
 
+        Binary-searches the memory-mapped sidecar index for the time range
+        and parses only the matching lines.
+
         Args:
             course_id: Course identifier
+            since: Only entries at or after this time
+            until: Only entries at or before this time
+            limit: Only the most recent ``limit`` entries of the range
 
         Returns:
-            List of change entries
+            List of change entries, oldest first
         """
         history_file = self.history_dir / f"{course_id}_changes.jsonl"
         if not history_file.exists():
             return []
 
-        entries = []
-        with open(history_file, 'r') as f:
-            for line in f:
-                if line.strip():
-                    entries.append(json.loads(line))
-        return entries
+        self._sync_change_index(course_id)
+        index_path = self._change_index_path(course_id)
+        if index_path.stat().st_size == 0:
+            return []
+
+        with open(index_path, 'rb') as idx:
+            with mmap.mmap(idx.fileno(), 0, access=mmap.ACCESS_READ) as index:
+                n = len(index) // INDEX_ENTRY.size
+
+                def timestamp_at(i: int) -> float:
+                    return INDEX_ENTRY.unpack_from(index, i * INDEX_ENTRY.size)[0]
+
+                def bisect(value: float, right: bool) -> int:
+                    lo, hi = 0, n
+                    while lo < hi:
+                        mid = (lo + hi) // 2
+                        ts = timestamp_at(mid)
+                        if ts < value or (right and ts == value):
+                            lo = mid + 1
+                        else:
+                            hi = mid
+                    return lo
+
+                start = bisect(since.timestamp(), right=False) if since else 0
+                end = bisect(until.timestamp(), right=True) if until else n
+                if limit is not None:
+                    start = max(start, end - limit)
+                if start >= end:
+                    return []
+
+                _, first_offset, _ = INDEX_ENTRY.unpack_from(index, start * INDEX_ENTRY.size)
+                _, last_offset, last_length = INDEX_ENTRY.unpack_from(
+                    index, (end - 1) * INDEX_ENTRY.size
+                )
+
+        with open(history_file, 'rb') as f:
+            f.seek(first_offset)
+            chunk = f.read(last_offset + last_length - first_offset)
+
+        return [json.loads(line) for line in chunk.splitlines() if line.strip()]
+
+    def count_changes(self, course_id: int) -> int:
+        """Number of change entries recorded for a course"""
+        if not (self.history_dir / f"{course_id}_changes.jsonl").exists():
+            return 0
+        self._sync_change_index(course_id)
+        return self._change_index_path(course_id).stat().st_size // INDEX_ENTRY.size
 
     def list_courses(self) -> list[int]:
         """List all course IDs with stored data.
@@ -138,11 +459,4 @@ class HistoryManager:
         Returns:
             List of course IDs
         """
-        course_ids = set()
-        for f in self.processed_dir.glob("*_latest.json"):
-            try:
-                course_id = int(f.stem.split('_')[0])
-                course_ids.add(course_id)
-            except ValueError:
-                pass
-        return sorted(course_ids)
+        return self.manifest.course_ids()
@@ -0,0 +1,196 @@
+"""
+Catalog Manifest
+Persisted index of stored courses: latest snapshot pointer, snapshot count
+and last change time
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+# Log size past which it is folded into the snapshot (or the snapshot's size, if larger)
+COMPACT_MIN_BYTES = 256 * 1024
+
+
+class CatalogManifest:
+    """Manifest of course id -> storage metadata.
+
+    Stored as a JSON snapshot (``manifest.json``) plus an append-only log
+    of entry updates (``manifest.log``, one JSON line each), so a save
+    costs one small append instead of a rewrite of the whole catalog. Once
+    the log outgrows the snapshot it is folded back into it (compaction).
+
+    Appends and compactions hold an exclusive ``flock`` on
+    ``manifest.lock``, so the monitor and a backfill can share a manifest
+    without overwriting each other's entries; readers pick up other
+    processes' updates by reading the log past their last offset. Inside
+    ``batch()`` updates are buffered and appended in one write.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.log_path = self.path.with_suffix(".log")
+        self.lock_path = self.path.with_suffix(".lock")
+        self._entries: dict[int, dict] = {}
+        self._pending: dict[int, dict] = {}
+        self._log_inode: Optional[int] = None
+        self._log_offset = 0
+        self._batch_depth = 0
+        self._lock = threading.RLock()
+        with self._file_lock(exclusive=False):
+            self._read_all()
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    @contextmanager
+    def _file_lock(self, exclusive: bool = True):
+        """Cross-process lock on the manifest files (no-op without fcntl)"""
+        if fcntl is None:
+            yield
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_all(self):
+        """Load the snapshot and replay the whole log (caller holds the file lock)"""
+        self._entries = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            self._entries = {int(k): v for k, v in data.get("courses", {}).items()}
+        self._log_inode = None
+        self._log_offset = 0
+        self._read_log()
+
+    def _read_log(self):
+        """Apply log lines appended since the last read"""
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            self._log_inode = os.fstat(f.fileno()).st_ino
+            f.seek(self._log_offset)
+            data = f.read()
+        # Only complete lines; a partial one is read once its write finishes
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                record = json.loads(line)
+                self._entries.setdefault(int(record["id"]), {}).update(record["set"])
+        self._log_offset += end
+
+    def _refresh(self, locked: bool = False):
+        """Pick up appends and compactions made by other processes"""
+        try:
+            st = os.stat(self.log_path)
+        except FileNotFoundError:
+            st = None
+        inode = st.st_ino if st else None
+        if inode != self._log_inode or (st and st.st_size < self._log_offset):
+            # Compacted (or replaced) since the last read: reload everything
+            if locked:
+                self._read_all()
+            else:
+                with self._file_lock(exclusive=False):
+                    self._read_all()
+        elif st and st.st_size > self._log_offset:
+            self._read_log()
+
+    def get(self, course_id: int) -> Optional[dict]:
+        """Metadata for a course, or None if not in the manifest"""
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(course_id)
+            pending = self._pending.get(course_id)
+            if entry is None and pending is None:
+                return None
+            return {**(entry or {}), **(pending or {})}
+
+    def course_ids(self) -> list[int]:
+        """All course ids in the manifest, sorted"""
+        with self._lock:
+            self._refresh()
+            return sorted(self._entries.keys() | self._pending.keys())
+
+    def update(self, course_id: int, **fields):
+        """Merge fields into a course's entry and persist"""
+        with self._lock:
+            self._pending.setdefault(course_id, {}).update(fields)
+            if self._batch_depth == 0:
+                self.flush()
+
+    def replace(self, entries: dict[int, dict]):
+        """Replace the whole manifest and persist"""
+        with self._lock, self._file_lock():
+            self._entries = {int(k): dict(v) for k, v in entries.items()}
+            self._pending = {}
+            self._compact()
+
+    def flush(self):
+        """Append pending updates to the log, compacting it once it outgrows the snapshot"""
+        with self._lock:
+            if not self._pending:
+                return
+            lines = b"".join(
+                json.dumps({"id": k, "set": v}, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n"
+                for k, v in self._pending.items()
+            )
+            with self._file_lock():
+                self._refresh(locked=True)
+                with open(self.log_path, 'ab') as f:
+                    f.write(lines)
+                    self._log_inode = os.fstat(f.fileno()).st_ino
+                self._log_offset += len(lines)
+                for course_id, fields in self._pending.items():
+                    self._entries.setdefault(course_id, {}).update(fields)
+                self._pending = {}
+
+                snapshot_size = self.path.stat().st_size if self.path.exists() else 0
+                if not snapshot_size or self._log_offset > max(COMPACT_MIN_BYTES, snapshot_size):
+                    self._compact()
+
+    def compact(self):
+        """Fold the log into the snapshot"""
+        with self._lock, self._file_lock():
+            self._refresh(locked=True)
+            self._compact()
+
+    def _compact(self):
+        """Write the snapshot atomically and start an empty log (caller holds the file lock)"""
+        data = {"version": 1, "courses": {str(k): v for k, v in sorted(self._entries.items())}}
+        tmp = self.path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(',', ':')), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+        # A new log file (new inode) tells readers to reload the snapshot
+        tmp_log = self.log_path.with_suffix(f".logtmp{os.getpid()}")
+        tmp_log.write_bytes(b"")
+        self._log_inode = os.stat(tmp_log).st_ino
+        os.replace(tmp_log, self.log_path)
+        self._log_offset = 0
+
+    @contextmanager
+    def batch(self):
+        """Defer manifest writes until the outermost batch exits"""
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
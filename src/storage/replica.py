@@ -0,0 +1,280 @@
+"""
+Local Replica
+Embedded SQLite mirror of the Supabase tables for local analysis
+"""
+import json
+import logging
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLICA_PATH = Path("data/replica.sqlite")
+
+# Rows newer than this may come from transactions still in flight, so they
+# don't advance the high-water mark (see ReplicaTable)
+REPLICA_SAFETY_LAG = timedelta(minutes=5)
+
+
+def _settled(value, cutoff: datetime) -> bool:
+    """Whether a row's transaction time is older than the safety cutoff"""
+    if value is None:
+        return True
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value < cutoff
+
+
+@dataclass(frozen=True)
+class ReplicaTable:
+    """A mirrored table.
+
+    Incremental tables are synced past the highest ``watermark`` value
+    seen (the high-water mark): ``id`` for append-only tables,
+    ``updated_at`` for tables upserted in place. Small tables are
+    re-mirrored in full on every sync. Rows deleted upstream (e.g. by
+    compact_cut_scores) are only dropped by a full sync; incremental syncs
+    detect them through a row-count check (see LocalReplica.stale_tables).
+
+    ``commit_time`` is the column set to the writing transaction's NOW().
+    Rows written within REPLICA_SAFETY_LAG are mirrored but the mark stops
+    short of them (id-ordered tables at the first one), so the next sync
+    re-reads them along with any transaction that committed late with a
+    lower id or timestamp; INSERT OR REPLACE dedupes the re-read rows.
+    """
+    name: str
+    columns: tuple[str, ...]
+    incremental: bool = True
+    watermark: str = "id"
+    unique: tuple[str, ...] = ()
+    indexes: tuple[tuple[str, ...], ...] = ()
+    json_columns: tuple[str, ...] = ()
+    commit_time: Optional[str] = None
+
+
+REPLICA_TABLES = (
+    ReplicaTable(
+        name="courses",
+        columns=("id", "code", "name", "university", "campus", "city", "state",
+                 "degree", "schedule", "latitude", "longitude", "created_at"),
+        incremental=False,
+        indexes=(("code",), ("state", "city")),
+    ),
+    ReplicaTable(
+        name="course_weights",
+        columns=("id", "course_id", "year", "peso_red", "peso_ling", "peso_mat",
+                 "peso_ch", "peso_cn", "min_red", "min_ling", "min_mat", "min_ch",
+                 "min_cn", "min_enem"),
+        incremental=False,
+        indexes=(("course_id", "year"),),
+    ),
+    ReplicaTable(
+        name="cut_scores",
+        columns=("id", "course_id", "year", "modality_code", "modality_name",
+                 "cut_score", "applicants", "vacancies", "partial_scores", "captured_at"),
+        indexes=(("course_id", "year"), ("modality_name",)),
+        json_columns=("partial_scores",),
+        commit_time="captured_at",
+    ),
+    ReplicaTable(
+        name="approved_students",
+        columns=("id", "course_id", "year", "modality_code", "rank", "name", "score",
+                 "bonus", "call_number", "status", "created_at", "updated_at"),
+        # Upserted in place by the sync pipeline: ids don't change on update
+        watermark="updated_at",
+        commit_time="updated_at",
+        unique=("course_id", "year", "modality_code", "rank", "call_number"),
+        indexes=(("course_id", "year"),),
+    ),
+)
+
+
+class LocalReplica:
+    """SQLite replica of courses, weights, cut scores and approved students"""
+
+    def __init__(self, path: Path = DEFAULT_REPLICA_PATH, client=None, batch_size: int = 1000):
+        """
+        Args:
+            path: SQLite database file
+            client: SupabaseClient used by sync(); not needed for queries
+            batch_size: Rows per keyset page and per insert batch
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.client = client
+        self.batch_size = batch_size
+        self.tables = {t.name: t for t in REPLICA_TABLES}
+
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self._init_schema()
+
+    def _init_schema(self):
+        """Create mirrored tables and the sync state table"""
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS _replica_state (
+                    table_name TEXT PRIMARY KEY,
+                    high_water_mark,
+                    row_count INTEGER,
+                    synced_at TEXT,
+                    watermark_column TEXT,
+                    upstream_count INTEGER
+                )
+            """)
+            self._add_missing_columns("_replica_state", ("watermark_column", "upstream_count"))
+            for table in self.tables.values():
+                columns = ", ".join(
+                    "id INTEGER PRIMARY KEY" if c == "id" else c for c in table.columns
+                )
+                unique = f", UNIQUE ({', '.join(table.unique)})" if table.unique else ""
+                self.conn.execute(f"CREATE TABLE IF NOT EXISTS {table.name} ({columns}{unique})")
+                self._add_missing_columns(table.name, table.columns)
+                for cols in table.indexes:
+                    index = f"idx_{table.name}_{'_'.join(cols)}"
+                    self.conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS {index} ON {table.name} ({', '.join(cols)})"
+                    )
+
+    def _add_missing_columns(self, table: str, columns: tuple[str, ...]):
+        """Upgrade a replica created by an older version"""
+        existing = {r["name"] for r in self.conn.execute(f"PRAGMA table_info({table})")}
+        for column in columns:
+            if column not in existing:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+    def high_water_mark(self, table: str) -> Optional[Any]:
+        """Highest watermark value mirrored for a table, or None if never synced.
+
+        A mark recorded for another watermark column (e.g. an id before
+        the table moved to updated_at) doesn't count.
+        """
+        row = self.conn.execute(
+            "SELECT high_water_mark, watermark_column FROM _replica_state WHERE table_name = ?",
+            (table,)
+        ).fetchone()
+        if row is None or row["watermark_column"] not in (None, self.tables[table].watermark):
+            return None
+        if row["watermark_column"] is None and self.tables[table].watermark != "id":
+            return None
+        return row["high_water_mark"]
+
+    def stale_tables(self) -> dict[str, tuple[int, int]]:
+        """Tables whose row count differs from Supabase at the last sync.
+
+        A replica with more rows than upstream kept rows deleted there;
+        run a full sync to drop them.
+
+        Returns:
+            Dict of table name -> (local rows, upstream rows)
+        """
+        rows = self.conn.execute("""
+            SELECT table_name, row_count, upstream_count FROM _replica_state
+            WHERE upstream_count IS NOT NULL AND row_count != upstream_count
+        """)
+        return {r["table_name"]: (r["row_count"], r["upstream_count"]) for r in rows}
+
+    def sync(self, tables: Optional[list[str]] = None, full: bool = False) -> dict[str, int]:
+        """Mirror new rows from Supabase.
+
+        Args:
+            tables: Table names to sync (default: all)
+            full: Rebuild tables from scratch, dropping rows deleted upstream
+
+        Returns:
+            Dict of table name -> rows written
+        """
+        if self.client is None:
+            raise ValueError("LocalReplica.sync() requires a SupabaseClient")
+
+        written = {}
+        for name in tables or list(self.tables):
+            written[name] = self._sync_table(self.tables[name], full)
+            logger.info(f"Replica {name}: {written[name]} rows")
+        return written
+
+    def _sync_table(self, table: ReplicaTable, full: bool) -> int:
+        after = None if full or not table.incremental else self.high_water_mark(table.name)
+        # Without a usable mark an incremental table is rebuilt as well
+        rebuild = after is None
+        hwm = after
+        cutoff = datetime.now(timezone.utc) - REPLICA_SAFETY_LAG
+        advancing = True
+
+        placeholders = ", ".join("?" for _ in table.columns)
+        insert = (f"INSERT OR REPLACE INTO {table.name} ({', '.join(table.columns)}) "
+                  f"VALUES ({placeholders})")
+
+        count = 0
+        batch = []
+        with self.conn:
+            if rebuild:
+                self.conn.execute(f"DELETE FROM {table.name}")
+
+            if table.watermark == "id":
+                rows = self.client.iter_table(
+                    table.name, select=",".join(table.columns), page=self.batch_size, after=after
+                )
+            else:
+                rows = self.client.iter_table(
+                    table.name, select=",".join(table.columns), page=self.batch_size,
+                    params={table.watermark: f"gt.{after}"} if after is not None else None
+                )
+            for row in rows:
+                batch.append(tuple(
+                    json.dumps(row.get(c), ensure_ascii=False)
+                    if c in table.json_columns and row.get(c) is not None else row.get(c)
+                    for c in table.columns
+                ))
+                mark = row.get(table.watermark)
+                if table.commit_time and not _settled(row.get(table.commit_time), cutoff):
+                    # Keyset order is by id: keep the mark below the first unsettled row
+                    if table.watermark == "id":
+                        advancing = False
+                    mark = None
+                if mark is not None and advancing:
+                    hwm = mark if hwm is None else max(hwm, mark)
+                if len(batch) >= self.batch_size:
+                    self.conn.executemany(insert, batch)
+                    count += len(batch)
+                    batch = []
+            if batch:
+                self.conn.executemany(insert, batch)
+                count += len(batch)
+
+            total = self.conn.execute(f"SELECT COUNT(*) FROM {table.name}").fetchone()[0]
+            # Incremental syncs never see deletes: compare with the upstream count
+            upstream = None if rebuild else self.client.count_rows(table.name)
+            self.conn.execute("""
+                INSERT OR REPLACE INTO _replica_state
+                    (table_name, high_water_mark, row_count, synced_at, watermark_column, upstream_count)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (table.name, hwm, total, datetime.now().isoformat(), table.watermark, upstream))
+
+        if upstream is not None and upstream != total:
+            logger.warning(f"Replica {table.name} has {total} rows, Supabase {upstream}: "
+                           f"rows were deleted upstream or missed; run a full sync")
+        return count
+
+    def query(self, sql: str, params: tuple = ()) -> list[dict]:
+        """Run a read query against the replica.
+
+        Returns:
+            List of row dicts
+        """
+        return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
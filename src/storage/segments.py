@@ -0,0 +1,235 @@
+"""
+Segment Store
+Append-only, per-course segment files of compressed length-prefixed records
+with a fixed-width offset index
+"""
+import logging
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Record header: payload length, CRC32 of the compressed payload
+RECORD_HEADER = struct.Struct(">II")
+# Index entry: timestamp (epoch seconds), record offset, record length
+INDEX_ENTRY = struct.Struct(">dQI")
+
+
+class SegmentCorruptError(Exception):
+    """Raised when a record fails its length or checksum check"""
+
+
+@dataclass(frozen=True)
+class SegmentEntry:
+    """Index entry pointing at one record of a segment"""
+    timestamp: float
+    offset: int
+    length: int
+
+
+class SegmentStore:
+    """Append-only record store with one segment + index file per key.
+
+    Each key (a course id) owns ``{key}.seg``, holding zlib-compressed
+    records prefixed by their length and checksum, and ``{key}.idx``, an
+    array of fixed-width (timestamp, offset, length) entries. The number of
+    files grows with the number of keys, not with the number of records.
+
+    Appends and rewrites hold an exclusive ``flock`` on the store's
+    directory, so a backfill rewriting a segment can't drop a record the
+    monitor appends at the same time.
+    """
+
+    def __init__(self, directory: Path, compression_level: int = 6):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compression_level = compression_level
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        """Cross-process lock on the store's segments (no-op without fcntl)"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
+    def segment_path(self, key: int) -> Path:
+        return self.directory / f"{key}.seg"
+
+    def index_path(self, key: int) -> Path:
+        return self.directory / f"{key}.idx"
+
+    def append(self, key: int, payload: bytes, timestamp: float) -> SegmentEntry:
+        """Append a record.
+
+        Args:
+            key: Course identifier
+            payload: Uncompressed record bytes
+            timestamp: Epoch seconds of the record
+
+        Returns:
+            Index entry of the new record
+        """
+        compressed = zlib.compress(payload, self.compression_level)
+        record = RECORD_HEADER.pack(len(compressed), zlib.crc32(compressed)) + compressed
+
+        with self._lock, self._file_lock():
+            with open(self.segment_path(key), "ab") as seg:
+                offset = seg.seek(0, os.SEEK_END)
+                seg.write(record)
+            entry = SegmentEntry(timestamp, offset, len(record))
+            with open(self.index_path(key), "ab") as idx:
+                idx.write(INDEX_ENTRY.pack(entry.timestamp, entry.offset, entry.length))
+        return entry
+
+    def entries(self, key: int) -> list[SegmentEntry]:
+        """All index entries for a key, oldest first"""
+        path = self.index_path(key)
+        if not path.exists():
+            return []
+        data = path.read_bytes()
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        return [SegmentEntry(*e) for e in INDEX_ENTRY.iter_unpack(data[:usable])]
+
+    def count(self, key: int) -> int:
+        """Number of records stored for a key"""
+        path = self.index_path(key)
+        return path.stat().st_size // INDEX_ENTRY.size if path.exists() else 0
+
+    def last_entry(self, key: int) -> Optional[SegmentEntry]:
+        """Index entry of the newest record, read without loading the whole index"""
+        n = self.count(key)
+        if n == 0:
+            return None
+        with open(self.index_path(key), "rb") as idx:
+            idx.seek((n - 1) * INDEX_ENTRY.size)
+            return SegmentEntry(*INDEX_ENTRY.unpack(idx.read(INDEX_ENTRY.size)))
+
+    def read(self, key: int, entry: SegmentEntry) -> bytes:
+        """Read and decompress the record an index entry points at"""
+        with open(self.segment_path(key), "rb") as seg:
+            seg.seek(entry.offset)
+            return self._decode(seg.read(entry.length))
+
+    def latest(self, key: int) -> Optional[bytes]:
+        """Newest record for a key"""
+        entry = self.last_entry(key)
+        return self.read(key, entry) if entry else None
+
+    def iter_records(self, key: int) -> Iterator[tuple[SegmentEntry, bytes]]:
+        """Iterate (entry, payload) pairs, oldest first"""
+        entries = self.entries(key)
+        if not entries:
+            return
+        with open(self.segment_path(key), "rb") as seg:
+            for entry in entries:
+                seg.seek(entry.offset)
+                yield entry, self._decode(seg.read(entry.length))
+
+    def keys(self) -> list[int]:
+        """Keys with at least one index file"""
+        keys = []
+        for path in self.directory.glob("*.idx"):
+            try:
+                keys.append(int(path.stem))
+            except ValueError:
+                pass
+        return sorted(keys)
+
+    def compact(self, key: int, keep_last: Optional[int] = None) -> int:
+        """Rewrite a segment without redundant records.
+
+        Drops records whose payload equals the previous record's and, if
+        ``keep_last`` is set, all but the newest ``keep_last`` records.
+        The new segment and index replace the old ones atomically.
+
+        Returns:
+            Number of records removed
+        """
+        with self._lock, self._file_lock():
+            kept: list[tuple[float, bytes]] = []
+            previous = None
+            total = 0
+            for entry, payload in self.iter_records(key):
+                total += 1
+                if payload == previous:
+                    continue
+                kept.append((entry.timestamp, payload))
+                previous = payload
+            if keep_last is not None:
+                kept = kept[-keep_last:] if keep_last > 0 else []
+
+            removed = total - len(kept)
+            if removed == 0:
+                return 0
+            self._write(key, kept)
+
+        logger.debug(f"Compacted segment {key}: removed {removed} records")
+        return removed
+
+    def rewrite(self, key: int, records: Iterable[tuple[float, bytes]],
+                keep_after: Optional[int] = None) -> int:
+        """Atomically replace all records of a key.
+
+        Args:
+            key: Course identifier
+            records: (timestamp, uncompressed payload) pairs, oldest first
+            keep_after: Number of records ``records`` replaces; records
+                appended past it since the caller counted them are kept
+                after ``records`` (None replaces everything)
+
+        Returns:
+            Number of records written
+        """
+        with self._lock, self._file_lock():
+            if keep_after is not None:
+                appended = [(entry.timestamp, payload) for entry, payload
+                            in islice(self.iter_records(key), keep_after, None)]
+                records = [*records, *appended]
+            return self._write(key, records)
+
+    def _write(self, key: int, records: Iterable[tuple[float, bytes]]) -> int:
+        seg_tmp = self.segment_path(key).with_suffix(".seg.tmp")
+        idx_tmp = self.index_path(key).with_suffix(".idx.tmp")
+        offset = 0
+        written = 0
+        with open(seg_tmp, "wb") as seg, open(idx_tmp, "wb") as idx:
+            for timestamp, payload in records:
+                compressed = zlib.compress(payload, self.compression_level)
+                record = RECORD_HEADER.pack(len(compressed), zlib.crc32(compressed)) + compressed
+                seg.write(record)
+                idx.write(INDEX_ENTRY.pack(timestamp, offset, len(record)))
+                offset += len(record)
+                written += 1
+
+        os.replace(seg_tmp, self.segment_path(key))
+        os.replace(idx_tmp, self.index_path(key))
+        return written
+
+    @staticmethod
+    def _decode(record: bytes) -> bytes:
+        if len(record) < RECORD_HEADER.size:
+            raise SegmentCorruptError("Truncated record header")
+        length, crc = RECORD_HEADER.unpack_from(record)
+        compressed = record[RECORD_HEADER.size:RECORD_HEADER.size + length]
+        if len(compressed) != length or zlib.crc32(compressed) != crc:
+            raise SegmentCorruptError("Record length or checksum mismatch")
+        return zlib.decompress(compressed)
@@ -4,15 +4,40 @@ REST API client for Supabase database operations
 """
 import os
 import logging
-from typing import Optional
+from typing import Any, Iterator, Optional
 from dataclasses import dataclass
 
 import requests
 
+from .fingerprint import CutScoreFingerprints
+
 logger = logging.getLogger(__name__)
 
 DEFAULT_SUPABASE_URL = "https://sisymqzxvuktdcbsbpbp.supabase.co"
 
+# Public course columns (what search_courses() returns)
+COURSE_COLUMNS = ("id,code,name,university,campus,city,state,degree,schedule,"
+                  "latitude,longitude,created_at")
+
+
+def _matches(stored: dict, data: dict) -> bool:
+    """Whether a stored row already holds every value in ``data``.
+
+    Numbers are compared at the 2 decimal places NUMERIC columns keep.
+    """
+    for key, value in data.items():
+        current = stored.get(key)
+        if current == value:
+            continue
+        if current is None or value is None:
+            return False
+        try:
+            if round(float(current), 2) != round(float(value), 2):
+                return False
+        except (TypeError, ValueError):
+            return False
+    return True
+
 
 @dataclass
 class SupabaseConfig:
@@ -37,6 +62,7 @@ class SupabaseClient:
             "Authorization": f"Bearer {self.service_key}",
             "Content-Type": "application/json",
         }
+        self.fingerprints = CutScoreFingerprints()
 
     def _request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
         """Make HTTP request to Supabase"""
@@ -51,6 +77,26 @@ class SupabaseClient:
         resp.raise_for_status()
         return resp.json()
 
+    def _get_with_count(self, endpoint: str, params: Optional[dict] = None,
+                        count: str = "exact") -> tuple[list[dict], Optional[int]]:
+        """GET request also returning the total row count of the filter.
+
+        Args:
+            count: PostgREST count mode (exact, planned or estimated)
+
+        Returns:
+            (rows, total), total None if the server didn't report one
+        """
+        resp = self._request("GET", endpoint, params=params, headers={"Prefer": f"count={count}"})
+        resp.raise_for_status()
+        total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+        return resp.json(), int(total) if total.isdigit() else None
+
+    def count_rows(self, endpoint: str, params: Optional[dict] = None) -> Optional[int]:
+        """Exact number of rows in a table (or matching ``params``)"""
+        _, total = self._get_with_count(endpoint, params={**(params or {}), "select": "id", "limit": 1})
+        return total
+
     def _post(self, endpoint: str, data: dict) -> dict:
         """POST request returning created record"""
         resp = self._request(
@@ -62,6 +108,56 @@ class SupabaseClient:
         result = resp.json()
         return result[0] if result else {}
 
+    def iter_table(
+        self,
+        endpoint: str,
+        select: str = "*",
+        key: str = "id",
+        page: int = 1000,
+        params: Optional[dict] = None,
+        after: Optional[Any] = None,
+    ) -> Iterator[dict]:
+        """Stream every row of a table using keyset pagination.
+
+        Each page filters on ``key > last seen key`` instead of using an
+        offset, so the scan is linear and doesn't skip or repeat rows when
+        other writers insert during it. ``key`` must be unique and is added
+        to ``select`` if missing.
+
+        Args:
+            endpoint: Table or view name
+            select: PostgREST column list
+            key: Unique, sortable column to paginate on
+            page: Rows per request
+            params: Extra PostgREST filters
+            after: Resume after this key value (exclusive)
+
+        Yields:
+            Row dicts in ``key`` order
+        """
+        columns = [c.strip() for c in select.split(",")]
+        if select != "*" and key not in columns:
+            select = f"{select},{key}"
+
+        last = after
+        while True:
+            query = {**(params or {}), "select": select, "order": f"{key}.asc", "limit": page}
+            if last is not None:
+                query[key] = f"gt.{last}"
+
+            batch = self._get(endpoint, params=query)
+            if not batch:
+                return
+            yield from batch
+            # Stop only on an empty page: the server may cap page size (max-rows)
+            last = batch[-1][key]
+
+    def _rpc(self, function: str, params: Optional[dict] = None):
+        """Call a Postgres function exposed through PostgREST"""
+        resp = self._request("POST", f"rpc/{function}", json=params or {})
+        resp.raise_for_status()
+        return resp.json()
+
     def _upsert(self, endpoint: str, data: dict, on_conflict: str = "") -> dict:
         """UPSERT (insert or update) request"""
         headers = {"Prefer": "return=representation"}
@@ -84,9 +180,136 @@ class SupabaseClient:
         results = self._get("courses", params={"code": f"eq.{code}"})
         return results[0] if results else None
 
+    def get_course_detail(
+        self,
+        code: Optional[int] = None,
+        years: Optional[list[int]] = None,
+        course_id: Optional[int] = None,
+    ) -> Optional[dict]:
+        """Get a course with its latest cut scores and weights.
+
+        One request: the course row embeds ``latest_cut_scores`` (one row
+        per year/modality, kept by a trigger) and ``course_weights`` through
+        PostgREST resource embedding, so the payload doesn't grow with the
+        cut score history.
+
+        Args:
+            code: SISU course code
+            years: Only include these years (default: all)
+            course_id: Look up by database id instead of code
+
+        Returns:
+            Course dict with ``latest_cut_scores`` (newest year first) and
+            ``course_weights`` lists, or None if the course doesn't exist
+        """
+        params = {
+            "select": "*,latest_cut_scores(*),course_weights(*)",
+            "latest_cut_scores.order": "year.desc,modality_code",
+            "course_weights.order": "year.desc",
+        }
+        if course_id is not None:
+            params["id"] = f"eq.{course_id}"
+        else:
+            params["code"] = f"eq.{code}"
+        if years:
+            year_filter = f"in.({','.join(str(y) for y in years)})"
+            params["latest_cut_scores.year"] = year_filter
+            params["course_weights.year"] = year_filter
+
+        results = self._get("courses", params=params)
+        return results[0] if results else None
+
+    def get_course_for_students(self, code: int) -> Optional[dict]:
+        """Get a course and the latest year with approved students, in one request.
+
+        Returns:
+            Course dict with ``latest_year`` (None without approved
+            students), or None if the course doesn't exist
+        """
+        results = self._get("courses", params={
+            "code": f"eq.{code}",
+            "select": "*,approved_students(year)",
+            "approved_students.order": "year.desc",
+            "approved_students.limit": 1,
+        })
+        if not results:
+            return None
+        course = results[0]
+        latest = course.pop("approved_students", None) or []
+        course["latest_year"] = latest[0]["year"] if latest else None
+        return course
+
+    def get_approved_students_page(
+        self,
+        course_id: int,
+        year: Optional[int] = None,
+        modality_code: Optional[int] = None,
+        call_number: Optional[int] = None,
+        after: Optional[tuple] = None,
+        limit: int = 50,
+        offset: Optional[int] = None,
+        count: str = "exact",
+    ) -> tuple[list[dict], Optional[int]]:
+        """One page of a course's approved students, with the total count.
+
+        Rows are ordered by (rank, modality_code, call_number). Paging with
+        ``after`` filters on that key instead of skipping ``offset`` rows,
+        so deep pages cost the same as the first.
+
+        Args:
+            after: Last row of the previous page: (rank,) when modality and
+                call number are fixed, else (rank, modality_code, call_number)
+            offset: Legacy offset paging (ignored when ``after`` is given)
+            count: PostgREST count mode for the total
+
+        Returns:
+            (students, total)
+        """
+        params = {
+            "course_id": f"eq.{course_id}",
+            "order": "rank.asc,modality_code.asc,call_number.asc",
+            "limit": limit,
+        }
+        if year is not None:
+            params["year"] = f"eq.{year}"
+        if modality_code is not None:
+            params["modality_code"] = f"eq.{modality_code}"
+        if call_number is not None:
+            params["call_number"] = f"eq.{call_number}"
+
+        if after is not None and len(after) == 1:
+            params["rank"] = f"gt.{after[0]}"
+        elif after is not None:
+            rank, modality, call = after
+            params["or"] = (
+                f"(rank.gt.{rank},"
+                f"and(rank.eq.{rank},modality_code.gt.{modality}),"
+                f"and(rank.eq.{rank},modality_code.eq.{modality},call_number.gt.{call}))"
+            )
+        elif offset:
+            params["offset"] = offset
+
+        return self._get_with_count("approved_students", params=params, count=count)
+
+    def get_course_approved(self, code: int) -> Optional[dict]:
+        """Get a course with every approved student, in one request.
+
+        Returns:
+            Course dict (id, code, name, university) with an
+            ``approved_students`` list, or None if the course doesn't exist
+        """
+        results = self._get("courses", params={
+            "code": f"eq.{code}",
+            "select": "id,code,name,university,"
+                      "approved_students(year,modality_code,call_number,rank,name,score,bonus)",
+        })
+        return results[0] if results else None
+
     def upsert_course(self, course_data: dict) -> dict:
-        """Insert or update a course"""
+        """Insert or update a course (no request when nothing changed)"""
         existing = self.get_course_by_code(course_data["code"])
+        if existing and _matches(existing, course_data):
+            return existing
         if existing:
             # Update
             resp = self._request(
@@ -102,12 +325,27 @@ class SupabaseClient:
             return self._post("courses", course_data)
 
     def search_courses(self, query: str, limit: int = 20) -> list[dict]:
-        """Search courses by name, university, or city"""
-        # Use ilike for case-insensitive search
+        """Search courses by name, university, or city.
+
+        Uses the ranked, accent-insensitive search_courses() RPC (trigram
+        index); falls back to ILIKE on databases without that migration.
+        """
+        try:
+            return self._rpc("search_courses", {"q": query, "max_results": limit})
+        except requests.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+            logger.debug("search_courses RPC not available, using ilike")
+
+        # % and _ typed by the user match literally; the value is quoted so
+        # commas and parentheses don't break the or=() filter
+        escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        quoted = '"%' + escaped.replace('\\', '\\\\').replace('"', '\\"') + '%"'
         return self._get(
             "courses",
             params={
-                "or": f"(name.ilike.%{query}%,university.ilike.%{query}%,city.ilike.%{query}%)",
+                "select": COURSE_COLUMNS,
+                "or": f"(name.ilike.{quoted},university.ilike.{quoted},city.ilike.{quoted})",
                 "limit": limit
             }
         )
@@ -141,6 +379,8 @@ class SupabaseClient:
             params={"course_id": f"eq.{course_id}", "year": f"eq.{year}"}
         )
 
+        if existing and _matches(existing[0], data):
+            return existing[0]
         if existing:
             resp = self._request(
                 "PATCH",
@@ -173,16 +413,47 @@ class SupabaseClient:
             "applicants": modality.get("applicants"),
             "vacancies": modality.get("vacancies"),
         }
+        if "partial_scores" in modality:
+            data["partial_scores"] = modality["partial_scores"]
         return self._post("cut_scores", data)
 
+    def insert_cut_score_if_changed(self, course_id: int, year: int, modality: dict) -> Optional[dict]:
+        """Insert a cut score only if it differs from the last stored value.
+
+        Fingerprints for a course/year are seeded from the database on first
+        use, so restarts don't re-insert rows that are already current.
+
+        Returns:
+            Created record, or None if the modality was unchanged
+        """
+        if not self.fingerprints.is_loaded(course_id, year):
+            self.fingerprints.load(course_id, year, self.get_latest_cut_scores(course_id, year))
+
+        if not self.fingerprints.has_changed(course_id, year, modality):
+            return None
+
+        record = self.insert_cut_score(course_id, year, modality)
+        self.fingerprints.remember(course_id, year, modality)
+        return record
+
     def get_latest_cut_scores(self, course_id: int, year: int) -> list[dict]:
-        """Get latest cut scores for a course/year"""
+        """Get latest cut scores for a course/year (one row per modality)"""
         return self._get(
-            "cut_scores",
+            "latest_cut_scores",
             params={
                 "course_id": f"eq.{course_id}",
                 "year": f"eq.{year}",
-                "order": "modality_code,captured_at.desc"
+                "order": "modality_code"
+            }
+        )
+
+    def get_course_latest_cut_scores(self, course_id: int) -> list[dict]:
+        """Get latest cut scores of every year/modality for a course"""
+        return self._get(
+            "latest_cut_scores",
+            params={
+                "course_id": f"eq.{course_id}",
+                "order": "year.desc,modality_code"
             }
         )
 
@@ -198,6 +469,36 @@ class SupabaseClient:
             }
         )
 
+    def iter_cut_score_rows(self, year: Optional[int] = None, page: int = 1000) -> Iterator[dict]:
+        """Stream every cut score joined with its course, in id order"""
+        select = ("id,course_id,year,modality_code,modality_name,cut_score,applicants,"
+                  "vacancies,captured_at,courses(code,name,university,city,state)")
+        params = {"year": f"eq.{year}"} if year is not None else None
+        for row in self.iter_table("cut_scores", select=select, page=page, params=params):
+            course = row.pop("courses", None) or {}
+            row["course_code"] = course.get("code")
+            row["course_name"] = course.get("name")
+            row["university"] = course.get("university")
+            row["city"] = course.get("city")
+            row["state"] = course.get("state")
+            yield row
+
+    def iter_changed_rows(self, table: str, column: str = "id", since: Optional[Any] = None,
+                          page: int = 1000) -> Iterator[dict]:
+        """Stream rows added or updated after a watermark.
+
+        Args:
+            table: Table name
+            column: "id" for append-only tables, "updated_at" for tables
+                updated in place
+            since: Watermark (exclusive); None streams the whole table
+            page: Rows per request
+        """
+        if column == "id":
+            return self.iter_table(table, page=page, after=since)
+        params = {column: f"gt.{since}"} if since is not None else None
+        return self.iter_table(table, page=page, params=params)
+
     # Bulk operations
     def save_course_data(self, course_code: int, data: dict) -> int:
         """Save complete course data from JSON to database"""
@@ -229,10 +530,30 @@ class SupabaseClient:
                 self.upsert_weights(course_id, year, weights, minimums)
 
             for modality in year_data.get("modalities", []):
-                self.insert_cut_score(course_id, year, modality)
+                self.insert_cut_score_if_changed(course_id, year, modality)
 
         return course_id
 
+    def compact_cut_scores(self) -> int:
+        """Delete cut_scores rows that repeat the previous value of their modality.
+
+        Returns:
+            Number of rows removed
+        """
+        return self._rpc("compact_cut_scores")
+
+    def ensure_cut_scores_partition(self, year: int) -> str:
+        """Create the cut_scores partition for a SISU year if missing"""
+        return self._rpc("create_cut_scores_partition", {"p_year": year})
+
+    def downsample_cut_scores(self, year: int) -> int:
+        """Reduce a closed year to one snapshot per course/modality/day.
+
+        Returns:
+            Number of rows removed
+        """
+        return self._rpc("downsample_cut_scores", {"p_year": year})
+
     def test_connection(self) -> bool:
         """Test database connection"""
         try:
@@ -0,0 +1,48 @@
+-- Compactação do histórico de cut_scores
+-- Remove linhas que repetem o valor anterior da mesma modalidade
+-- (mesma nota, inscritos, vagas e notas parciais), mantendo apenas as
+-- mudanças reais.
+
+-- Coluna já gravada pelos scripts de sincronização
+ALTER TABLE cut_scores ADD COLUMN IF NOT EXISTS partial_scores JSONB;
+
+CREATE INDEX IF NOT EXISTS idx_cut_scores_modality_history
+    ON cut_scores(course_id, year, modality_code, captured_at DESC);
+
+CREATE OR REPLACE FUNCTION compact_cut_scores()
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    removed INTEGER;
+BEGIN
+    WITH ordered AS (
+        SELECT
+            id,
+            LAG(id) OVER w IS NOT NULL
+                AND cut_score IS NOT DISTINCT FROM LAG(cut_score) OVER w
+                AND applicants IS NOT DISTINCT FROM LAG(applicants) OVER w
+                AND vacancies IS NOT DISTINCT FROM LAG(vacancies) OVER w
+                AND partial_scores IS NOT DISTINCT FROM LAG(partial_scores) OVER w
+                AS redundant
+        FROM cut_scores
+        WINDOW w AS (
+            PARTITION BY course_id, year, COALESCE(modality_code::TEXT, modality_name)
+            ORDER BY captured_at, id
+        )
+    )
+    DELETE FROM cut_scores c
+    USING ordered o
+    WHERE c.id = o.id AND o.redundant;
+
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    RETURN removed;
+END;
+$$;
+
+COMMENT ON FUNCTION compact_cut_scores() IS 'Remove snapshots de cut_scores sem mudança em relação ao anterior';
+
+REVOKE ALL ON FUNCTION compact_cut_scores() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION compact_cut_scores() TO service_role;
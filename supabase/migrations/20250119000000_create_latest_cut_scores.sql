@@ -0,0 +1,135 @@
+-- Tabela latest_cut_scores - última nota de corte por curso/ano/modalidade
+-- Mantida por trigger a cada INSERT/UPDATE/DELETE em cut_scores, para que
+-- as consultas de detalhe leiam O(modalidades) linhas em vez do histórico.
+
+-- Coluna já gravada pelos scripts de sincronização
+ALTER TABLE cut_scores ADD COLUMN IF NOT EXISTS partial_scores JSONB;
+
+CREATE TABLE IF NOT EXISTS latest_cut_scores (
+    course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    modality_key TEXT NOT NULL,
+    modality_code INTEGER,
+    modality_name TEXT NOT NULL,
+    cut_score NUMERIC(8,2),
+    applicants INTEGER,
+    vacancies INTEGER,
+    partial_scores JSONB,
+    id INTEGER NOT NULL,
+    captured_at TIMESTAMPTZ NOT NULL,
+    PRIMARY KEY (course_id, year, modality_key)
+);
+
+COMMENT ON TABLE latest_cut_scores IS 'Última nota de corte de cada modalidade (mantida por trigger sobre cut_scores)';
+COMMENT ON COLUMN latest_cut_scores.modality_key IS 'modality_code, ou modality_name quando o código é nulo';
+COMMENT ON COLUMN latest_cut_scores.id IS 'id da linha de origem em cut_scores';
+
+CREATE INDEX IF NOT EXISTS idx_latest_cut_scores_id ON latest_cut_scores(id);
+
+CREATE OR REPLACE FUNCTION refresh_latest_cut_score()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    INSERT INTO latest_cut_scores (
+        course_id, year, modality_key, modality_code, modality_name,
+        cut_score, applicants, vacancies, partial_scores, id, captured_at
+    )
+    VALUES (
+        NEW.course_id, NEW.year, COALESCE(NEW.modality_code::TEXT, NEW.modality_name),
+        NEW.modality_code, NEW.modality_name, NEW.cut_score, NEW.applicants,
+        NEW.vacancies, NEW.partial_scores, NEW.id, COALESCE(NEW.captured_at, NOW())
+    )
+    ON CONFLICT (course_id, year, modality_key) DO UPDATE SET
+        modality_code = EXCLUDED.modality_code,
+        modality_name = EXCLUDED.modality_name,
+        cut_score = EXCLUDED.cut_score,
+        applicants = EXCLUDED.applicants,
+        vacancies = EXCLUDED.vacancies,
+        partial_scores = EXCLUDED.partial_scores,
+        id = EXCLUDED.id,
+        captured_at = EXCLUDED.captured_at
+    WHERE latest_cut_scores.captured_at <= EXCLUDED.captured_at;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_refresh_latest_cut_score ON cut_scores;
+CREATE TRIGGER trg_refresh_latest_cut_score
+    AFTER INSERT OR UPDATE ON cut_scores
+    FOR EACH ROW EXECUTE FUNCTION refresh_latest_cut_score();
+
+-- Linhas removidas (compact_cut_scores, downsample_cut_scores): se a linha
+-- era a mais recente da modalidade, aponta para a mais recente que restou.
+-- Triggers AFTER ROW rodam ao fim do comando, quando todas as linhas do
+-- DELETE já foram removidas.
+CREATE OR REPLACE FUNCTION drop_latest_cut_score()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_key TEXT := COALESCE(OLD.modality_code::TEXT, OLD.modality_name);
+BEGIN
+    DELETE FROM latest_cut_scores
+    WHERE course_id = OLD.course_id
+      AND year = OLD.year
+      AND modality_key = v_key
+      AND id = OLD.id;
+
+    IF NOT FOUND THEN
+        RETURN NULL;  -- não era a linha mais recente
+    END IF;
+
+    INSERT INTO latest_cut_scores (
+        course_id, year, modality_key, modality_code, modality_name,
+        cut_score, applicants, vacancies, partial_scores, id, captured_at
+    )
+    SELECT
+        course_id, year, v_key, modality_code, modality_name, cut_score,
+        applicants, vacancies, partial_scores, id, COALESCE(captured_at, NOW())
+    FROM cut_scores
+    WHERE course_id = OLD.course_id
+      AND year = OLD.year
+      AND COALESCE(modality_code::TEXT, modality_name) = v_key
+    ORDER BY captured_at DESC, id DESC
+    LIMIT 1
+    ON CONFLICT (course_id, year, modality_key) DO NOTHING;
+
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_drop_latest_cut_score ON cut_scores;
+CREATE TRIGGER trg_drop_latest_cut_score
+    AFTER DELETE ON cut_scores
+    FOR EACH ROW EXECUTE FUNCTION drop_latest_cut_score();
+
+-- Carga inicial a partir do histórico existente
+INSERT INTO latest_cut_scores (
+    course_id, year, modality_key, modality_code, modality_name,
+    cut_score, applicants, vacancies, partial_scores, id, captured_at
+)
+SELECT DISTINCT ON (course_id, year, COALESCE(modality_code::TEXT, modality_name))
+    course_id, year, COALESCE(modality_code::TEXT, modality_name),
+    modality_code, modality_name, cut_score, applicants, vacancies,
+    partial_scores, id, COALESCE(captured_at, NOW())
+FROM cut_scores
+ORDER BY course_id, year, COALESCE(modality_code::TEXT, modality_name), captured_at DESC, id DESC
+ON CONFLICT (course_id, year, modality_key) DO NOTHING;
+
+-- RLS: leitura pública, escrita apenas service_role
+ALTER TABLE latest_cut_scores ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Public read latest_cut_scores" ON latest_cut_scores;
+CREATE POLICY "Public read latest_cut_scores" ON latest_cut_scores FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Service write latest_cut_scores" ON latest_cut_scores;
+CREATE POLICY "Service write latest_cut_scores" ON latest_cut_scores
+    FOR ALL
+    USING (auth.role() = 'service_role')
+    WITH CHECK (auth.role() = 'service_role');
@@ -0,0 +1,152 @@
+-- Particionamento de cut_scores por ano do SISU
+-- Converte cut_scores em tabela particionada por LIST(year), com uma
+-- partição por edição e uma partição DEFAULT. Edições encerradas podem ser
+-- reduzidas a um snapshot por (curso, modalidade, dia) com
+-- downsample_cut_scores(ano); a edição corrente mantém resolução total.
+
+-- 1. Preservar a tabela atual e sua sequência de ids
+ALTER TABLE cut_scores RENAME TO cut_scores_legacy;
+ALTER SEQUENCE cut_scores_id_seq OWNED BY NONE;
+DROP TRIGGER IF EXISTS trg_refresh_latest_cut_score ON cut_scores_legacy;
+DROP TRIGGER IF EXISTS trg_drop_latest_cut_score ON cut_scores_legacy;
+
+-- 2. Tabela particionada (a chave primária precisa incluir a coluna de partição)
+CREATE TABLE cut_scores (
+    id INTEGER NOT NULL DEFAULT nextval('cut_scores_id_seq'),
+    course_id INTEGER NOT NULL REFERENCES courses(id) ON DELETE CASCADE,
+    year INTEGER NOT NULL,
+    modality_code INTEGER,
+    modality_name TEXT NOT NULL,
+    cut_score NUMERIC(8,2),
+    applicants INTEGER,
+    vacancies INTEGER,
+    partial_scores JSONB,
+    captured_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (id, year)
+) PARTITION BY LIST (year);
+
+ALTER SEQUENCE cut_scores_id_seq OWNED BY cut_scores.id;
+
+COMMENT ON TABLE cut_scores IS 'Histórico de notas de corte por modalidade (particionado por ano)';
+
+CREATE TABLE IF NOT EXISTS cut_scores_default PARTITION OF cut_scores DEFAULT;
+ALTER TABLE cut_scores_default ENABLE ROW LEVEL SECURITY;
+
+-- 3. Criação de partição por edição (move linhas que estejam na DEFAULT)
+CREATE OR REPLACE FUNCTION create_cut_scores_partition(p_year INTEGER)
+RETURNS TEXT
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    part TEXT := format('cut_scores_%s', p_year);
+BEGIN
+    IF to_regclass(part) IS NOT NULL THEN
+        RETURN part;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I (LIKE cut_scores INCLUDING DEFAULTS)', part);
+    EXECUTE format('INSERT INTO %I SELECT * FROM cut_scores_default WHERE year = %s', part, p_year);
+    DELETE FROM cut_scores_default WHERE year = p_year;
+    EXECUTE format('ALTER TABLE cut_scores ATTACH PARTITION %I FOR VALUES IN (%s)', part, p_year);
+    EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', part);
+
+    RETURN part;
+END;
+$$;
+
+COMMENT ON FUNCTION create_cut_scores_partition(INTEGER) IS 'Cria (se necessário) a partição de cut_scores de um ano';
+
+DO $$
+DECLARE
+    y INTEGER;
+BEGIN
+    FOR y IN
+        SELECT DISTINCT year FROM cut_scores_legacy
+        UNION SELECT generate_series(2024, 2026)
+    LOOP
+        PERFORM create_cut_scores_partition(y);
+    END LOOP;
+END;
+$$;
+
+-- 4. Copiar histórico e remover a tabela antiga
+INSERT INTO cut_scores (
+    id, course_id, year, modality_code, modality_name,
+    cut_score, applicants, vacancies, partial_scores, captured_at
+)
+SELECT
+    id, course_id, year, modality_code, modality_name,
+    cut_score, applicants, vacancies, partial_scores, captured_at
+FROM cut_scores_legacy;
+
+DROP TABLE cut_scores_legacy;
+
+-- 5. Índices (criados em cada partição)
+CREATE INDEX IF NOT EXISTS idx_cut_scores_course_year ON cut_scores(course_id, year);
+CREATE INDEX IF NOT EXISTS idx_cut_scores_modality ON cut_scores(modality_code);
+CREATE INDEX IF NOT EXISTS idx_cut_scores_captured ON cut_scores(captured_at);
+CREATE INDEX IF NOT EXISTS idx_cut_scores_modality_history
+    ON cut_scores(course_id, year, modality_code, captured_at DESC);
+
+-- 6. Triggers de latest_cut_scores
+CREATE TRIGGER trg_refresh_latest_cut_score
+    AFTER INSERT OR UPDATE ON cut_scores
+    FOR EACH ROW EXECUTE FUNCTION refresh_latest_cut_score();
+
+CREATE TRIGGER trg_drop_latest_cut_score
+    AFTER DELETE ON cut_scores
+    FOR EACH ROW EXECUTE FUNCTION drop_latest_cut_score();
+
+-- 7. RLS
+ALTER TABLE cut_scores ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "Public read cut_scores" ON cut_scores;
+CREATE POLICY "Public read cut_scores" ON cut_scores FOR SELECT USING (true);
+
+DROP POLICY IF EXISTS "Service write cut_scores" ON cut_scores;
+CREATE POLICY "Service write cut_scores" ON cut_scores
+    FOR ALL
+    USING (auth.role() = 'service_role')
+    WITH CHECK (auth.role() = 'service_role');
+
+-- 8. Downsampling de edições encerradas: mantém o último snapshot de cada
+--    (curso, modalidade, dia), o que preserva também a linha mais recente
+CREATE OR REPLACE FUNCTION downsample_cut_scores(p_year INTEGER)
+RETURNS INTEGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    removed INTEGER;
+BEGIN
+    WITH ranked AS (
+        SELECT
+            id,
+            ROW_NUMBER() OVER (
+                PARTITION BY
+                    course_id,
+                    COALESCE(modality_code::TEXT, modality_name),
+                    (captured_at AT TIME ZONE 'America/Sao_Paulo')::DATE
+                ORDER BY captured_at DESC, id DESC
+            ) AS rn
+        FROM cut_scores
+        WHERE year = p_year
+    )
+    DELETE FROM cut_scores c
+    USING ranked r
+    WHERE c.year = p_year AND c.id = r.id AND r.rn > 1;
+
+    GET DIAGNOSTICS removed = ROW_COUNT;
+    RETURN removed;
+END;
+$$;
+
+COMMENT ON FUNCTION downsample_cut_scores(INTEGER) IS 'Reduz uma edição a um snapshot por curso/modalidade/dia';
+
+REVOKE ALL ON FUNCTION create_cut_scores_partition(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION create_cut_scores_partition(INTEGER) TO service_role;
+REVOKE ALL ON FUNCTION downsample_cut_scores(INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION downsample_cut_scores(INTEGER) TO service_role;
@@ -0,0 +1,83 @@
+-- Busca de cursos sem acento e com índice trigram
+-- A busca com ILIKE '%q%' não usa os índices btree de courses; aqui uma
+-- coluna normalizada (minúscula, sem acento) recebe um índice GIN pg_trgm
+-- e a função search_courses() devolve os cursos ordenados por relevância.
+
+CREATE EXTENSION IF NOT EXISTS unaccent WITH SCHEMA extensions;
+CREATE EXTENSION IF NOT EXISTS pg_trgm WITH SCHEMA extensions;
+
+-- unaccent() é STABLE; o wrapper com dicionário explícito pode ser IMMUTABLE
+CREATE OR REPLACE FUNCTION immutable_unaccent(value TEXT)
+RETURNS TEXT
+LANGUAGE sql
+IMMUTABLE
+PARALLEL SAFE
+STRICT
+AS $$
+    SELECT extensions.unaccent('extensions.unaccent'::regdictionary, value)
+$$;
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS search_text TEXT
+    GENERATED ALWAYS AS (
+        lower(immutable_unaccent(
+            coalesce(name, '') || ' ' || coalesce(university, '') || ' ' || coalesce(city, '')
+        ))
+    ) STORED;
+
+COMMENT ON COLUMN courses.search_text IS 'Nome, universidade e cidade em minúsculas e sem acento (busca)';
+
+CREATE INDEX IF NOT EXISTS idx_courses_search_trgm
+    ON courses USING gin (search_text extensions.gin_trgm_ops);
+
+-- Busca ordenada: todas as palavras presentes (na ordem) primeiro, depois
+-- similaridade por palavra (tolera erros de digitação). % e _ digitados são
+-- escapados e casam literalmente. Devolve as colunas públicas de courses
+-- (sem search_text nem updated_at).
+DROP FUNCTION IF EXISTS search_courses(TEXT, INTEGER);
+CREATE FUNCTION search_courses(q TEXT, max_results INTEGER DEFAULT 20)
+RETURNS TABLE (
+    id INTEGER,
+    code INTEGER,
+    name TEXT,
+    university TEXT,
+    campus TEXT,
+    city TEXT,
+    state VARCHAR(2),
+    degree TEXT,
+    schedule TEXT,
+    latitude TEXT,
+    longitude TEXT,
+    created_at TIMESTAMPTZ
+)
+LANGUAGE sql
+STABLE
+SET search_path = public, extensions
+AS $$
+    WITH query AS (
+        SELECT
+            norm,
+            replace(replace(replace(norm, '\', '\\'), '%', '\%'), '_', '\_') AS escaped
+        FROM (SELECT lower(immutable_unaccent(trim(q))) AS norm) n
+    ), patterns AS (
+        SELECT
+            norm,
+            escaped,
+            '%' || array_to_string(regexp_split_to_array(escaped, '\s+'), '%') || '%' AS pattern
+        FROM query
+    )
+    SELECT c.id, c.code, c.name, c.university, c.campus, c.city, c.state,
+           c.degree, c.schedule, c.latitude, c.longitude, c.created_at
+    FROM courses c, patterns p
+    WHERE c.search_text LIKE p.pattern
+       OR p.norm <% c.search_text
+    ORDER BY
+        (c.search_text LIKE p.pattern) DESC,
+        (lower(immutable_unaccent(c.name)) LIKE p.escaped || '%') DESC,
+        word_similarity(p.norm, c.search_text) DESC,
+        c.name
+    LIMIT max_results
+$$;
+
+COMMENT ON FUNCTION search_courses(TEXT, INTEGER) IS 'Busca de cursos por nome, universidade ou cidade (sem acento, ordenada por relevância)';
+
+GRANT EXECUTE ON FUNCTION search_courses(TEXT, INTEGER) TO anon, authenticated, service_role;
@@ -0,0 +1,46 @@
+-- Coluna updated_at nas tabelas atualizadas no lugar (upsert)
+-- Usada pelas exportações incrementais (deltas) como marca d'água.
+-- cut_scores é append-only e usa o próprio id.
+
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SET search_path = public
+AS $$
+BEGIN
+    -- Os writers regravam linhas inteiras a cada sync: um UPDATE que não
+    -- muda nada mantém o updated_at anterior e não move a marca d'água.
+    -- A comparação é feita em jsonb para ignorar colunas geradas
+    -- (courses.search_text ainda não foi calculada no BEFORE UPDATE).
+    IF (to_jsonb(NEW) - 'updated_at' - 'search_text')
+       = (to_jsonb(OLD) - 'updated_at' - 'search_text') THEN
+        NEW.updated_at = OLD.updated_at;
+    ELSE
+        NEW.updated_at = NOW();
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+ALTER TABLE courses ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+ALTER TABLE course_weights ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+ALTER TABLE approved_students ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS idx_courses_updated_at ON courses(updated_at);
+CREATE INDEX IF NOT EXISTS idx_course_weights_updated_at ON course_weights(updated_at);
+CREATE INDEX IF NOT EXISTS idx_approved_students_updated_at ON approved_students(updated_at);
+
+DROP TRIGGER IF EXISTS trg_courses_updated_at ON courses;
+CREATE TRIGGER trg_courses_updated_at
+    BEFORE UPDATE ON courses
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_course_weights_updated_at ON course_weights;
+CREATE TRIGGER trg_course_weights_updated_at
+    BEFORE UPDATE ON course_weights
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS trg_approved_students_updated_at ON approved_students;
+CREATE TRIGGER trg_approved_students_updated_at
+    BEFORE UPDATE ON approved_students
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
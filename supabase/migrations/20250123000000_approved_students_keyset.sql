@@ -0,0 +1,8 @@
+-- Índice para a paginação por cursor (keyset) da lista de aprovados
+-- A API ordena por (rank, modality_code, call_number) dentro de um
+-- curso/ano e filtra "depois do último visto"; com este índice páginas
+-- profundas custam o mesmo que a primeira, e a contagem (Prefer: count)
+-- do filtro curso/ano é resolvida pelo índice.
+
+CREATE INDEX IF NOT EXISTS idx_approved_students_keyset
+    ON approved_students(course_id, year, rank, modality_code, call_number);
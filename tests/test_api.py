@@ -0,0 +1,497 @@
+"""Tests for API helpers"""
+import json
+import pytest
+
+
+COURSES = [
+    {'id': 1, 'code': 37, 'name': 'Medicina', 'state': 'MA', 'city': 'São Luís',
+     'university': 'UFMA', 'degree': 'Bacharelado', 'schedule': 'Integral'},
+    {'id': 2, 'code': 38, 'name': 'Direito', 'state': 'MA', 'city': 'São Luís',
+     'university': 'UFMA', 'degree': 'Bacharelado', 'schedule': 'Noturno'},
+    {'id': 3, 'code': 40, 'name': 'Letras', 'state': 'MA', 'city': 'Imperatriz',
+     'university': 'UEMASUL', 'degree': 'Licenciatura', 'schedule': 'Noturno'},
+    {'id': 4, 'code': 50, 'name': 'Medicina', 'state': 'PI', 'city': 'Teresina',
+     'university': 'UFPI', 'degree': 'Bacharelado', 'schedule': 'Integral'},
+]
+
+
+class TestFacetIndex:
+    """Tests for the in-memory /api/filters index"""
+
+    def test_filters_by_level(self):
+        """Test each selection level with case-insensitive keys"""
+        from src.api.facets import FacetIndex
+
+        index = FacetIndex(lambda: iter(COURSES))
+
+        initial = index.filters()
+        assert initial['states'] == ['MA', 'PI']
+        assert initial['cities'] == ['Imperatriz-MA', 'São Luís-MA', 'Teresina-PI']
+        assert initial['universities'] == ['UEMASUL', 'UFMA', 'UFPI']
+
+        assert index.filters(state='ma')['cities'] == ['Imperatriz', 'São Luís']
+        assert index.filters(state='MA', city='SÃO LUÍS')['universities'] == ['UFMA']
+
+        courses = index.filters(state='MA', city='São Luís', university='ufma')['courses']
+        assert [c['code'] for c in courses] == [37, 38]
+        assert set(courses[0]) == {'id', 'code', 'name', 'degree', 'schedule'}
+        assert index.filters(state='SP')['cities'] == []
+
+    def test_university_without_state(self):
+        """Test universities of courses with no state stay in the top-level list"""
+        from src.api.facets import FacetIndex
+
+        index = FacetIndex(lambda: iter([
+            {'id': 9, 'code': 90, 'state': None, 'city': None, 'university': 'UNIV-SEM-UF'},
+            COURSES[0],
+        ]))
+        initial = index.filters()
+        assert initial['universities'] == ['UFMA', 'UNIV-SEM-UF']
+        assert initial['states'] == ['MA']
+
+    def test_rebuilds_on_version_change(self):
+        """Test a new change token triggers a rebuild"""
+        from src.api.facets import FacetIndex
+
+        data = list(COURSES[:1])
+        token = {'value': 1}
+        index = FacetIndex(lambda: iter(data), version=lambda: token['value'])
+
+        assert index.filters()['states'] == ['MA']
+        assert not index._stale()
+
+        data.append(COURSES[3])
+        token['value'] = 2
+        assert index._stale()
+        index.refresh()
+        assert index.filters()['states'] == ['MA', 'PI']
+
+
+class TestCoursesVersion:
+    """Tests for the facet index change signal"""
+
+    def test_noop_upsert_keeps_version(self, monkeypatch):
+        """Test re-saving an unchanged course doesn't bump the version"""
+        import requests
+        from src.api import main
+        from src.storage.supabase_client import SupabaseClient
+
+        # courses table behind PostgREST, with the set_updated_at() trigger
+        table = {37: {'id': 1, 'code': 37, 'name': 'Medicina', 'university': 'UFMA',
+                      'updated_at': '2026-01-16T10:00:00+00:00'}}
+        clock = iter(f'2026-01-17T10:00:0{i}+00:00' for i in range(10))
+
+        def fake_request(method, endpoint, params=None, **kwargs):
+            if method == 'PATCH':
+                data = kwargs['json']
+                row = table[int(endpoint.rpartition('.')[2])]
+                changed = any(row.get(k) != v for k, v in data.items())
+                row.update(data, **({'updated_at': next(clock)} if changed else {}))
+                body = [row]
+            elif 'code' in params:
+                body = [dict(table[int(params['code'][3:])])]
+            else:
+                body = [{'updated_at': max(r['updated_at'] for r in table.values())}]
+            response = requests.Response()
+            response.status_code = 200
+            response.headers['Content-Range'] = f'0-0/{len(table)}'
+            response._content = json.dumps(body).encode()
+            return response
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        monkeypatch.setattr(client, "_request", fake_request)
+        monkeypatch.setattr(main, "supabase", client)
+
+        before = main._courses_version()
+        assert before == ('2026-01-16T10:00:00+00:00', 1)
+
+        client.upsert_course({'code': 37, 'name': 'Medicina', 'university': 'UFMA'})
+        assert main._courses_version() == before
+
+        client.upsert_course({'code': 37, 'name': 'Medicina (Integral)', 'university': 'UFMA'})
+        assert main._courses_version() != before
+
+
+class FakeSupabase:
+    """Minimal stand-in for SupabaseClient in endpoint tests"""
+
+    def __init__(self):
+        self.calls = 0
+        self.page_calls = []
+
+    def get_course_by_code(self, code):
+        self.calls += 1
+        return {'id': 1, 'code': code, 'name': 'Medicina'} if code == 37 else None
+
+    def get_course_detail(self, code=None, years=None, course_id=None):
+        if course_id is not None:
+            code = 37 if course_id == 1 else None
+        course = self.get_course_by_code(code)
+        if course:
+            course['latest_cut_scores'] = [
+                {'year': 2025, 'modality_name': 'AMPLA', 'cut_score': 780.5},
+                {'year': 2024, 'modality_name': 'AMPLA', 'cut_score': 770.0},
+            ]
+            course['course_weights'] = [
+                {'year': 2024, 'peso_red': 2}, {'year': 2025, 'peso_red': 3},
+            ]
+        return course
+
+    def get_course_for_students(self, code):
+        course = self.get_course_by_code(code)
+        if course:
+            course['latest_year'] = 2025
+        return course
+
+    def get_approved_students_page(self, course_id, year=None, modality_code=None,
+                                   call_number=None, after=None, limit=50, offset=None,
+                                   count="exact"):
+        rows = [{'year': 2025, 'rank': r, 'modality_code': m, 'call_number': 1}
+                for r in (1, 2) for m in (7, 41)]
+        if after:
+            rows = [r for r in rows if (r['rank'], r['modality_code'], r['call_number']) > after]
+        self.page_calls.append({'year': year, 'after': after, 'offset': offset})
+        return rows[:limit], len(rows)
+
+    def test_connection(self):
+        return True
+
+
+class TestResponseCache:
+    """Tests for the TTL+LRU response cache"""
+
+    def test_lru_ttl_and_tags(self, monkeypatch):
+        """Test eviction order, expiry and tag invalidation"""
+        from src.api import cache as cache_module
+        from src.api.cache import ResponseCache
+
+        now = {'t': 100.0}
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now['t'])
+
+        cache = ResponseCache(maxsize=2)
+        cache.set('a', b'1', ttl=10, tags=['course:1'])
+        cache.set('b', b'2', ttl=10, tags=['course:2'])
+        assert cache.get('a').body == b'1'
+        cache.set('c', b'3', ttl=10)
+        assert cache.get('b') is None  # least recently used
+
+        assert cache.invalidate(['course:1']) == 1
+        assert cache.get('a') is None
+
+        now['t'] = 111.0
+        assert cache.get('c') is None
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 3, 1)
+
+    def test_course_detail_etag(self, monkeypatch):
+        """Test repeated requests hit the cache and honour If-None-Match"""
+        from fastapi.testclient import TestClient
+        import src.api.main as main
+
+        fake = FakeSupabase()
+        monkeypatch.setattr(main, "supabase", fake)
+        monkeypatch.setattr(main, "response_cache", main.ResponseCache())
+        client = TestClient(main.app)
+
+        first = client.get('/api/courses/37')
+        assert first.status_code == 200
+        body = first.json()
+        assert [y['year'] for y in body['cut_scores']] == [2024, 2025]
+        assert body['weights']['year'] == 2025 and body['weights']['pesos']['redacao'] == 3
+        assert 'latest_cut_scores' not in body['course']
+        etag = first.headers['etag']
+
+        assert client.get('/api/courses/37').content == first.content
+        not_modified = client.get('/api/courses/37', headers={'If-None-Match': etag})
+        assert not_modified.status_code == 304
+        assert fake.calls == 1
+
+        assert client.get('/api/courses/99').status_code == 404
+        assert main.response_cache.stats()['hits'] == 2
+
+    def test_lookup_by_id_and_code_share_builder(self, monkeypatch):
+        """Test ?id= and ?code= return the same merged payload"""
+        from fastapi.testclient import TestClient
+        import src.api.main as main
+
+        monkeypatch.setattr(main, "supabase", FakeSupabase())
+        monkeypatch.setattr(main, "response_cache", main.ResponseCache())
+        client = TestClient(main.app)
+
+        by_id = client.get('/api/courses', params={'id': 1}).json()
+        by_code = client.get('/api/courses', params={'code': 37}).json()
+        assert by_id == by_code
+        assert by_id['code'] == 37 and len(by_id['cut_scores']) == 2
+        assert 'latest_cut_scores' not in by_id
+        assert client.get('/api/courses', params={'code': 99}).status_code == 404
+
+    def test_invalidate_requires_token(self, monkeypatch):
+        """Test the invalidation hook is protected and drops tagged entries"""
+        from fastapi.testclient import TestClient
+        import src.api.main as main
+
+        monkeypatch.setattr(main, "supabase", FakeSupabase())
+        monkeypatch.setattr(main, "response_cache", main.ResponseCache())
+        monkeypatch.setenv("API_ADMIN_TOKEN", "secret")
+        client = TestClient(main.app)
+        client.get('/api/courses/37')
+
+        assert client.post('/api/cache/invalidate', json={'codes': [37]}).status_code == 403
+        resp = client.post('/api/cache/invalidate', json={'codes': [37]},
+                           headers={'X-Admin-Token': 'secret'})
+        assert resp.json() == {'invalidated': 1}
+
+
+class TestSerialization:
+    """Tests for the NaN-safe response encoder"""
+
+    def _dumps(self, content, orjson: bool, monkeypatch):
+        from src.api import serialization
+        if orjson and not serialization.HAS_ORJSON:
+            pytest.skip("orjson not installed")
+        monkeypatch.setattr(serialization, "HAS_ORJSON", orjson)
+        return json.loads(serialization.dumps(content))
+
+    @pytest.mark.parametrize("orjson", [True, False])
+    def test_non_finite_become_null(self, orjson, monkeypatch):
+        content = {"a": float("nan"), "b": [float("inf"), -float("inf"), 1.5]}
+        assert self._dumps(content, orjson, monkeypatch) == {"a": None, "b": [None, None, 1.5]}
+
+    @pytest.mark.parametrize("orjson", [True, False])
+    def test_strings_untouched(self, orjson, monkeypatch):
+        content = {"name": 'NaN "Infinity", -Infinity', "x": float("nan")}
+        assert self._dumps(content, orjson, monkeypatch) == {
+            "name": 'NaN "Infinity", -Infinity', "x": None,
+        }
+
+    @pytest.mark.parametrize("orjson", [True, False])
+    def test_numpy_values(self, orjson, monkeypatch):
+        import numpy as np
+        content = {"score": np.float64(712.5), "n": np.int64(3),
+                   "missing": np.float64("nan"), "arr": np.array([1, 2])}
+        assert self._dumps(content, orjson, monkeypatch) == {
+            "score": 712.5, "n": 3, "missing": None, "arr": [1, 2],
+        }
+
+
+def _sim_course(id, code, state, weights, minimums, cuts):
+    w = {"year": 2025, **{f"peso_{f}": v for f, v in zip(("red", "ling", "mat", "ch", "cn"), weights)},
+         **{f"min_{f}": v for f, v in zip(("red", "ling", "mat", "ch", "cn", "enem"), minimums)}}
+    return {
+        "id": id, "code": code, "name": f"Curso {code}", "university": "U", "city": "C",
+        "state": state, "course_weights": [{"year": 2024, "peso_red": 9}, w],
+        "latest_cut_scores": [
+            {"year": year, "modality_code": mc, "modality_name": name, "cut_score": cut}
+            for year, mc, name, cut in cuts
+        ],
+    }
+
+
+SIM_COURSES = [
+    # Equal weights, passes AMPLA with average 700
+    _sim_course(1, 10, "MA", [1, 1, 1, 1, 1], [None] * 6,
+                [(2025, 41, "Ampla concorrência", 650.0), (2024, 41, "Ampla concorrência", 900.0)]),
+    # Math-heavy: average (700*1 + 700*1 + 800*4 + 600 + 700) / 8 = 737.5
+    _sim_course(2, 20, "PI", [1, 1, 4, 1, 1], [None] * 6,
+                [(2025, 41, "Ampla concorrência", 720.0),
+                 (2025, 7, "Candidatos pretos, pardos ou indígenas", 690.0)]),
+    # Essay minimum not met
+    _sim_course(3, 30, "MA", [1, 1, 1, 1, 1], [800, None, None, None, None, None],
+                [(2025, 41, "Ampla concorrência", 500.0)]),
+    # Cut above the average
+    _sim_course(4, 40, "MA", [1, 1, 1, 1, 1], [None] * 6,
+                [(2025, 41, "Ampla concorrência", 750.0)]),
+]
+
+CANDIDATE = {"red": 700, "ling": 700, "mat": 800, "ch": 600, "cn": 700}
+
+
+class TestSimulation:
+    """Tests for the vectorised simulation engine"""
+
+    def _index(self, courses=SIM_COURSES):
+        from src.api.simulation import SimulationIndex
+        return SimulationIndex(lambda: courses)
+
+    def test_averages_and_minimums(self):
+        from src.api.simulation import SimulationSnapshot
+        import numpy as np
+        snap = SimulationSnapshot.build(SIM_COURSES)
+        scores = np.array([700, 700, 800, 600, 700], dtype=float)
+        averages = snap.averages(scores)
+        assert averages[:2].tolist() == [700.0, 737.5]
+        assert snap.meets_minimums(scores, averages).tolist() == [True, True, False, True]
+
+    def test_ranked_by_margin(self):
+        from src.api.simulation import SimulationRequest
+        result = self._index().simulate(SimulationRequest(**CANDIDATE))
+        assert [c["code"] for c in result["courses"]] == [10, 20]
+        assert [c["margin"] for c in result["courses"]] == [50.0, 17.5]
+        assert result["courses"][0]["cut_score"] == 650.0  # Latest year only
+        assert result["count"] == 2
+        assert result["evaluated"] == 3  # Course 30 fails the essay minimum
+
+    def test_modality_and_filters(self):
+        from src.api.simulation import SimulationRequest
+        index = self._index()
+        ppi = index.simulate(SimulationRequest(**CANDIDATE, modality="ppi"))
+        assert [c["code"] for c in ppi["courses"]] == [20]
+        by_code = index.simulate(SimulationRequest(**CANDIDATE, modality_code=7))
+        assert by_code["courses"] == ppi["courses"]
+        assert index.simulate(SimulationRequest(**CANDIDATE, state="pi"))["count"] == 1
+        assert [c["code"] for c in index.simulate(SimulationRequest(**CANDIDATE, limit=1))["courses"]] == [10]
+        assert index.simulate(SimulationRequest(**CANDIDATE, modality="PCD"))["courses"] == []
+
+    def _batch(self, fmt, chunk_cells=250_000, **kwargs):
+        from src.api.simulation import BatchSimulationRequest, batch_csv, batch_ndjson
+        req = BatchSimulationRequest(
+            candidates=[{**CANDIDATE, "id": "ana"}, {**CANDIDATE, "mat": 400}],
+            format=fmt, **kwargs
+        )
+        encode = batch_csv if fmt == "csv" else batch_ndjson
+        return b"".join(encode(self._index().simulate_batch(req, chunk_cells=chunk_cells))).decode()
+
+    def test_batch_ndjson(self):
+        rows = [json.loads(line) for line in self._batch("ndjson").splitlines()]
+        assert len(rows) == 2 * 4
+        first = rows[0]
+        assert first["candidate"] == "ana" and first["code"] == 10
+        assert (first["average"], first["margin"], first["passes"]) == (700.0, 50.0, True)
+        essay = next(r for r in rows if r["code"] == 30)
+        assert (essay["meets_minimums"], essay["passes"]) == (False, False)
+        # Unnamed candidates are numbered by position
+        assert {r["candidate"] for r in rows} == {"ana", "2"}
+
+    def test_batch_csv_chunked(self):
+        import csv
+        text = self._batch("csv", chunk_cells=1, courses=[10, 40, 999], only_passing=True)
+        assert text == self._batch("csv", courses=[10, 40, 999], only_passing=True)
+        rows = list(csv.DictReader(text.splitlines()))
+        # The second candidate averages 620 in course 10 (cut 650)
+        assert [(r["candidate"], r["code"], r["margin"]) for r in rows] == [("ana", "10", "50.0")]
+
+
+class TestForecast:
+    """Tests for the cut score forecaster"""
+
+    def test_trend_and_carry_forward(self):
+        import numpy as np
+        from src.api.forecast import carry_forward, trend
+        partial = np.array([[600.0, 610.0, np.nan, 640.0],
+                            [np.nan, 700.0, 690.0, np.nan]])
+        assert np.allclose(trend(partial), [[0, 10, 10, 95 / 7], [0, 0, -10, -10]])
+        assert np.allclose(carry_forward(partial)[0], [600, 610, 610, 640])
+        assert np.isnan(carry_forward(partial)[1, 0])
+        assert np.allclose(carry_forward(partial)[1, 1:], [700, 690, 690])
+
+    def test_forecast_learns_past_drift(self):
+        from src.api.forecast import ForecastSnapshot, MIN_SAMPLES
+        rows = []
+        for code in range(MIN_SAMPLES * 2):
+            base = 600 + code
+            for year in (2024, 2025, 2026):
+                days = 4 if year < 2026 else 2
+                trajectory = [base + 10 * d + (code % 3) for d in range(days)]
+                rows.append({
+                    "courses": {"code": code}, "year": year, "modality_key": "41",
+                    "modality_name": "Ampla concorrência",
+                    # Closed years end 25 points above their last partial
+                    "cut_score": trajectory[-1] + 25 if year < 2026 else trajectory[-1],
+                    "partial_scores": [{"day": str(d + 1), "score": s} for d, s in enumerate(trajectory)],
+                })
+        snapshot = ForecastSnapshot.build(rows)
+        assert snapshot.year == 2026 and snapshot.course_count == MIN_SAMPLES * 2
+
+        forecast = snapshot.forecasts[5][0]
+        assert forecast["day"] == 2 and forecast["last_partial"] == 617.0
+        # From day 2 the past years moved 20 more partial points, then 25
+        assert abs(forecast["predicted"] - 662.0) < 0.01
+        assert forecast["low"] <= forecast["predicted"] <= forecast["high"]
+
+    def test_single_year_keeps_last_partial(self):
+        from src.api.forecast import ForecastIndex
+        rows = [{"code": 37, "year": 2026, "modality_key": "41", "modality_name": "Ampla",
+                 "cut_score": 700.0, "partial_scores": [{"day": "1", "score": 690.0},
+                                                        {"day": "2", "score": 700.0}]},
+                {"code": 38, "year": 2026, "modality_key": "41", "modality_name": "Ampla",
+                 "cut_score": 650.0, "partial_scores": []}]
+        index = ForecastIndex(lambda: rows)
+        assert index.course(37)["forecasts"][0]["predicted"] == 700.0
+        assert index.course(38) is None
+
+
+class TestRankIndex:
+    """Tests for the approved-list rank lookup"""
+
+    APPROVED = {
+        "id": 1, "code": 37, "name": "Medicina", "university": "UFMA",
+        "approved_students": [
+            {"year": 2025, "modality_code": 41, "call_number": 1, "rank": r, "name": n, "score": s, "bonus": 0}
+            for r, n, s in [(1, "A", 800.0), (2, "B", 760.5), (3, "C", 742.3), (4, "D", 700.0)]
+        ] + [
+            {"year": 2024, "modality_code": 41, "call_number": 1, "rank": 1, "name": "E", "score": 790.0},
+            {"year": 2025, "modality_code": 7, "call_number": 1, "rank": 1, "name": "F", "score": 690.0},
+        ],
+    }
+
+    def _index(self):
+        from src.api.ranks import RankIndex
+        calls = []
+
+        def loader(code):
+            calls.append(code)
+            return self.APPROVED if code == 37 else None
+        return RankIndex(loader), calls
+
+    def test_place(self):
+        index, calls = self._index()
+        result = index.lookup(37, 750.0, 41, neighbors=1)
+        assert result["year"] == 2025  # Latest year by default
+        assert (result["rank"], result["total"], result["within_list"]) == (3, 4, True)
+        assert [s["name"] for s in result["above"]] == ["B"]
+        assert [s["name"] for s in result["below"]] == ["C"]
+        # Ties place after the students with the same score
+        assert index.lookup(37, 742.3, 41)["rank"] == 4
+        assert index.lookup(37, 900.0, 41)["rank"] == 1
+        low = index.lookup(37, 500.0, 41, neighbors=2)
+        assert (low["rank"], low["within_list"], low["below"]) == (5, False, [])
+        assert [s["name"] for s in low["above"]] == ["C", "D"]
+        assert calls == [37]  # Loaded once, then served from memory
+
+    def test_missing_list_and_invalidate(self):
+        index, calls = self._index()
+        result = index.lookup(37, 700.0, 99)
+        assert result["rank"] is None and result["modalities"] == [7, 41]
+        assert result["years"] == [2025, 2024]
+        assert index.lookup(50, 700.0, 41) is None
+
+        index.invalidate([37])
+        index.lookup(37, 700.0, 41, year=2024)
+        assert calls == [37, 50, 37]
+
+
+class TestStudentsEndpoint:
+    """Tests for keyset pagination of /api/courses/{code}/students"""
+
+    def test_pages_with_cursor(self, monkeypatch):
+        from fastapi.testclient import TestClient
+        import src.api.main as main
+
+        fake = FakeSupabase()
+        monkeypatch.setattr(main, "supabase", fake)
+        client = TestClient(main.app)
+
+        first = client.get('/api/courses/37/students', params={'limit': 3}).json()
+        assert first['year'] == 2025  # Resolved with the course lookup
+        assert (first['total'], first['remaining'], first['has_more']) == (4, 1, True)
+        assert first['next'] == {'after_rank': 2, 'after_modality': 7, 'after_call': 1}
+
+        second = client.get('/api/courses/37/students', params={'limit': 3, **first['next']}).json()
+        assert [(s['rank'], s['modality_code']) for s in second['students']] == [(2, 41)]
+        assert (second['total'], second['has_more'], second['next']) == (None, False, None)
+        assert fake.page_calls[1] == {'year': 2025, 'after': (2, 7, 1), 'offset': 0}
+        assert fake.calls == 2
+
+        # rank alone is ambiguous across modalities and calls
+        assert client.get('/api/courses/37/students', params={'after_rank': 2}).status_code == 400
+        assert client.get('/api/courses/99/students').status_code == 404
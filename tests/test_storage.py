@@ -0,0 +1,998 @@
+"""Tests for storage layer"""
+import pytest
+
+
+class TestCutScoreFingerprints:
+    """Tests for change-only cut score persistence"""
+
+    def test_unknown_modality_has_changed(self):
+        """Test that a modality never written counts as changed"""
+        from src.storage.fingerprint import CutScoreFingerprints
+
+        fps = CutScoreFingerprints()
+        assert fps.has_changed(1, 2025, {'code': 41, 'cut_score': 700.0}) is True
+
+    def test_remember_and_compare(self):
+        """Test that only real changes are reported"""
+        from src.storage.fingerprint import CutScoreFingerprints
+
+        fps = CutScoreFingerprints()
+        mod = {'code': 41, 'name': 'Ampla', 'cut_score': 700.0, 'applicants': 10, 'vacancies': 5}
+        fps.remember(1, 2025, mod)
+
+        assert fps.has_changed(1, 2025, mod) is False
+        assert fps.has_changed(1, 2025, {**mod, 'applicants': 11}) is True
+        assert fps.has_changed(1, 2025, {**mod, 'cut_score': 700.5}) is True
+        assert fps.has_changed(1, 2024, mod) is True
+
+    def test_partial_scores_change(self):
+        """Test new partial scores count as a change when the caller provides them"""
+        from src.storage.fingerprint import CutScoreFingerprints
+
+        fps = CutScoreFingerprints()
+        fps.load(1, 2025, [{'modality_code': 41, 'cut_score': '700.00', 'applicants': 10,
+                            'vacancies': 5, 'partial_scores': [{'day': '1', 'score': 690.0}]}])
+        mod = {'code': 41, 'cut_score': 700.0, 'applicants': 10, 'vacancies': 5,
+               'partial_scores': [{'day': '1', 'score': 690.0}]}
+
+        assert fps.has_changed(1, 2025, mod) is False
+        longer = {**mod, 'partial_scores': mod['partial_scores'] + [{'day': '2', 'score': 695.0}]}
+        assert fps.has_changed(1, 2025, longer) is True
+        # Writers without partial scores (the monitor) compare the rest only
+        assert fps.has_changed(1, 2025, {k: v for k, v in mod.items() if k != 'partial_scores'}) is False
+
+    def test_load_keeps_newest_row(self):
+        """Test seeding from database rows ordered newest first"""
+        from src.storage.fingerprint import CutScoreFingerprints
+
+        fps = CutScoreFingerprints()
+        fps.load(1, 2025, [
+            {'modality_code': 41, 'cut_score': '701.30', 'applicants': 12, 'vacancies': 5},
+            {'modality_code': 41, 'cut_score': '690.00', 'applicants': 8, 'vacancies': 5},
+        ])
+
+        assert fps.is_loaded(1, 2025)
+        mod = {'code': 41, 'cut_score': 701.3, 'applicants': 12, 'vacancies': 5}
+        assert fps.has_changed(1, 2025, mod) is False
+
+    def test_client_skips_unchanged(self, monkeypatch):
+        """Test SupabaseClient only inserts changed modalities"""
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        inserted = []
+        monkeypatch.setattr(client, "get_latest_cut_scores", lambda course_id, year: [
+            {'modality_code': 41, 'cut_score': 700.0, 'applicants': 10, 'vacancies': 5},
+        ])
+        monkeypatch.setattr(client, "insert_cut_score",
+                            lambda course_id, year, modality: inserted.append(modality) or {'id': 1})
+
+        same = {'code': 41, 'cut_score': 700.0, 'applicants': 10, 'vacancies': 5}
+        changed = {'code': 41, 'cut_score': 705.0, 'applicants': 10, 'vacancies': 5}
+
+        assert client.insert_cut_score_if_changed(1, 2025, same) is None
+        assert client.insert_cut_score_if_changed(1, 2025, changed) == {'id': 1}
+        assert client.insert_cut_score_if_changed(1, 2025, changed) is None
+        assert inserted == [changed]
+
+
+class TestIterTable:
+    """Tests for keyset pagination"""
+
+    def test_iter_table_uses_keyset(self, monkeypatch):
+        """Test pages filter on the last seen key instead of an offset"""
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        rows = [{'id': i, 'code': i * 10} for i in range(1, 8)]
+        calls = []
+
+        def fake_get(endpoint, params=None):
+            calls.append(dict(params))
+            after = int(params['id'][3:]) if 'id' in params else 0
+            return [r for r in rows if r['id'] > after][:params['limit']]
+
+        monkeypatch.setattr(client, "_get", fake_get)
+
+        result = list(client.iter_table("courses", select="code", page=3))
+
+        assert result == rows
+        assert all('offset' not in c for c in calls)
+        assert calls[0]['select'] == 'code,id'
+        assert [c.get('id') for c in calls] == [None, 'gt.3', 'gt.6', 'gt.7']
+
+
+class TestStreamingExport:
+    """Tests for streamed cut score exports"""
+
+    def test_supabase_rows_are_flattened(self, monkeypatch):
+        """Test the embedded course is flattened into each row"""
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        page = [{'id': 1, 'course_id': 5, 'year': 2025, 'cut_score': 700.5,
+                 'courses': {'code': 37, 'name': 'Medicina', 'university': 'UFMA',
+                             'city': 'Sao Luis', 'state': 'MA'}}]
+        calls = []
+
+        def fake_get(endpoint, params=None):
+            calls.append(dict(params))
+            return page if 'id' not in params else []
+
+        monkeypatch.setattr(client, "_get", fake_get)
+
+        (row,) = client.iter_cut_score_rows(year=2025)
+        assert row['course_code'] == 37 and row['state'] == 'MA'
+        assert 'courses' not in row
+        assert calls[0]['year'] == 'eq.2025'
+
+    def test_export_streams_gzip_csv(self, temp_data_dir):
+        """Test rows from a generator are written to gzipped CSV"""
+        import csv
+        import gzip
+        from src.storage.export import ExportManager
+
+        def rows():
+            for i in range(3):
+                yield {'course_id': i, 'course_name': 'Medicina', 'year': 2025,
+                       'modality_name': 'AMPLA', 'cut_score': 700 + i, 'vacancies': None}
+
+        path = ExportManager(temp_data_dir).export_scores_stream(rows(), compress=True)
+
+        assert path.name.endswith('.csv.gz')
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            records = list(csv.DictReader(f))
+        assert len(records) == 3
+        assert records[2]['nota_corte'] == '702'
+        assert records[0]['vagas'] == ''
+
+    def test_parquet_partitioned_by_year(self, temp_data_dir):
+        """Test Parquet export writes one partition per year with dictionary columns"""
+        from decimal import Decimal
+        pq = pytest.importorskip("pyarrow.parquet")
+        from src.storage.export import ExportManager
+
+        rows = [
+            {'id': i, 'course_id': 1, 'year': 2024 + i % 2, 'modality_name': 'AMPLA',
+             'university': 'UFMA', 'cut_score': Decimal('700.25'),
+             'captured_at': '2026-01-16T19:29:26+00:00'}
+            for i in range(5)
+        ]
+        path = ExportManager(temp_data_dir).export_parquet('cut_scores', iter(rows), batch_size=2)
+
+        assert sorted(p.name for p in path.iterdir()) == ['year=2024', 'year=2025']
+        table = pq.read_table(path)
+        assert table.num_rows == 5
+        assert str(table.schema.field('modality_name').type).startswith('dictionary')
+        assert table.column('cut_score').to_pylist()[0] == 700.25
+
+
+class TestDeltaExport:
+    """Tests for watermark-based delta exports"""
+
+    class FakeStorage:
+        def __init__(self):
+            self.tables = {'courses': [], 'course_weights': [], 'cut_scores': [],
+                           'approved_students': []}
+
+        def iter_changed_rows(self, table, column="id", since=None):
+            for row in self.tables[table]:
+                if since is None or row[column] > since:
+                    yield row
+
+    def _read(self, exporter, entry, table):
+        import gzip
+        import json
+        path = exporter.deltas_dir / entry["tables"][table]["file"]
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_deltas_only_contain_changes(self, temp_data_dir):
+        """Test each run exports rows past the previous watermarks"""
+        from src.storage.export import ExportManager
+
+        storage = self.FakeStorage()
+        storage.tables['cut_scores'] = [{'id': 1, 'cut_score': 700.0}, {'id': 2, 'cut_score': 701.0}]
+        storage.tables['courses'] = [{'id': 5, 'name': 'Medicina',
+                                      'updated_at': '2026-01-16T10:00:00+00:00'}]
+        exporter = ExportManager(temp_data_dir)
+
+        first = exporter.export_delta(storage)
+        assert first['sequence'] == 1 and first['previous'] is None
+        assert first['tables']['cut_scores']['rows'] == 2
+        assert exporter.export_delta(storage) is None
+
+        storage.tables['cut_scores'].append({'id': 3, 'cut_score': 702.0})
+        storage.tables['courses'][0] = {'id': 5, 'name': 'Medicina (Integral)',
+                                        'updated_at': '2026-01-17T10:00:00+00:00'}
+        second = exporter.export_delta(storage)
+
+        assert second['previous'] == 1
+        assert [r['id'] for r in self._read(exporter, second, 'cut_scores')] == [3]
+        assert self._read(exporter, second, 'courses')[0]['name'] == 'Medicina (Integral)'
+        manifest = exporter.load_delta_manifest()
+        assert manifest['watermarks'] == {'cut_scores': 3, 'courses': '2026-01-17T10:00:00+00:00'}
+        assert [d['sequence'] for d in manifest['deltas']] == [1, 2]
+
+    def test_recent_rows_wait_for_safety_lag(self, temp_data_dir, monkeypatch):
+        """Test rows inside the safety lag don't advance the watermark past late commits"""
+        from datetime import datetime, timedelta, timezone
+        from src.storage import export
+        from src.storage.export import ExportManager
+
+        now = datetime.now(timezone.utc)
+        storage = self.FakeStorage()
+        storage.tables['cut_scores'] = [
+            {'id': 1, 'captured_at': (now - timedelta(hours=1)).isoformat()},
+            {'id': 2, 'captured_at': now.isoformat()},
+            {'id': 3, 'captured_at': (now - timedelta(hours=1)).isoformat()},
+        ]
+        storage.tables['courses'] = [
+            {'id': 5, 'updated_at': (now - timedelta(hours=1)).isoformat()},
+            {'id': 6, 'updated_at': now.isoformat()},
+        ]
+        exporter = ExportManager(temp_data_dir)
+
+        first = exporter.export_delta(storage)
+        assert [r['id'] for r in self._read(exporter, first, 'cut_scores')] == [1]
+        assert [r['id'] for r in self._read(exporter, first, 'courses')] == [5]
+
+        # A course committed late with an updated_at before row 6's
+        storage.tables['courses'].append({'id': 7, 'updated_at': (now - timedelta(minutes=1)).isoformat()})
+        monkeypatch.setattr(export, 'DELTA_SAFETY_LAG', timedelta(0))
+        second = exporter.export_delta(storage)
+
+        assert [r['id'] for r in self._read(exporter, second, 'cut_scores')] == [2, 3]
+        assert [r['id'] for r in self._read(exporter, second, 'courses')] == [6, 7]
+        assert exporter.load_delta_manifest()['deletes'].startswith('not propagated')
+
+
+class TestCourseDetail:
+    """Tests for the single-request course detail query"""
+
+    def test_embeds_scores_and_weights(self, monkeypatch):
+        """Test one request filters both embedded tables by year"""
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        calls = []
+
+        def fake_get(endpoint, params=None):
+            calls.append((endpoint, dict(params)))
+            return [{'id': 1, 'code': 37, 'latest_cut_scores': [], 'course_weights': []}]
+
+        monkeypatch.setattr(client, "_get", fake_get)
+
+        assert client.get_course_detail(37, [2024, 2025])['id'] == 1
+        (endpoint, params), = calls
+        assert endpoint == 'courses'
+        assert params['latest_cut_scores.year'] == 'in.(2024,2025)'
+        assert params['course_weights.year'] == 'in.(2024,2025)'
+
+
+class TestUpsertSkipsUnchanged:
+    """Tests that course and weight saves don't rewrite unchanged rows"""
+
+    def test_upsert_course_skips_patch(self, monkeypatch):
+        """Test a save matching the stored course sends no PATCH"""
+        import json
+        import requests
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        stored = {'id': 1, 'code': 37, 'name': 'Medicina', 'latitude': '-2.53',
+                  'updated_at': '2026-01-16T10:00:00+00:00'}
+        requests_sent = []
+
+        def fake_request(method, endpoint, **kwargs):
+            requests_sent.append(method)
+            response = requests.Response()
+            response.status_code = 200
+            response._content = json.dumps([{**stored, **kwargs['json']}]).encode()
+            return response
+
+        monkeypatch.setattr(client, "get_course_by_code", lambda code: dict(stored))
+        monkeypatch.setattr(client, "_request", fake_request)
+
+        assert client.upsert_course({'code': 37, 'name': 'Medicina', 'latitude': -2.53})['id'] == 1
+        assert requests_sent == []
+
+        saved = client.upsert_course({'code': 37, 'name': 'Medicina (Integral)'})
+        assert saved['name'] == 'Medicina (Integral)'
+        assert requests_sent == ['PATCH']
+
+    def test_upsert_weights_skips_patch(self, monkeypatch):
+        """Test weights equal at NUMERIC precision are not rewritten"""
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        stored = {'id': 5, 'course_id': 1, 'year': 2025, 'peso_red': 2, 'peso_ling': 1,
+                  'peso_mat': 3, 'peso_ch': 1, 'peso_cn': 2, 'min_red': None, 'min_ling': None,
+                  'min_mat': None, 'min_ch': None, 'min_cn': None, 'min_enem': 450.0}
+        requests_sent = []
+        monkeypatch.setattr(client, "_get", lambda endpoint, params=None: [dict(stored)])
+        monkeypatch.setattr(client, "_request",
+                            lambda method, endpoint, **kw: requests_sent.append(method))
+
+        weights = {'pesoRed': 2.0, 'pesoLing': 1, 'pesoMat': 3, 'pesoCh': 1, 'pesoCn': 2}
+        assert client.upsert_weights(1, 2025, weights, {'minEnem': 450})['id'] == 5
+        assert requests_sent == []
+
+
+class TestSearchCourses:
+    """Tests for course search"""
+
+    def test_search_uses_rpc(self, monkeypatch):
+        """Test search goes through the ranked search_courses RPC"""
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        calls = []
+        monkeypatch.setattr(client, "_rpc", lambda fn, params=None: calls.append((fn, params)) or [])
+
+        client.search_courses("medicina", limit=5)
+        assert calls == [("search_courses", {"q": "medicina", "max_results": 5})]
+
+    def test_search_falls_back_without_rpc(self, monkeypatch):
+        """Test ILIKE fallback when the RPC is not deployed"""
+        import requests
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        response = requests.Response()
+        response.status_code = 404
+
+        def missing_rpc(fn, params=None):
+            raise requests.HTTPError(response=response)
+
+        calls = []
+        monkeypatch.setattr(client, "_rpc", missing_rpc)
+        monkeypatch.setattr(client, "_get",
+                            lambda endpoint, params=None: calls.append(params) or [{'id': 1}])
+
+        assert client.search_courses("medicina") == [{'id': 1}]
+        assert 'search_text' not in calls[0]['select']
+
+        # Wildcards typed by the user are escaped (and the escape quoted for PostgREST)
+        client.search_courses('50%_off, "a"')
+        assert calls[1]['or'].startswith(r'(name.ilike."%50\\%\\_off, \"a\"%",')
+
+
+class TestLocalReplica:
+    """Tests for the SQLite replica"""
+
+    class FakeClient:
+        def __init__(self, tables):
+            self.tables = tables
+            self.calls = []
+
+        def iter_table(self, endpoint, select="*", key="id", page=1000, params=None, after=None):
+            self.calls.append((endpoint, after if params is None else params))
+            rows = self.tables.get(endpoint, [])
+            if params:
+                since = params['updated_at'][3:]
+                return iter([r for r in rows if r['updated_at'] > since])
+            return iter([r for r in rows if after is None or r['id'] > after])
+
+        def count_rows(self, endpoint, params=None):
+            return len(self.tables.get(endpoint, []))
+
+    def test_incremental_sync(self, tmp_path):
+        """Test append-only tables resume from the high-water mark"""
+        from src.storage.replica import LocalReplica
+
+        client = self.FakeClient({
+            'courses': [{'id': 1, 'code': 37, 'name': 'Medicina', 'state': 'DF'}],
+            'cut_scores': [
+                {'id': 1, 'course_id': 1, 'year': 2025, 'modality_name': 'AMPLA',
+                 'cut_score': 780.5, 'partial_scores': [{'day': '1', 'score': 770.0}]},
+            ],
+        })
+
+        with LocalReplica(tmp_path / "replica.sqlite", client=client) as replica:
+            replica.sync()
+            assert replica.high_water_mark('cut_scores') == 1
+
+            client.tables['cut_scores'].append(
+                {'id': 2, 'course_id': 1, 'year': 2025, 'modality_name': 'AMPLA', 'cut_score': 781.0}
+            )
+            written = replica.sync()
+
+            assert written['cut_scores'] == 1
+            assert written['courses'] == 1
+            assert ('cut_scores', 1) in client.calls
+            assert ('courses', None) in client.calls[-4:]
+
+            rows = replica.query(
+                "SELECT COUNT(*) AS n, MAX(cut_score) AS top FROM cut_scores WHERE course_id = ?", (1,)
+            )
+            assert rows == [{'n': 2, 'top': 781.0}]
+            assert replica.query("SELECT COUNT(*) AS n FROM courses")[0]['n'] == 1
+
+    def test_recent_rows_dont_advance_mark(self, tmp_path):
+        """Test rows inside the safety lag are mirrored but re-read by the next sync"""
+        from datetime import datetime, timedelta, timezone
+        from src.storage.replica import LocalReplica
+
+        now = datetime.now(timezone.utc)
+        old = (now - timedelta(hours=1)).isoformat()
+        client = self.FakeClient({
+            'cut_scores': [
+                {'id': 1, 'course_id': 1, 'year': 2025, 'cut_score': 780.5, 'captured_at': old},
+                {'id': 2, 'course_id': 1, 'year': 2025, 'cut_score': 781.0, 'captured_at': now.isoformat()},
+                {'id': 3, 'course_id': 1, 'year': 2025, 'cut_score': 782.0, 'captured_at': old},
+            ],
+        })
+
+        with LocalReplica(tmp_path / "replica.sqlite", client=client) as replica:
+            replica.sync(['cut_scores'])
+            assert replica.high_water_mark('cut_scores') == 1
+            assert replica.query("SELECT COUNT(*) AS n FROM cut_scores")[0]['n'] == 3
+
+            assert replica.sync(['cut_scores'])['cut_scores'] == 2
+            assert ('cut_scores', 1) in client.calls
+            assert replica.query("SELECT COUNT(*) AS n FROM cut_scores")[0]['n'] == 3
+
+
+    def test_updates_and_deletes(self, tmp_path):
+        """Test in-place student updates sync by updated_at and deletes are reported"""
+        from src.storage.replica import LocalReplica
+
+        student = {'id': 5, 'course_id': 1, 'year': 2025, 'modality_code': 41, 'rank': 1,
+                   'name': 'Ana', 'score': 750.0, 'call_number': 1,
+                   'updated_at': '2026-01-16T10:00:00+00:00'}
+        client = self.FakeClient({
+            'approved_students': [dict(student)],
+            'cut_scores': [{'id': 1, 'course_id': 1, 'year': 2025, 'modality_name': 'AMPLA'},
+                           {'id': 2, 'course_id': 1, 'year': 2025, 'modality_name': 'AMPLA'}],
+        })
+
+        with LocalReplica(tmp_path / "replica.sqlite", client=client) as replica:
+            replica.sync()
+            assert replica.high_water_mark('approved_students') == '2026-01-16T10:00:00+00:00'
+
+            # Upsert keeps the id; compaction deletes a history row
+            client.tables['approved_students'][0].update(
+                score=760.0, updated_at='2026-01-17T10:00:00+00:00'
+            )
+            del client.tables['cut_scores'][0]
+            written = replica.sync()
+
+            assert written['approved_students'] == 1
+            assert replica.query("SELECT score FROM approved_students") == [{'score': 760.0}]
+            assert replica.stale_tables() == {'cut_scores': (2, 1)}
+
+            replica.sync(['cut_scores'], full=True)
+            assert replica.stale_tables() == {}
+            assert replica.query("SELECT COUNT(*) AS n FROM cut_scores")[0]['n'] == 1
+
+    def test_upgrades_old_replica(self, tmp_path):
+        """Test a replica from before updated_at gets the column and a fresh mark"""
+        import sqlite3
+        from src.storage.replica import LocalReplica
+
+        conn = sqlite3.connect(tmp_path / "replica.sqlite")
+        conn.execute("CREATE TABLE approved_students (id INTEGER PRIMARY KEY, course_id, year, "
+                     "modality_code, rank, name, score, bonus, call_number, status, created_at)")
+        conn.execute("CREATE TABLE _replica_state (table_name TEXT PRIMARY KEY, "
+                     "high_water_mark INTEGER, row_count INTEGER, synced_at TEXT)")
+        conn.execute("INSERT INTO _replica_state VALUES ('approved_students', 9, 1, 'x')")
+        conn.commit()
+        conn.close()
+
+        with LocalReplica(tmp_path / "replica.sqlite", client=self.FakeClient({})) as replica:
+            assert replica.high_water_mark('approved_students') is None
+            columns = {r['name'] for r in replica.query("PRAGMA table_info(approved_students)")}
+            assert 'updated_at' in columns
+
+
+class TestDatabaseBulk:
+    """Tests for DatabaseStorage bulk paths"""
+
+    def test_copy_buffer_escapes_values(self):
+        """Test COPY text formatting of nulls and special characters"""
+        pytest.importorskip("psycopg2")
+        from src.storage.database import _copy_buffer
+
+        buf = _copy_buffer(
+            [{'a': 1, 'b': None, 'c': 'tab\there\\'}],
+            ('a', 'b', 'c')
+        )
+        assert buf.read() == '1\t\\N\ttab\\there\\\\\n'
+
+    def test_changed_rows_quotes_identifiers(self, monkeypatch):
+        """Test delta reads compose table and column as identifiers"""
+        pytest.importorskip("psycopg2")
+        from psycopg2 import sql
+        from src.storage.database import DatabaseStorage
+
+        db = DatabaseStorage("postgresql://unused")
+        queries = []
+        monkeypatch.setattr(db, "iter_query", lambda query, params=None: queries.append((query, params)))
+
+        db.iter_changed_rows('courses; DROP TABLE courses', 'updated_at', '2026-01-16')
+
+        (query, params), = queries
+        assert query == sql.SQL("SELECT * FROM {} WHERE {} > %s ORDER BY id").format(
+            sql.Identifier('courses; DROP TABLE courses'), sql.Identifier('updated_at')
+        )
+        assert params == ('2026-01-16',)
+
+    def test_bulk_load_local_postgres(self):
+        """Test pooled COPY/execute_values loads against a local Postgres"""
+        pytest.importorskip("psycopg2")
+        import os
+        from src.storage.database import DatabaseStorage
+
+        url = os.environ.get("TEST_DATABASE_URL")
+        if not url:
+            pytest.skip("TEST_DATABASE_URL not set")
+
+        # A single pooled connection keeps the session-local temp tables visible
+        with DatabaseStorage(url, pool_size=1) as db:
+            with db.cursor() as cur:
+                cur.execute("""
+                    CREATE TEMP TABLE cut_scores (
+                        id SERIAL PRIMARY KEY, course_id INTEGER, year INTEGER,
+                        modality_code INTEGER, modality_name TEXT NOT NULL,
+                        cut_score NUMERIC(8,2), applicants INTEGER, vacancies INTEGER,
+                        captured_at TIMESTAMPTZ DEFAULT NOW()
+                    );
+                    CREATE TEMP TABLE approved_students (
+                        course_id INTEGER, year INTEGER, modality_code INTEGER,
+                        rank INTEGER, name TEXT, score FLOAT, bonus FLOAT,
+                        call_number INTEGER, status TEXT,
+                        UNIQUE (course_id, year, modality_code, rank, call_number)
+                    );
+                """)
+
+            scores = [
+                {'course_id': 1, 'year': 2025, 'modality_code': i, 'modality_name': f'M{i}',
+                 'cut_score': 700 + i, 'applicants': None, 'vacancies': 5}
+                for i in range(500)
+            ]
+            students = [
+                {'course_id': 1, 'year': 2025, 'modality_code': 41, 'rank': r,
+                 'name': f'Aluno {r}', 'score': 800 - r}
+                for r in range(1, 301)
+            ]
+
+            assert db.bulk_insert_cut_scores(scores) == 500
+            assert db.bulk_upsert_approved_students(students) == 300
+            assert db.bulk_upsert_approved_students(students) == 300
+
+            with db.cursor() as cur:
+                cur.execute("SELECT COUNT(*) AS n FROM cut_scores")
+                assert cur.fetchone()['n'] == 500
+                cur.execute("SELECT COUNT(*) AS n FROM approved_students")
+                assert cur.fetchone()['n'] == 300
+
+
+class TestSegmentStore:
+    """Tests for append-only segment files"""
+
+    def test_append_and_read(self, tmp_path):
+        """Test records round-trip and latest lookup"""
+        from src.storage.segments import SegmentStore
+
+        store = SegmentStore(tmp_path)
+        store.append(37, b'first', 1.0)
+        store.append(37, b'second', 2.0)
+
+        assert store.count(37) == 2
+        assert store.latest(37) == b'second'
+        assert [p for _, p in store.iter_records(37)] == [b'first', b'second']
+        assert store.keys() == [37]
+        assert store.latest(99) is None
+
+    def test_compact_drops_duplicates(self, tmp_path):
+        """Test compaction removes repeated payloads and trims history"""
+        from src.storage.segments import SegmentStore
+
+        store = SegmentStore(tmp_path)
+        for i, payload in enumerate([b'a', b'a', b'b', b'b', b'c']):
+            store.append(1, payload, float(i))
+
+        assert store.compact(1) == 2
+        assert [(e.timestamp, p) for e, p in store.iter_records(1)] == [
+            (0.0, b'a'), (2.0, b'b'), (4.0, b'c')
+        ]
+        assert store.compact(1, keep_last=1) == 2
+        assert store.latest(1) == b'c'
+
+    def test_corrupt_record_detected(self, tmp_path):
+        """Test checksum validation"""
+        from src.storage.segments import SegmentStore, SegmentCorruptError
+
+        store = SegmentStore(tmp_path)
+        entry = store.append(1, b'payload', 1.0)
+        data = bytearray(store.segment_path(1).read_bytes())
+        data[-1] ^= 0xFF
+        store.segment_path(1).write_bytes(bytes(data))
+
+        with pytest.raises(SegmentCorruptError):
+            store.read(1, entry)
+
+
+class TestHistoryManager:
+    """Tests for local history storage"""
+
+    def test_snapshots_go_to_segments(self, temp_data_dir, sample_course_data):
+        """Test snapshots append to one segment per course"""
+        from src.storage.history import HistoryManager
+
+        history = HistoryManager(temp_data_dir)
+        history.save_processed(37, sample_course_data)
+        history.save_processed(37, {**sample_course_data, 'course_name': 'Medicina 2'})
+        history.save_raw(37, b'raw-bytes')
+
+        snapshots = list(history.iter_snapshots(37))
+        assert len(snapshots) == 2
+        assert snapshots[-1][1]['course_name'] == 'Medicina 2'
+        assert history.get_latest(37)['course_name'] == 'Medicina 2'
+        assert [p for _, p in history.iter_raw(37)] == [b'raw-bytes']
+        assert (temp_data_dir / "raw" / "37.timeline").exists()
+        assert sorted(f.name for f in (temp_data_dir / "processed").iterdir()) == [
+            '37.idx', '37.seg', '37_latest.json'
+        ]
+
+    def test_migrate_legacy(self, temp_data_dir, sample_course_data):
+        """Test importing per-poll legacy files"""
+        import json
+        from src.storage.history import HistoryManager
+
+        processed = temp_data_dir / "processed"
+        (processed / "37_20260116_192926.json").write_text(json.dumps(sample_course_data))
+        (temp_data_dir / "raw" / "37_20260116_192926.bin").write_bytes(b'legacy')
+
+        history = HistoryManager(temp_data_dir)
+        assert history.migrate_legacy(remove=True) == 2
+        assert not (processed / "37_20260116_192926.json").exists()
+        assert [p for _, p in history.iter_raw(37)] == [b'legacy']
+
+        (captured, data), = history.iter_snapshots(37)
+        assert captured.strftime("%Y%m%d_%H%M%S") == "20260116_192926"
+        assert data['course_name'] == 'Medicina'
+
+    def test_migrate_legacy_is_idempotent(self, temp_data_dir, sample_course_data):
+        """Test rerunning the import without remove adds nothing twice"""
+        import json
+        from src.storage.history import HistoryManager
+
+        (temp_data_dir / "processed" / "37_20260116_192926.json").write_text(json.dumps(sample_course_data))
+        (temp_data_dir / "raw" / "37_20260116_192926.bin").write_bytes(b'legacy')
+
+        history = HistoryManager(temp_data_dir)
+        assert history.migrate_legacy() == 2
+        assert history.migrate_legacy() == 0
+
+        (temp_data_dir / "raw" / "37_20260116_193816.bin").write_bytes(b'newer')
+        assert history.migrate_legacy() == 1
+        assert [p for _, p in history.iter_raw(37)] == [b'legacy', b'newer']
+        assert len(list(history.iter_snapshots(37))) == 1
+
+
+class TestCatalogManifest:
+    """Tests for the persisted course catalog"""
+
+    def test_saves_update_manifest(self, temp_data_dir, sample_course_data):
+        """Test snapshots and changes are recorded without rescanning"""
+        from src.storage.history import HistoryManager
+        from src.monitor.tracker import ScoreChange, ChangeType
+
+        history = HistoryManager(temp_data_dir)
+        history.save_processed(37, sample_course_data)
+        history.save_processed(37, {**sample_course_data, 'course_name': 'Medicina 2'})
+        history.save_processed(4371, sample_course_data)
+        history.save_change(37, [
+            ScoreChange(modality='AMPLA', old_score=700.0, new_score=710.0,
+                        change_type=ChangeType.INCREASE)
+        ])
+
+        # A fresh manager reads the catalog from the manifest alone
+        (temp_data_dir / "processed" / "37_latest.json").unlink()
+        reopened = HistoryManager(temp_data_dir)
+        assert reopened.list_courses() == [37, 4371]
+        assert reopened.get_latest(37)['course_name'] == 'Medicina 2'
+        entry = reopened.get_catalog_entry(37)
+        assert entry['snapshot_count'] == 2
+        assert 'last_change' in entry
+
+    def test_rebuild_from_existing_files(self, temp_data_dir, sample_course_data):
+        """Test a missing manifest is rebuilt from segments and legacy files"""
+        import json
+        from src.storage.history import HistoryManager
+
+        HistoryManager(temp_data_dir).save_processed(37, sample_course_data)
+        (temp_data_dir / "processed" / "99_latest.json").write_text(json.dumps(sample_course_data))
+        (temp_data_dir / "manifest.json").unlink()
+
+        history = HistoryManager(temp_data_dir)
+        assert history.list_courses() == [37, 99]
+        assert history.get_latest(99)['course_name'] == 'Medicina'
+
+    def test_batch_defers_writes(self, tmp_path):
+        """Test the manifest is written once per batch"""
+        from src.storage.manifest import CatalogManifest
+
+        manifest = CatalogManifest(tmp_path / "manifest.json")
+        with manifest.batch():
+            manifest.update(1, snapshot_count=1)
+            manifest.update(2, snapshot_count=1)
+            assert not manifest.exists()
+        assert CatalogManifest(tmp_path / "manifest.json").course_ids() == [1, 2]
+
+    def test_updates_append_to_log(self, tmp_path):
+        """Test updates append a line instead of rewriting the snapshot"""
+        from src.storage.manifest import CatalogManifest
+
+        manifest = CatalogManifest(tmp_path / "manifest.json")
+        manifest.update(1, snapshot_count=1)
+        snapshot = (tmp_path / "manifest.json").read_bytes()
+        manifest.update(2, snapshot_count=1)
+        manifest.update(1, snapshot_count=2)
+
+        assert (tmp_path / "manifest.json").read_bytes() == snapshot
+        assert len((tmp_path / "manifest.log").read_text().splitlines()) == 2
+        reopened = CatalogManifest(tmp_path / "manifest.json")
+        assert reopened.course_ids() == [1, 2]
+        assert reopened.get(1)['snapshot_count'] == 2
+
+    def test_writers_do_not_overwrite_each_other(self, tmp_path, monkeypatch):
+        """Test two manifests on the same files keep both writers' entries across compactions"""
+        from src.storage import manifest as manifest_module
+
+        monitor = manifest_module.CatalogManifest(tmp_path / "manifest.json")
+        backfill = manifest_module.CatalogManifest(tmp_path / "manifest.json")
+        monkeypatch.setattr(manifest_module, "COMPACT_MIN_BYTES", 64)
+
+        with backfill.batch():
+            backfill.update(2, snapshot_count=5)
+            monitor.update(1, snapshot_count=1)
+            monitor.update(3, last_change='2026-01-16T10:00:00')
+        monitor.update(1, snapshot_count=2)
+
+        for manifest in (monitor, backfill):
+            assert manifest.course_ids() == [1, 2, 3]
+            assert manifest.get(1)['snapshot_count'] == 2
+            assert manifest.get(2)['snapshot_count'] == 5
+        # Folded into the snapshot once the log passed the threshold
+        assert (tmp_path / "manifest.log").stat().st_size < 64
+
+    def test_compact_moves_pointer(self, temp_data_dir, sample_course_data):
+        """Test compaction refreshes the snapshot pointer"""
+        from src.storage.history import HistoryManager
+
+        history = HistoryManager(temp_data_dir)
+        history.save_processed(37, sample_course_data)
+        history.save_processed(37, sample_course_data)
+        history.save_processed(37, {**sample_course_data, 'course_name': 'Medicina 2'})
+        history.compact()
+
+        assert history.get_catalog_entry(37)['snapshot_count'] == 2
+        assert history.get_latest(37)['course_name'] == 'Medicina 2'
+
+
+def _fake_decode(data: bytes) -> dict:
+    """Picklable stand-in decoder for backfill tests"""
+    return {"payload": data.decode()}
+
+
+def _fake_decode_v2(data: bytes) -> dict:
+    return {"payload": data.decode().upper()}
+
+
+class TestBackfillEngine:
+    """Tests for incremental raw archive backfills"""
+
+    def _history(self, temp_data_dir):
+        from src.storage.history import HistoryManager
+
+        history = HistoryManager(temp_data_dir)
+        history.raw_archive.put(37, b'a', 1.0)
+        history.raw_archive.put(37, b'b', 2.0)
+        history.raw_archive.put(4371, b'a', 3.0)
+        return history
+
+    def test_decodes_each_payload_once(self, temp_data_dir):
+        """Test reruns only decode new payloads and rebuild their courses"""
+        from src.storage.backfill import BackfillEngine
+
+        history = self._history(temp_data_dir)
+        with BackfillEngine(history, decode=_fake_decode, workers=1) as engine:
+            assert engine.run() == {"decoded": 2, "errors": 0, "skipped": 0, "courses": 2}
+            assert [d for _, d in history.iter_snapshots(37)] == [{"payload": "a"}, {"payload": "b"}]
+
+            assert engine.run()["decoded"] == 0
+
+            history.raw_archive.put(37, b'c', 4.0)
+            stats = engine.run()
+            assert (stats["decoded"], stats["skipped"], stats["courses"]) == (1, 2, 1)
+            assert history.get_latest(37) == {"payload": "c"}
+            assert history.get_catalog_entry(37)["snapshot_count"] == 3
+
+    def test_new_decoder_version_reprocesses(self, temp_data_dir):
+        """Test a version bump redecodes stored payloads in a process pool"""
+        from src.storage.backfill import BackfillEngine
+
+        history = self._history(temp_data_dir)
+        with BackfillEngine(history, decode=_fake_decode, workers=1) as engine:
+            engine.run()
+        with BackfillEngine(history, decode=_fake_decode_v2, decoder_version=2,
+                            workers=2) as engine:
+            assert engine.run()["decoded"] == 2
+        assert history.get_latest(4371) == {"payload": "A"}
+
+    def test_unchanged_output_skips_rebuild(self, temp_data_dir):
+        """Test a version bump that decodes to the same JSON rewrites no course"""
+        from src.storage.backfill import BackfillEngine
+
+        history = self._history(temp_data_dir)
+        with BackfillEngine(history, decode=_fake_decode, workers=1) as engine:
+            engine.run()
+        segment = (temp_data_dir / "processed" / "37.seg").stat().st_ino
+        with BackfillEngine(history, decode=_fake_decode, decoder_version=2,
+                            workers=1) as engine:
+            stats = engine.run()
+        assert (stats["decoded"], stats["courses"]) == (2, 0)
+        assert (temp_data_dir / "processed" / "37.seg").stat().st_ino == segment
+
+    def test_rebuild_keeps_concurrent_snapshots(self, temp_data_dir):
+        """Test snapshots saved after the backfill read a course survive its rebuild"""
+        history = self._history(temp_data_dir)
+        history.save_processed(37, {"payload": "old"})
+        count = history.processed_segments.count(37)
+        history.save_processed(37, {"payload": "monitor"})  # saved during the run
+
+        history.replace_snapshots(37, [(1.0, {"payload": "a"}), (2.0, {"payload": "b"})],
+                                  keep_after=count)
+        assert [d for _, d in history.iter_snapshots(37)] == [
+            {"payload": "a"}, {"payload": "b"}, {"payload": "monitor"}
+        ]
+        assert history.get_latest(37) == {"payload": "monitor"}
+        assert history.get_catalog_entry(37)["snapshot_count"] == 3
+
+
+class TestChangeHistory:
+    """Tests for indexed change history"""
+
+    def _write_legacy(self, history_dir, course_id, days):
+        import json
+        with open(history_dir / f"{course_id}_changes.jsonl", "w") as f:
+            for day in days:
+                f.write(json.dumps({
+                    "timestamp": f"2026-01-{day:02d}T12:00:00",
+                    "changes": [{"modality": "AMPLA", "new_score": 700.0 + day}]
+                }) + "\n")
+
+    def test_range_queries(self, temp_data_dir):
+        """Test since/until/limit select only the matching entries"""
+        from datetime import datetime
+        from src.storage.history import HistoryManager
+
+        self._write_legacy(temp_data_dir / "history", 37, range(1, 11))
+        history = HistoryManager(temp_data_dir)
+
+        def days(entries):
+            return [e["changes"][0]["new_score"] - 700 for e in entries]
+
+        assert history.count_changes(37) == 10
+        assert days(history.get_change_history(37)) == list(range(1, 11))
+        assert days(history.get_change_history(
+            37, since=datetime(2026, 1, 3, 12), until=datetime(2026, 1, 5, 12)
+        )) == [3, 4, 5]
+        assert days(history.get_change_history(37, limit=2)) == [9, 10]
+        assert history.get_change_history(37, since=datetime(2026, 2, 1)) == []
+        assert history.get_change_history(99) == []
+
+    def test_save_change_extends_index(self, temp_data_dir):
+        """Test new entries are indexed after legacy lines"""
+        from src.storage.history import HistoryManager
+        from src.monitor.tracker import ScoreChange, ChangeType
+
+        self._write_legacy(temp_data_dir / "history", 37, [1, 2])
+        history = HistoryManager(temp_data_dir)
+        history.save_change(37, [
+            ScoreChange(modality='AMPLA', old_score=702.0, new_score=710.0,
+                        change_type=ChangeType.INCREASE)
+        ])
+
+        assert history.count_changes(37) == 3
+        (last,) = history.get_change_history(37, limit=1)
+        assert last["changes"][0]["new_score"] == 710.0
+
+
+class TestRawArchive:
+    """Tests for content-addressed raw payload storage"""
+
+    def test_identical_payloads_stored_once(self, tmp_path):
+        """Test dedup by content hash with a full timeline"""
+        from src.storage.blobs import RawArchive
+
+        archive = RawArchive(tmp_path)
+        d1 = archive.put(37, b'payload-a', 1.0)
+        d2 = archive.put(37, b'payload-b', 2.0)
+        d3 = archive.put(37, b'payload-a', 3.0)
+        archive.put(4371, b'payload-a', 3.0)
+
+        assert d1 == d3 != d2
+        assert len(list((tmp_path / "blobs").glob("*/*.bin"))) == 2
+        assert [(e.timestamp, e.digest) for e in archive.timeline(37)] == [
+            (1.0, d1), (2.0, d2), (3.0, d1)
+        ]
+        assert archive.get(d2) == b'payload-b'
+        assert archive.courses() == [37, 4371]
+
+    def test_compact_and_gc(self, tmp_path):
+        """Test timeline trimming and removal of unreferenced blobs"""
+        from src.storage.blobs import RawArchive
+
+        archive = RawArchive(tmp_path)
+        archive.put(1, b'a', 1.0)
+        archive.put(1, b'a', 2.0)
+        archive.put(1, b'b', 3.0)
+
+        assert archive.compact(1) == 1
+        assert archive.compact(1, keep_last=1) == 1
+        assert archive.gc() == 1
+        assert [p for _, p in archive.iter_payloads(1)] == [b'b']
+
+
+class TestApprovedStudentsPage:
+    """Tests for keyset pagination of approved students"""
+
+    def _client(self, monkeypatch, total="0-1/120"):
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        calls = []
+
+        class FakeResponse:
+            headers = {'Content-Range': total}
+
+            def raise_for_status(self):
+                pass
+
+            def json(self):
+                return [{'rank': 1}, {'rank': 2}]
+
+        def fake_request(method, endpoint, **kwargs):
+            calls.append((endpoint, kwargs['params'], kwargs.get('headers')))
+            return FakeResponse()
+
+        monkeypatch.setattr(client, "_request", fake_request)
+        return client, calls
+
+    def test_cursor_and_count(self, monkeypatch):
+        """Test the cursor replaces the offset and the total is parsed"""
+        client, calls = self._client(monkeypatch)
+
+        rows, total = client.get_approved_students_page(
+            1, year=2025, after=(10, 41, 1), offset=500, count="estimated"
+        )
+        assert len(rows) == 2 and total == 120
+        (endpoint, params, headers), = calls
+        assert endpoint == 'approved_students'
+        assert headers == {'Prefer': 'count=estimated'}
+        assert 'offset' not in params
+        assert params['order'] == 'rank.asc,modality_code.asc,call_number.asc'
+        assert params['or'] == ('(rank.gt.10,and(rank.eq.10,modality_code.gt.41),'
+                                'and(rank.eq.10,modality_code.eq.41,call_number.gt.1))')
+
+        client.get_approved_students_page(1, modality_code=41, call_number=1, after=(10,))
+        assert calls[1][1]['rank'] == 'gt.10' and 'or' not in calls[1][1]
+
+    def test_unknown_total(self, monkeypatch):
+        """Test a missing count is reported as None"""
+        client, _ = self._client(monkeypatch, total="0-1/*")
+        assert client.get_approved_students_page(1)[1] is None
+
+    def test_course_resolves_latest_year(self, monkeypatch):
+        """Test the course lookup embeds the latest approved year"""
+        from src.storage.supabase_client import SupabaseClient
+
+        client = SupabaseClient(url="http://localhost", service_key="test")
+        monkeypatch.setattr(client, "_get", lambda endpoint, params=None: [
+            {'id': 1, 'code': 37, 'approved_students': [{'year': 2025}]}
+        ])
+        assert client.get_course_for_students(37) == {'id': 1, 'code': 37, 'latest_year': 2025}
@@ -1,5 +1,11 @@
 import { NextRequest, NextResponse } from 'next/server'
-import { supabase } from '@/lib/supabase'
+import { supabase, StudentCursor } from '@/lib/supabase'
+
+function optionalInt(value: string | null): number | undefined {
+    if (value === null) return undefined
+    const parsed = parseInt(value)
+    return isNaN(parsed) ? undefined : parsed
+}
 
 export async function GET(
     request: NextRequest,
@@ -11,12 +17,29 @@ export async function GET(
     }
 
     const searchParams = request.nextUrl.searchParams
-    const page = parseInt(searchParams.get('page') || '1')
-    const limit = parseInt(searchParams.get('limit') || '50')
+    const limit = Math.min(parseInt(searchParams.get('limit') || '50') || 50, 100)
+    const year = optionalInt(searchParams.get('year'))
+    const modalityCode = optionalInt(searchParams.get('modality_code'))
+    const callNumber = optionalInt(searchParams.get('call_number'))
+
+    // Keyset cursor: the last row of the previous page
+    const afterRank = optionalInt(searchParams.get('after_rank'))
+    const afterModality = optionalInt(searchParams.get('after_modality'))
+    const afterCall = optionalInt(searchParams.get('after_call'))
+    let after: StudentCursor | undefined
+    if (afterRank !== undefined) {
+        if (afterModality === undefined || afterCall === undefined) {
+            return NextResponse.json(
+                { error: 'after_modality and after_call are required with after_rank' },
+                { status: 400 }
+            )
+        }
+        after = { rank: afterRank, modality_code: afterModality, call_number: afterCall }
+    }
 
     try {
-        // First resolve the course ID from the code
-        const courseResult = await supabase.getCourseByCode(code)
+        // Course and its latest year with approved students, in one request
+        const courseResult = await supabase.getCourseForStudents(code)
 
         if (courseResult.error || !courseResult.data) {
             return NextResponse.json(
@@ -25,10 +48,16 @@ export async function GET(
             )
         }
 
-        const courseId = courseResult.data.id
+        const { course, latestYear } = courseResult.data
+        const actualYear = year || latestYear || undefined
 
-        // Then fetch students
-        const result = await supabase.getApprovedStudents(courseId, page, limit)
+        const result = await supabase.getApprovedStudents(course.id, {
+            year: actualYear,
+            modalityCode,
+            callNumber,
+            after,
+            limit,
+        })
 
         if (result.error) {
             return NextResponse.json(
@@ -37,19 +66,24 @@ export async function GET(
             )
         }
 
-        // Add hasMore flag
-        const hasMore = (result.data?.length || 0) === limit
-
-        // Get the actual year from the data
-        const actualYear = result.data?.[0]?.year || null
+        const students = result.data || []
+        // The count covers the rows from the cursor on
+        const count = result.count !== undefined && !isNaN(result.count) ? result.count : null
+        const remaining = count !== null ? Math.max(count - students.length, 0) : null
+        const hasMore = remaining !== null ? remaining > 0 : students.length === limit
+        const last = students[students.length - 1]
 
         return NextResponse.json({
-            students: result.data || [],
-            count: result.count,
-            page,
+            students,
+            count: students.length,
+            total: after ? null : count,
+            remaining,
             limit,
             hasMore,
-            year: actualYear  // Return the actual year of the data
+            next: hasMore && last
+                ? { after_rank: last.rank, after_modality: last.modality_code, after_call: last.call_number }
+                : null,
+            year: actualYear ?? null
         })
 
     } catch (error) {
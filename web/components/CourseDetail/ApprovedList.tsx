@@ -15,6 +15,12 @@ interface ApprovedStudent {
     status: string;
 }
 
+interface PageCursor {
+    after_rank: number;
+    after_modality: number;
+    after_call: number;
+}
+
 interface ApprovedListProps {
     courseCode: number;
     cutScore: number;
@@ -23,22 +29,39 @@ interface ApprovedListProps {
 }
 
 export function ApprovedList({ courseCode, cutScore, vacancies, year }: ApprovedListProps) {
-    const [page, setPage] = useState(1);
+    // Keyset cursors of the pages visited so far (null: first page)
+    const [cursors, setCursors] = useState<(PageCursor | null)[]>([null]);
+    const [nextCursor, setNextCursor] = useState<PageCursor | null>(null);
+    const [total, setTotal] = useState<number | null>(null);
     const [students, setStudents] = useState<ApprovedStudent[]>([]);
     const [loading, setLoading] = useState(true);
     const [hasMore, setHasMore] = useState(false);
     const [error, setError] = useState('');
     const [actualYear, setActualYear] = useState<number | null>(null);
 
+    const page = cursors.length;
+    const cursor = cursors[cursors.length - 1];
+
     useEffect(() => {
         const fetchStudents = async () => {
             setLoading(true);
             try {
-                const res = await fetch(`/api/courses/${courseCode}/students?page=${page}&limit=50`);
+                const params = new URLSearchParams({ limit: '50' });
+                if (cursor) {
+                    params.set('after_rank', String(cursor.after_rank));
+                    params.set('after_modality', String(cursor.after_modality));
+                    params.set('after_call', String(cursor.after_call));
+                }
+                const res = await fetch(`/api/courses/${courseCode}/students?${params}`);
                 if (!res.ok) throw new Error('Failed to fetch students');
                 const data = await res.json();
                 setStudents(data.students);
                 setHasMore(data.hasMore);
+                setNextCursor(data.next);
+                // Only the first page counts the whole list
+                if (data.total !== null && data.total !== undefined) {
+                    setTotal(data.total);
+                }
                 // Use the year from the API response
                 if (data.year) {
                     setActualYear(data.year);
@@ -54,10 +77,12 @@ export function ApprovedList({ courseCode, cutScore, vacancies, year }: Approved
         if (courseCode) {
             fetchStudents();
         }
-    }, [courseCode, page]);
+    }, [courseCode, cursor]);
 
-    const handleNextPage = () => setPage(p => p + 1);
-    const handlePrevPage = () => setPage(p => Math.max(1, p - 1));
+    const handleNextPage = () => {
+        if (nextCursor) setCursors(c => [...c, nextCursor]);
+    };
+    const handlePrevPage = () => setCursors(c => (c.length > 1 ? c.slice(0, -1) : c));
 
     if (error) return <div className={styles.error}>{error}</div>;
 
@@ -85,7 +110,9 @@ export function ApprovedList({ courseCode, cutScore, vacancies, year }: Approved
                     <p className={styles.classification}>Aguardando dados oficiais...</p>
                 )}
                 {students.length > 0 && (
-                    <p className={styles.classification}>Classificação Oficial</p>
+                    <p className={styles.classification}>
+                        Classificação Oficial{total !== null && ` (${total} aprovados)`}
+                    </p>
                 )}
             </div>
 
@@ -141,7 +168,7 @@ export function ApprovedList({ courseCode, cutScore, vacancies, year }: Approved
                 <button
                     className={styles.pageBtn}
                     onClick={handleNextPage}
-                    disabled={!hasMore || loading}
+                    disabled={!hasMore || !nextCursor || loading}
                 >
                     &gt;
                 </button>
@@ -63,15 +63,13 @@ class SupabaseServer {
 
   /**
    * Search courses by name, university, or city
+   * (accent-insensitive, ranked by relevance via the search_courses RPC)
    */
   async searchCourses(query: string, limit = 20) {
-    const params = new URLSearchParams({
-      or: `(name.ilike.%${query}%,university.ilike.%${query}%,city.ilike.%${query}%)`,
-      order: 'name',
-      limit: String(limit),
+    return this.request<Course[]>('rpc/search_courses', {
+      method: 'POST',
+      body: JSON.stringify({ q: query, max_results: limit }),
     })
-
-    return this.request<Course[]>(`courses?${params}`)
   }
 
   /**
@@ -120,18 +118,18 @@ class SupabaseServer {
   }
 
   /**
-   * Get latest cut scores for a course
+   * Get latest cut scores for a course (one row per year/modality)
    */
   async getLatestCutScores(courseId: number, year?: number) {
     const params = new URLSearchParams({
       course_id: `eq.${courseId}`,
-      order: 'captured_at.desc',
+      order: 'year.desc,modality_code',
     })
     if (year) {
       params.set('year', `eq.${year}`)
     }
 
-    return this.request<CutScore[]>(`cut_scores?${params}`)
+    return this.request<CutScore[]>(`latest_cut_scores?${params}`)
   }
 
   /**
@@ -168,20 +166,11 @@ class SupabaseServer {
       this.getLatestCutScores(courseId),
     ])
 
-    // Group cut scores by modality (latest only)
-    const latestScores = new Map<string, CutScore>()
-    for (const score of scoresResult.data || []) {
-      const key = `${score.year}-${score.modality_code}`
-      if (!latestScores.has(key)) {
-        latestScores.set(key, score)
-      }
-    }
-
     return {
       data: {
         ...course,
         weights: weightsResult.data || [],
-        cut_scores: Array.from(latestScores.values()),
+        cut_scores: scoresResult.data || [],
       },
       error: null,
     }
@@ -206,51 +195,68 @@ class SupabaseServer {
       this.getLatestCutScores(courseId),
     ])
 
-    // Group cut scores by modality (latest only)
-    const latestScores = new Map<string, CutScore>()
-    for (const score of scoresResult.data || []) {
-      const key = `${score.year}-${score.modality_code}`
-      if (!latestScores.has(key)) {
-        latestScores.set(key, score)
-      }
-    }
-
     return {
       data: {
         ...course,
         weights: weightsResult.data || [],
-        cut_scores: Array.from(latestScores.values()),
+        cut_scores: scoresResult.data || [],
       },
       error: null,
     }
   }
 
   /**
-   * Get approved students for a course
+   * Get a course and the latest year with approved students (one request)
    */
-  async getApprovedStudents(courseId: number, page = 1, limit = 50, year?: number) {
-    const offset = (page - 1) * limit
+  async getCourseForStudents(code: number) {
+    const params = new URLSearchParams({
+      code: `eq.${code}`,
+      select: '*,approved_students(year)',
+      'approved_students.order': 'year.desc',
+      'approved_students.limit': '1',
+    })
 
-    // If no year specified, first find the latest year with data
-    if (!year) {
-      const latestYearResult = await this.request<ApprovedStudent[]>(
-        `approved_students?course_id=eq.${courseId}&select=year&order=year.desc&limit=1`
-      )
-      if (latestYearResult.data && latestYearResult.data.length > 0) {
-        year = latestYearResult.data[0].year
-      }
+    const result = await this.request<(Course & { approved_students: { year: number }[] })[]>(
+      `courses?${params}`
+    )
+    const row = result.data?.[0]
+    if (!row) {
+      return { data: null, error: result.error }
+    }
+    const { approved_students, ...course } = row
+    return {
+      data: { course: course as Course, latestYear: approved_students?.[0]?.year ?? null },
+      error: null,
     }
+  }
+
+  /**
+   * Get a page of approved students for a course, ordered by
+   * (rank, modality_code, call_number).
+   *
+   * Pages after the `after` cursor (the last row of the previous page)
+   * instead of an offset, so deep pages cost the same as the first;
+   * `count` is the number of rows from the cursor on.
+   */
+  async getApprovedStudents(courseId: number, options: ApprovedStudentsQuery = {}) {
+    const { year, modalityCode, callNumber, after, limit = 50 } = options
 
     const params = new URLSearchParams({
       course_id: `eq.${courseId}`,
-      order: 'rank.asc',
+      order: 'rank.asc,modality_code.asc,call_number.asc',
       limit: String(limit),
-      offset: String(offset),
     })
-
-    // Filter by year if we have one
-    if (year) {
-      params.set('year', `eq.${year}`)
+    if (year) params.set('year', `eq.${year}`)
+    if (modalityCode !== undefined) params.set('modality_code', `eq.${modalityCode}`)
+    if (callNumber !== undefined) params.set('call_number', `eq.${callNumber}`)
+
+    if (after) {
+      const { rank, modality_code: modality, call_number: call } = after
+      params.set(
+        'or',
+        `(rank.gt.${rank},and(rank.eq.${rank},modality_code.gt.${modality}),` +
+        `and(rank.eq.${rank},modality_code.eq.${modality},call_number.gt.${call}))`
+      )
     }
 
     return this.request<ApprovedStudent[]>(`approved_students?${params}`, {
@@ -323,5 +329,19 @@ export interface ApprovedStudent {
   status: string
 }
 
+export interface StudentCursor {
+  rank: number
+  modality_code: number
+  call_number: number
+}
+
+export interface ApprovedStudentsQuery {
+  year?: number
+  modalityCode?: number
+  callNumber?: number
+  after?: StudentCursor
+  limit?: number
+}
+
 // Export singleton instance
 export const supabase = new SupabaseServer()